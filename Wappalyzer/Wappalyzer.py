@@ -1,5 +1,7 @@
 
-from typing import Callable, Dict, Iterable, List, Any, Mapping, Set
+from typing import Callable, Dict, FrozenSet, Iterable, List, Any, Mapping, Sequence, Set, Tuple
+import collections
+import hashlib
 import json
 import logging
 import pkg_resources
@@ -7,15 +9,57 @@ import re
 import os
 import pathlib
 import requests
+import tempfile
+import threading
+import time
 
 from datetime import datetime, timedelta
 from typing import Optional
 
-from Wappalyzer.fingerprint import Fingerprint, Pattern, Technology, Category
-from Wappalyzer.webpage import WebPage, IWebPage
+from Wappalyzer.fingerprint import Fingerprint, Pattern, Technology, Category, FAMILIES, HEADERS_FAMILIES
+from Wappalyzer.regex_backends import RegexCompiler
+from Wappalyzer.webpage import WebPage, IWebPage, ITag
+from Wappalyzer.metrics import IMetrics, get_metrics
+from Wappalyzer.tracing import ITracer, span, maybe_span
 
 logger = logging.getLogger(name="python-Wappalyzer")
 
+TECHNOLOGIES_URL = 'https://raw.githubusercontent.com/AliasIO/wappalyzer/master/src/technologies.json'
+TECHNOLOGIES_CACHE_FILE = '.python-Wappalyzer/technologies.json'
+
+# Per-page results of the shared patterns: (family, key, regex or selector) -> matching contents or selected elements
+_MemoKey = Tuple[str, str, str]
+_Memo = Dict[_MemoKey, List[Any]]
+
+# Default number of URLs whose detections are kept in Wappalyzer.detected_technologies
+DETECTED_URLS_SIZE = 1024
+
+class DetectedTechnologies(collections.OrderedDict): # type: ignore
+    """
+    The detections of the last analyzed URLs, for `Wappalyzer.get_versions` and `Wappalyzer.get_confidence`.
+    The least recently stored URLs are evicted, so analyzing many distinct URLs does not grow the memory.
+    The URLs can be stored from several threads.
+    """
+    def __init__(self, size: Optional[int] = DETECTED_URLS_SIZE) -> None:
+        """
+        :param size: Maximum number of URLs, None for no limit.
+        """
+        super().__init__()
+        self.size = size
+        self._lock = threading.Lock()
+
+    def __setitem__(self, url: str, detections: Dict[str, Technology]) -> None:
+        with self._lock:
+            super().__setitem__(url, detections)
+            self.move_to_end(url)
+            if self.size is not None:
+                while len(self) > self.size:
+                    self.popitem(last=False)
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # The lock can't be pickled
+        return (type(self), (self.size,), None, None, iter(list(self.items())))
+
 class WappalyzerError(Exception):
     # unused for now
     """
@@ -23,6 +67,105 @@ class WappalyzerError(Exception):
     """
     pass
 
+class _FileLock:
+    """
+    Exclusive inter-process lock based on a lock file.
+    """
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> '_FileLock':
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1) # type: ignore
+                    break
+                except OSError: # LK_LOCK gives up after 10 seconds
+                    pass
+        else:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        assert self._fd is not None
+        if os.name == 'nt':
+            import msvcrt
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1) # type: ignore
+        else:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+class AnalysisResult:
+    """
+    The result of the analysis of a web page, see `Wappalyzer.analyze_result`. 
+    
+    The ``Wappalyzer.analyze*`` methods are projections of it.
+    """
+    def __init__(self, url:str, 
+                 detections:Mapping[str, Technology], 
+                 technologies:Iterable[str], 
+                 categories:Mapping[str, List[str]], 
+                 partial:bool=False) -> None:
+        """
+        :param url: URL of the web page.
+        :param detections: The technologies detected by the patterns, with their versions and confidence.
+        :param technologies: Names of all the detected technologies, including the implied ones.
+        :param categories: Map of the technology names to their category names.
+        :param partial: Whether only the ``url`` and ``headers`` patterns have been evaluated. 
+        """
+        self.url = url
+        self.detections = detections
+        self.technologies: FrozenSet[str] = frozenset(technologies)
+        self.categories = categories
+        self.partial = partial
+
+    def get_versions(self, tech_name:str) -> List[str]:
+        """
+        Returns the list of the discovered versions of a technology.
+        """
+        return self.detections[tech_name].versions if tech_name in self.detections else []
+
+    def get_confidence(self, tech_name:str) -> Optional[int]:
+        """
+        Returns the total confidence of a technology, None if it has not been detected by the patterns.
+        """
+        return self.detections[tech_name].confidenceTotal if tech_name in self.detections else None
+
+    def get_categories(self, tech_name:str) -> List[str]:
+        """
+        Returns the list of the category names of a technology.
+        """
+        return self.categories.get(tech_name, [])
+
+    def with_versions(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Same as `Wappalyzer.analyze_with_versions`.
+        """
+        return {tech_name: {"versions": list(self.get_versions(tech_name))} 
+                for tech_name in self.technologies}
+
+    def with_categories(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Same as `Wappalyzer.analyze_with_categories`.
+        """
+        return {tech_name: {"categories": list(self.get_categories(tech_name))} 
+                for tech_name in self.technologies}
+
+    def with_versions_and_categories(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Same as `Wappalyzer.analyze_with_versions_and_categories`.
+        """
+        return {tech_name: {"versions": list(self.get_versions(tech_name)), 
+                            "categories": list(self.get_categories(tech_name))} 
+                for tech_name in self.technologies}
+
 class Wappalyzer:
     """
     Python Wappalyzer driver.
@@ -53,7 +196,9 @@ class Wappalyzer:
 
     """
 
-    def __init__(self, categories:Dict[str, Any], technologies:Dict[str, Any]):
+    def __init__(self, categories:Dict[str, Any], technologies:Dict[str, Any], tracer:Optional[ITracer]=None, fast:bool=False, 
+                 regex_backends:Optional[Sequence[str]]=None, regex_timeout:Optional[float]=None, 
+                 detected_urls:Optional[int]=DETECTED_URLS_SIZE):
         """
         Manually initialize a new Wappalyzer instance. 
         
@@ -61,15 +206,160 @@ class Wappalyzer:
 
         :param categories: Map of category ids to names, as in ``technologies.json``.
         :param technologies: Map of technology names to technology dicts, as in ``technologies.json``.
+            Already compiled `Fingerprint` objects are also accepted as values.
+        :param tracer: Get callbacks for each stage of the analyses, see `Wappalyzer.tracing`.
+        :param fast: Stop evaluating the pattern families of a fingerprint once the technology is detected 
+            with full confidence and none of the remaining patterns can extract a version. 
+            The detected technologies and versions are the same as in the exhaustive mode, 
+            but the confidence is not summed beyond the settling match.
+        :param regex_backends: Regular expression engines, by preference: ``re``, ``regex`` or ``re2``. 
+            Each pattern is compiled with the first engine that supports it, see `Wappalyzer.regex_backends`. 
+            Defaults to ``re``, then ``regex`` if installed.
+        :param regex_timeout: Matching time limit of the patterns compiled with the ``regex`` engine, in seconds.
+        :param detected_urls: Number of URLs whose detections are kept in ``detected_technologies``, 
+            for `get_versions` and `get_confidence`. The least recently analyzed are evicted. None for no limit.
         """
+        self.tracer = tracer
+        self.fast = fast
+        self.regex_backends = regex_backends
+        self.regex_timeout = regex_timeout
         self.categories: Mapping[str, Category] = {k:Category(**v) for k,v in categories.items()}
-        self.technologies: Mapping[str, Fingerprint] = {k:Fingerprint(name=k, **v) for k,v in technologies.items()}
-        self.detected_technologies: Dict[str, Dict[str, Technology]] = {}
+        # Intern table: identical regular expressions are compiled once for the whole ruleset, with the first backend supporting them
+        self._regexes = RegexCompiler(regex_backends, regex_timeout)
+        self.technologies: Mapping[str, Fingerprint] = {k:v if isinstance(v, Fingerprint) else Fingerprint(name=k, regexes=self._regexes, **v) 
+                                                        for k,v in technologies.items()}
+        self.detected_urls = detected_urls
+        self.detected_technologies = DetectedTechnologies(detected_urls)
 
         self._confidence_regexp = re.compile(r"(.+)\\;confidence:(\d+)")
+        self._matchers: Mapping[str, Callable[[Fingerprint, IWebPage, Optional[_Memo], Dict[str, Technology]], bool]] = {
+            family: getattr(self, '_match_' + family) for family in FAMILIES}
+        # Reverse implies graph, built on demand by _get_implying_technologies
+        self._implied_by: Optional[Dict[str, Set[str]]] = None
+        # Identifies the results memoized on the web pages by this instance
+        self._token = object()
+
+        self._evaluation_order: List[str] = []
+        self._dependent_technologies: List[str] = []
+        self._excluded_by: Dict[str, Set[str]] = {}
+        self._index_relations()
+
+        self._shared_patterns: Set[_MemoKey] = set()
+        self._pattern_stats = self._index_patterns()
+        logger.debug("Deduplicated {patterns} patterns into {regexes} regexes and {evaluations} evaluations per page".format(
+            **self._pattern_stats))
+        self._precompile_selectors()
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        # Unpickled in a worker process
+        self._precompile_selectors()
+
+    def _precompile_selectors(self) -> None:
+        """
+        Compile the DOM selectors of the ruleset for the lxml WebPage, if ``cssselect`` is installed.
+        """
+        try:
+            from Wappalyzer.webpage._lxml import precompile_selectors
+        except ImportError:
+            return
+        precompile_selectors({selector.selector for tech_fingerprint in self.technologies.values() 
+                              for selector in tech_fingerprint.dom})
+
+    def _index_patterns(self) -> Dict[str, int]:
+        """
+        Find the patterns that several fingerprints evaluate against the same input 
+        (same family, same header or meta name, same regex; or same DOM selector): 
+        they are evaluated once per page and the result is shared.
+        """
+        usages: Dict[_MemoKey, int] = {}
+        regexes: Set[str] = set()
+        patterns = 0
+        for tech_fingerprint in self.technologies.values():
+            memo_keys: List[_MemoKey] = []
+            for family in FAMILIES:
+                if family in ('headers', 'meta'):
+                    memo_keys.extend((family, name, pattern.string) 
+                                     for name, _patterns in getattr(tech_fingerprint, family).items() for pattern in _patterns)
+                elif family == 'dom':
+                    memo_keys.extend(('dom', selector.selector, '') for selector in tech_fingerprint.dom)
+                else:
+                    memo_keys.extend((family, '', pattern.string) for pattern in getattr(tech_fingerprint, family))
+                for pattern in tech_fingerprint.iter_patterns(family):
+                    regexes.add(pattern.string)
+                    patterns += 1
+            patterns += len(tech_fingerprint.dom)
+            for memo_key in memo_keys:
+                usages[memo_key] = usages.get(memo_key, 0) + 1
+        self._shared_patterns = {memo_key for memo_key, count in usages.items() if count > 1}
+        return {
+            'patterns': patterns,
+            'regexes': len(regexes),
+            'evaluations': len(usages),
+            'shared': len(self._shared_patterns),
+        }
+
+    def _index_relations(self) -> None:
+        """
+        Sort the technologies in evaluation order, following the ``requires``, ``requiresCategory`` and ``excludes`` relations: 
+        the technologies excluding others come first, the technologies requiring others are evaluated in a second stage. 
+        The ruleset order is kept otherwise, and when the technologies exclude each other.
+        """
+        self._excluded_by = {}
+        for tech_name, tech_fingerprint in self.technologies.items():
+            for excluded in tech_fingerprint.excludes:
+                if excluded != tech_name:
+                    self._excluded_by.setdefault(excluded, set()).add(tech_name)
+        self._dependent_technologies = [tech_name for tech_name, tech_fingerprint in self.technologies.items() 
+                                        if tech_fingerprint.requires or tech_fingerprint.requiresCategory]
+        position = {tech_name: index for index, tech_name in enumerate(self.technologies)}
+        order: List[str] = []
+        visited: Set[str] = set()
+        def visit(tech_name: str) -> None:
+            visited.add(tech_name)
+            for excluder in sorted(self._excluded_by.get(tech_name, ()), key=position.__getitem__):
+                # Ruleset order for the technologies excluding each other
+                if excluder not in visited and tech_name not in self._excluded_by.get(excluder, ()) and \
+                        not self.technologies[excluder].requires and not self.technologies[excluder].requiresCategory:
+                    visit(excluder)
+            order.append(tech_name)
+        dependents = set(self._dependent_technologies)
+        for tech_name in self.technologies:
+            if tech_name not in visited and tech_name not in dependents:
+                visit(tech_name)
+        self._evaluation_order = order
+
+    def get_pattern_stats(self) -> Dict[str, int]:
+        """
+        Returns how much the ruleset's patterns have been deduplicated. 
+
+        - ``patterns``: number of patterns and DOM selectors in the fingerprints.
+        - ``regexes``: number of unique regular expressions, each one is compiled once.
+        - ``evaluations``: number of unique (family, key, regex) or DOM selectors, each one is evaluated at most once per page.
+        - ``shared``: number of evaluations whose result is shared by several patterns.
+        """
+        return dict(self._pattern_stats)
+
+    def get_regex_backends(self) -> Dict[str, int]:
+        """
+        Returns the number of unique regular expressions compiled with each backend: ``re``, ``regex``, ``re2``, 
+        or ``none`` for the expressions no backend can compile, they never match. 
+        The backend of each pattern is ``Pattern.backend``.
+        """
+        backends: Dict[str, str] = {}
+        for tech_fingerprint in self.technologies.values():
+            for family in FAMILIES:
+                for pattern in tech_fingerprint.iter_patterns(family):
+                    backends[pattern.string] = pattern.backend
+        counts: Dict[str, int] = {}
+        for backend in backends.values():
+            counts[backend] = counts.get(backend, 0) + 1
+        return counts
 
     @classmethod
-    def latest(cls, technologies_file:str=None, update:bool=False) -> 'Wappalyzer':
+    def latest(cls, technologies_file:str=None, update:bool=False, tracer:Optional[ITracer]=None, fast:bool=False, 
+               regex_backends:Optional[Sequence[str]]=None, regex_timeout:Optional[float]=None, 
+               detected_urls:Optional[int]=DETECTED_URLS_SIZE) -> 'Wappalyzer':
         """
         Construct a Wappalyzer instance.
         
@@ -77,6 +367,9 @@ class Wappalyzer:
         Do not update if the file has already been updated in the last 24 hours. 
         *New in version 0.4.0*
 
+        The file is only downloaded again if it changed upstream (conditional request), 
+        and only one process downloads it at a time.
+
         Use ``technologies_file=/some/path/technologies.json`` to load a 
         custom technologies file. 
         
@@ -86,54 +379,134 @@ class Wappalyzer:
         :param technologies_file: File path
         :param update: Download and use the latest ``technologies.json`` file 
             from `AliasIO/wappalyzer <https://github.com/AliasIO/wappalyzer>`_ repository.  
+        :param tracer: Get callbacks for each stage of the analyses, see `Wappalyzer.tracing`.
+        :param fast: Skip the patterns that can't change the analysis output, see `Wappalyzer`.
+        :param regex_backends: Regular expression engines, by preference, see `Wappalyzer`.
+        :param regex_timeout: Matching time limit of the ``regex`` engine, see `Wappalyzer`.
+        :param detected_urls: Number of URLs whose detections are kept, see `Wappalyzer`.
         
         """
-        default=pkg_resources.resource_string(__name__, "data/technologies.json")
-        defaultobj = json.loads(default)
-
         if technologies_file:
             with open(technologies_file, 'r', encoding='utf-8') as fd:
                 obj = json.load(fd)
         elif update:
-            should_update = True
-            _technologies_file: pathlib.Path
-            _files = cls._find_files(['HOME', 'APPDATA',], ['.python-Wappalyzer/technologies.json'])
-            if _files:
-                _technologies_file = pathlib.Path(_files[0])
-                last_modification_time = datetime.fromtimestamp(_technologies_file.stat().st_mtime)
-                if datetime.now() - last_modification_time < timedelta(hours=24):
-                    should_update = False
-
-            # Get the lastest file
-            if should_update:
-                try:
-                    lastest_technologies_file=requests.get('https://raw.githubusercontent.com/AliasIO/wappalyzer/master/src/technologies.json')
-                    obj = lastest_technologies_file.json()
-                    _technologies_file = pathlib.Path(cls._find_files(
-                        ['HOME', 'APPDATA',],
-                        ['.python-Wappalyzer/technologies.json'],
-                        create = True
-                        ).pop())
-                    
-                    if obj != defaultobj:
-                        with _technologies_file.open('w', encoding='utf-8') as tfile:
-                            tfile.write(lastest_technologies_file.text)
-                        logger.info("python-Wappalyzer technologies.json file updated")
-
-                except Exception as err: # Or loads default
-                    logger.error("Could not download latest Wappalyzer technologies.json file because of error : '{}'. Using default. ".format(err))
-                    obj = defaultobj
-            else:
-                logger.debug("python-Wappalyzer technologies.json file not updated because already updated in the last 24h")
+            _technologies_file = cls._update_technologies_file()
+            try:
                 with _technologies_file.open('r', encoding='utf-8') as tfile:
                     obj = json.load(tfile)
+                logger.info("Using technologies.json file at {}".format(_technologies_file.as_posix()))
+            except (OSError, ValueError) as err: # Or loads default
+                logger.error("Could not load Wappalyzer technologies.json file because of error : '{}'. Using default. ".format(err))
+                obj = cls._load_default_technologies()
+        else:
+            obj = cls._load_default_technologies()
+
+        return cls(categories=obj['categories'], technologies=obj['technologies'], tracer=tracer, fast=fast, 
+                   regex_backends=regex_backends, regex_timeout=regex_timeout, detected_urls=detected_urls)
+
+    @staticmethod
+    def _load_default_technologies() -> Dict[str, Any]:
+        """
+        Load the default ``data/technologies.json`` file inside the package ressource.
+        """
+        return json.loads(pkg_resources.resource_string(__name__, "data/technologies.json"))
+
+    @classmethod
+    def _update_technologies_file(cls) -> pathlib.Path:
+        """
+        Download the latest technologies file in the user directory, 
+        unless it has already been updated in the last 24 hours.
 
-            logger.info("Using technologies.json file at {}".format(_technologies_file.as_posix()))
+        Concurrent processes coordinate through a lock file: only one of them downloads the file.
+
+        :return: The path of the technologies file, it might not exist if the download failed.
+        """
+        _files = cls._find_files(['HOME', 'APPDATA',], [TECHNOLOGIES_CACHE_FILE])
+        if _files:
+            _technologies_file = pathlib.Path(_files[0])
         else:
-            obj = defaultobj
+            _env_locations = [os.environ[env_var] for env_var in ['HOME', 'APPDATA',] if env_var in os.environ]
+            if not _env_locations:
+                raise RuntimeError("Cannot find any of the env locations ['HOME', 'APPDATA']. ")
+            _technologies_file = pathlib.Path(_env_locations[0], TECHNOLOGIES_CACHE_FILE)
+            _technologies_file.parent.mkdir(parents=True, exist_ok=True)
+
+        def is_fresh() -> bool:
+            try:
+                last_modification_time = datetime.fromtimestamp(_technologies_file.stat().st_mtime)
+            except OSError:
+                return False
+            return datetime.now() - last_modification_time < timedelta(hours=24)
+
+        if not is_fresh():
+            with _FileLock(_technologies_file.with_name(_technologies_file.name + '.lock')):
+                # Another process might have updated the file while we were waiting for the lock
+                if not is_fresh():
+                    try:
+                        cls._download_technologies_file(_technologies_file)
+                    except Exception as err:
+                        logger.error("Could not download latest Wappalyzer technologies.json file because of error : '{}'. ".format(err))
+                    return _technologies_file
+
+        logger.debug("python-Wappalyzer technologies.json file not updated because already updated in the last 24h")
+        return _technologies_file
+
+    @staticmethod
+    def _download_technologies_file(technologies_file: pathlib.Path, url:str=TECHNOLOGIES_URL) -> None:
+        """
+        Download the technologies file if it has changed. 
 
+        Use a conditional request based on the ETag and Last-Modified headers of the previous download, 
+        stream the content to a temporary file and atomically replace the technologies file 
+        only if the SHA-256 of the content changed. 
+        The headers and the hash are stored in a sidecar ``.meta`` JSON file. 
+        """
+        meta_file = technologies_file.with_name(technologies_file.name + '.meta')
+        meta: Dict[str, str] = {}
+        if technologies_file.is_file() and meta_file.is_file():
+            try:
+                meta = json.loads(meta_file.read_text(encoding='utf-8'))
+            except ValueError:
+                pass
         
-        return cls(categories=obj['categories'], technologies=obj['technologies'])
+        request_headers = {}
+        if meta.get('etag'):
+            request_headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            request_headers['If-Modified-Since'] = meta['last_modified']
+
+        with requests.get(url, headers=request_headers, stream=True, timeout=30) as response:
+            if response.status_code == 304:
+                logger.debug("python-Wappalyzer technologies.json file not modified")
+                os.utime(technologies_file)
+                return
+            response.raise_for_status()
+            
+            sha256 = hashlib.sha256()
+            fd, tmp_file = tempfile.mkstemp(dir=technologies_file.parent, prefix=technologies_file.name, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as tfile:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        sha256.update(chunk)
+                        tfile.write(chunk)
+                if meta.get('sha256') == sha256.hexdigest():
+                    logger.debug("python-Wappalyzer technologies.json file not changed")
+                    os.remove(tmp_file)
+                    os.utime(technologies_file)
+                else:
+                    os.replace(tmp_file, technologies_file)
+                    logger.info("python-Wappalyzer technologies.json file updated")
+            except BaseException:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                raise
+            
+            meta = {'sha256': sha256.hexdigest()}
+            if response.headers.get('ETag'):
+                meta['etag'] = response.headers['ETag']
+            if response.headers.get('Last-Modified'):
+                meta['last_modified'] = response.headers['Last-Modified']
+            meta_file.write_text(json.dumps(meta), encoding='utf-8')
 
     @staticmethod
     def _find_files(
@@ -173,60 +546,131 @@ class Wappalyzer:
             existent_files.append(potential_paths[0])
         return existent_files
 
-    def _has_technology(self, tech_fingerprint: Fingerprint, webpage: IWebPage) -> bool:
+    def _has_technology(self, tech_fingerprint: Fingerprint, webpage: IWebPage, 
+                        families: Sequence[str] = FAMILIES, memo: Optional[_Memo] = None, 
+                        detections: Optional[Dict[str, Technology]] = None) -> bool:
         """
         Determine whether the web page matches the technology signature.
-        """
 
+        In fast mode, the families are evaluated until the technology is settled, see `_is_settled`.
+
+        :param families: Restrict the analysis to these pattern families. 
+        :param memo: Results of the shared patterns for this web page, 
+            pass the same dict for all the fingerprints evaluated against the page.
+        :param detections: The detections of this analysis of the page, by technology name. 
+            Defaults to ``detected_technologies[webpage.url]``, which is shared by all the analyses of the URL: 
+            concurrent analyses must pass their own dict.
+        """
+        if detections is None:
+            detections = self.detected_technologies.setdefault(webpage.url, {})
         has_tech = False
-        # Search the easiest things first and save the full-text search of the
-        # HTML for last
+        for index, family in enumerate(families):
+            if has_tech and self.fast and self._is_settled(detections, tech_fingerprint, families[index:]):
+                break
+            if self.tracer and getattr(tech_fingerprint, family):
+                with span(self.tracer, 'family', url=webpage.url, technology=tech_fingerprint.name, family=family) as outcome:
+                    outcome['matched'] = matched = self._matchers[family](tech_fingerprint, webpage, memo, detections)
+            else:
+                matched = self._matchers[family](tech_fingerprint, webpage, memo, detections)
+            if matched:
+                has_tech = True
+        return has_tech
 
-        # analyze url patterns
+    def _search(self, memo: Optional[_Memo], family: str, key: str, pattern: Pattern, contents: Sequence[str]) -> List[str]:
+        """
+        Get the contents matching the pattern. 
+        Patterns shared by several fingerprints are only evaluated once per page.
+        """
+        memo_key = (family, key, pattern.string)
+        if memo is None or memo_key not in self._shared_patterns:
+            return [content for content in contents if pattern.regex.search(content)]
+        if memo_key not in memo:
+            memo[memo_key] = [content for content in contents if pattern.regex.search(content)]
+        return memo[memo_key]
+
+    def _match_url(self, tech_fingerprint: Fingerprint, webpage: IWebPage, memo: Optional[_Memo], 
+                   detections: Dict[str, Technology]) -> bool:
+        has_tech = False
         for pattern in tech_fingerprint.url:
-            if pattern.regex.search(webpage.url):
-                self._set_detected_app(webpage.url, tech_fingerprint, 'url', pattern, value=webpage.url)
-        # analyze headers patterns
+            if self._search(memo, 'url', '', pattern, (webpage.url,)):
+                self._set_detected_app(detections, tech_fingerprint, 'url', pattern, value=webpage.url)
+                has_tech = True
+        return has_tech
+
+    def _match_headers(self, tech_fingerprint: Fingerprint, webpage: IWebPage, memo: Optional[_Memo], 
+                       detections: Dict[str, Technology]) -> bool:
+        has_tech = False
         for name, patterns in list(tech_fingerprint.headers.items()):
             if name in webpage.headers:
                 content = webpage.headers[name]
                 for pattern in patterns:
-                    if pattern.regex.search(content):
-                        self._set_detected_app(webpage.url, tech_fingerprint, 'headers', pattern, value=content, key=name)
+                    if self._search(memo, 'headers', name, pattern, (content,)):
+                        self._set_detected_app(detections, tech_fingerprint, 'headers', pattern, value=content, key=name)
                         has_tech = True
-        # analyze scripts patterns
-        for pattern in tech_fingerprint.scripts:
-            for script in webpage.scripts:
-                if pattern.regex.search(script):
-                    self._set_detected_app(webpage.url, tech_fingerprint, 'scripts', pattern, value=script)
-                    has_tech = True
-        # analyze meta patterns
+        return has_tech
+
+    def _match_meta(self, tech_fingerprint: Fingerprint, webpage: IWebPage, memo: Optional[_Memo], 
+                    detections: Dict[str, Technology]) -> bool:
+        has_tech = False
         for name, patterns in list(tech_fingerprint.meta.items()):
             if name in webpage.meta:
                 content = webpage.meta[name]
                 for pattern in patterns:
-                    if pattern.regex.search(content):
-                        self._set_detected_app(webpage.url, tech_fingerprint, 'meta', pattern, value=content, key=name)
+                    if self._search(memo, 'meta', name, pattern, (content,)):
+                        self._set_detected_app(detections, tech_fingerprint, 'meta', pattern, value=content, key=name)
                         has_tech = True
-        # analyze html patterns
+        return has_tech
+
+    def _match_scripts(self, tech_fingerprint: Fingerprint, webpage: IWebPage, memo: Optional[_Memo], 
+                       detections: Dict[str, Technology]) -> bool:
+        has_tech = False
+        for pattern in tech_fingerprint.scripts:
+            for script in self._search(memo, 'scripts', '', pattern, webpage.scripts):
+                self._set_detected_app(detections, tech_fingerprint, 'scripts', pattern, value=script)
+                has_tech = True
+        return has_tech
+
+    def _match_html(self, tech_fingerprint: Fingerprint, webpage: IWebPage, memo: Optional[_Memo], 
+                    detections: Dict[str, Technology]) -> bool:
+        has_tech = False
         for pattern in tech_fingerprint.html:
-            if pattern.regex.search(webpage.html):
-                self._set_detected_app(webpage.url, tech_fingerprint, 'html', pattern, value=webpage.html)
+            if self._search(memo, 'html', '', pattern, (webpage.html,)):
+                self._set_detected_app(detections, tech_fingerprint, 'html', pattern, value=webpage.html)
                 has_tech = True
-        # analyze dom patterns
+        return has_tech
+
+    def _select(self, memo: Optional[_Memo], tech_fingerprint: Fingerprint, webpage: IWebPage, selector: str) -> Iterable[ITag]:
+        """
+        Select the elements of the page. Selectors shared by several fingerprints are only evaluated once per page.
+        """
+        memo_key = ('dom', selector, '')
+        if memo is not None and memo_key in memo:
+            return memo[memo_key]
+        items: Iterable[ITag] = webpage.select(selector)
+        if self.tracer:
+            with span(self.tracer, 'dom.select', url=webpage.url, technology=tech_fingerprint.name, selector=selector) as outcome:
+                items = list(items)
+                outcome['elements'] = len(items)
+        if memo is not None and memo_key in self._shared_patterns:
+            memo[memo_key] = items = list(items)
+        return items
+
+    def _match_dom(self, tech_fingerprint: Fingerprint, webpage: IWebPage, memo: Optional[_Memo], 
+                   detections: Dict[str, Technology]) -> bool:
         # css selector, list of css selectors, or dict from css selector to dict with some of keys:
         #           - "exists": "": only check if the selector matches somthing, equivalent to the list form. 
         #           - "text": "regex": check if the .innerText property of the element that matches the css selector matches the regex (with version extraction).
         #           - "attributes": {dict from attr name to regex}: check if the attribute value of the element that matches the css selector matches the regex (with version extraction).
+        has_tech = False
         for selector in tech_fingerprint.dom:
-            for item in webpage.select(selector.selector):
+            for item in self._select(memo, tech_fingerprint, webpage, selector.selector):
                 if selector.exists:
-                    self._set_detected_app(webpage.url, tech_fingerprint, 'dom', Pattern(string=selector.selector), value='')
+                    self._set_detected_app(detections, tech_fingerprint, 'dom', Pattern(string=selector.selector), value='')
                     has_tech = True
                 if selector.text:
                     for pattern in selector.text:
                         if pattern.regex.search(item.inner_html):
-                            self._set_detected_app(webpage.url, tech_fingerprint, 'dom', pattern, value=item.inner_html)
+                            self._set_detected_app(detections, tech_fingerprint, 'dom', pattern, value=item.inner_html)
                             has_tech = True
                 if selector.attributes:
                     for attrname, patterns in list(selector.attributes.items()):
@@ -234,25 +678,23 @@ class Wappalyzer:
                         if _content:
                             for pattern in patterns:
                                 if pattern.regex.search(_content):
-                                    self._set_detected_app(webpage.url, tech_fingerprint, 'dom', pattern, value=_content)
+                                    self._set_detected_app(detections, tech_fingerprint, 'dom', pattern, value=_content)
                                     has_tech = True
         return has_tech
 
-    def _set_detected_app(self, url:str,
+    def _set_detected_app(self, detections:Dict[str, Technology],
                                 tech_fingerprint: Fingerprint, 
                                 app_type:str, 
                                 pattern: Pattern, 
                                 value:str, 
                                 key='') -> None:
         """
-        Store detected technology to the detected_technologies dict.
+        Store detected technology to the detections dict of the analysis.
         """
-        # Lookup Technology object in the cache
-        if url not in self.detected_technologies:
-            self.detected_technologies[url] = {}
-        if tech_fingerprint.name not in self.detected_technologies[url]:
-            self.detected_technologies[url][tech_fingerprint.name] = Technology(tech_fingerprint.name)
-        detected_tech = self.detected_technologies[url][tech_fingerprint.name]
+        # Lookup Technology object in the detections
+        if tech_fingerprint.name not in detections:
+            detections[tech_fingerprint.name] = Technology(tech_fingerprint.name)
+        detected_tech = detections[tech_fingerprint.name]
 
         # Set confidence level
         if key != '': key += ' '
@@ -262,7 +704,9 @@ class Wappalyzer:
 
         # Dectect version number
         if pattern.version:
-            allmatches = re.findall(pattern.regex, value)
+            metrics = get_metrics()
+            start = time.perf_counter() if metrics else 0.0
+            allmatches = pattern.regex.findall(value)
             for i, matches in enumerate(allmatches):
                 version = pattern.version
                 # Check for a string to avoid enumerating the string
@@ -279,6 +723,8 @@ class Wappalyzer:
                 if version != '' and version not in detected_tech.versions:
                     detected_tech.versions.append(version)
             self._sort_app_version(detected_tech)
+            if metrics:
+                metrics.observe('wappalyzer_version_seconds', time.perf_counter() - start)
 
     def _sort_app_version(self, detected_tech: Technology) -> None:
         """
@@ -288,6 +734,24 @@ class Wappalyzer:
             return
         detected_tech.versions = sorted(detected_tech.versions, key=self._cmp_to_key(self._sort_app_versions))
 
+    def _parse_implie(self, implie:str) -> Optional[str]:
+        """
+        Get the technology name of an ``implies`` entry, or None if the confidence is too low.
+        """
+        # If we have no doubts just add technology
+        if 'confidence' not in implie:
+            return implie
+        # Case when we have "confidence" (some doubts)
+        try:
+            # Use more strict regexp (cause we have already checked the entry of "confidence")
+            # Also, better way to compile regexp one time, instead of every time
+            app_name, confidence = self._confidence_regexp.search(implie).groups() # type: ignore
+            if int(confidence) >= 50:
+                return app_name
+        except (ValueError, AttributeError):
+            pass
+        return None
+
     def _get_implied_technologies(self, detected_technologies:Iterable[str]) -> Iterable[str]:
         """
         Get the set of technologies implied by `detected_technologies`.
@@ -297,20 +761,9 @@ class Wappalyzer:
             for tech in technologies:
                 try:
                     for implie in self.technologies[tech].implies:
-                        # If we have no doubts just add technology
-                        if 'confidence' not in implie:
-                            _implied_technologies.add(implie)
-
-                        # Case when we have "confidence" (some doubts)
-                        else:
-                            try:
-                                # Use more strict regexp (cause we have already checked the entry of "confidence")
-                                # Also, better way to compile regexp one time, instead of every time
-                                app_name, confidence = self._confidence_regexp.search(implie).groups() # type: ignore
-                                if int(confidence) >= 50:
-                                    _implied_technologies.add(app_name)
-                            except (ValueError, AttributeError):
-                                pass
+                        app_name = self._parse_implie(implie)
+                        if app_name:
+                            _implied_technologies.add(app_name)
                 except KeyError:
                     pass
             return _implied_technologies
@@ -325,6 +778,27 @@ class Wappalyzer:
 
         return all_implied_technologies
 
+    def _get_implying_technologies(self, technologies:Iterable[str]) -> Set[str]:
+        """
+        Get the set of technologies that imply, directly or not, one of `technologies`.
+        """
+        if self._implied_by is None:
+            self._implied_by = {}
+            for tech_name, tech_fingerprint in self.technologies.items():
+                for implie in tech_fingerprint.implies:
+                    app_name = self._parse_implie(implie)
+                    if app_name:
+                        self._implied_by.setdefault(app_name, set()).add(tech_name)
+
+        implying_technologies: Set[str] = set()
+        stack = list(technologies)
+        while stack:
+            for tech_name in self._implied_by.get(stack.pop(), ()):
+                if tech_name not in implying_technologies:
+                    implying_technologies.add(tech_name)
+                    stack.append(tech_name)
+        return implying_technologies
+
     def get_categories(self, tech_name:str) -> List[str]:
         """
         Returns a list of the categories for an technology name.
@@ -339,6 +813,7 @@ class Wappalyzer:
     def get_versions(self, url:str, app_name:str) -> List[str]:
         """
         Retuns a list of the discovered versions for an app name.
+        Only the last analyzed URLs are kept, see the ``detected_urls`` option.
 
         :param url: URL of the webpage
         :param app_name: App name
@@ -351,6 +826,7 @@ class Wappalyzer:
     def get_confidence(self, url:str, app_name:str) -> Optional[int]:
         """
         Returns the total confidence for an app name.
+        Only the last analyzed URLs are kept, see the ``detected_urls`` option.
 
         :param url: URL of the webpage
         :param app_name: App name
@@ -366,30 +842,299 @@ class Wappalyzer:
 
         :param webpage: The Webpage to analyze
         """
-        detected_technologies = set()
+        return set(self.analyze_result(webpage).technologies)
+
+    def analyze_result(self, webpage:IWebPage) -> 'AnalysisResult':
+        """
+        Analyze the web page and return the full result: detected technologies, versions, confidence and categories.
+
+        The result is memoized on the web page object: analyzing the same `WebPage` instance again with 
+        this Wappalyzer instance, with any of the ``analyze*`` methods, does not run the engine again. 
+
+        :param webpage: The Webpage to analyze
+        """
+        return self._analyze_result(webpage, publish=True)
+
+    def _analyze_result(self, webpage:IWebPage, publish:bool) -> 'AnalysisResult':
+        """
+        Analyze the web page, see `analyze_result`.
+
+        :param publish: Store the detections in ``detected_technologies``, for `get_versions` and `get_confidence`. 
+        """
+        result = self._get_memoized_result(webpage)
+        if result is not None:
+            return result
+
+        with maybe_span(self.tracer, 'analyze', url=webpage.url) as outcome:
+            families = self._get_families(webpage)
+            memo: _Memo = {}
+            metrics = get_metrics()
+            start = time.perf_counter() if metrics else 0.0
+
+            # Start from a clean state if the URL has already been analyzed. 
+            # The detections are only published in detected_technologies once complete: analyses can run concurrently.
+            detections: Dict[str, Technology] = {}
+            detected_technologies = self._resolve_relations(lambda tech_name: 
+                self._has_technology(self.technologies[tech_name], webpage, families=families, memo=memo, detections=detections))
+
+            if metrics:
+                metrics.observe('wappalyzer_match_seconds', time.perf_counter() - start)
+                start = time.perf_counter()
+
+            self._resolve_implied_technologies(webpage, detected_technologies)
+
+            if metrics:
+                self._record_metrics(metrics, start, detected_technologies)
+            outcome['detected'] = sorted(detected_technologies)
+
+        if publish:
+            self.detected_technologies[webpage.url] = detections
+        return self._make_result(webpage, detections, detected_technologies)
+
+    async def analyze_async(self, webpage:IWebPage, executor:Any=None) -> 'AnalysisResult':
+        """
+        Same as `analyze_result`, but the pattern matching runs in an executor, off the event loop.
+
+        >>> from Wappalyzer.executors import AnalysisExecutor
+        >>> async with AnalysisExecutor(wappalyzer, processes=4) as executor:
+        ...     result = await wappalyzer.analyze_async(webpage, executor=executor)
+
+        :param webpage: The Webpage to analyze
+        :param executor: `Wappalyzer.executors.AnalysisExecutor` instance, or `concurrent.futures.ThreadPoolExecutor`. 
+            Defaults to the default executor of the event loop. 
+
+        The analyses run concurrently: the detections are not stored in ``detected_technologies``, use the result. 
+        """
+        from .executors import AnalysisExecutor, run_in_executor
+        result = self._get_memoized_result(webpage)
+        if result is not None:
+            return result
+        if isinstance(executor, AnalysisExecutor) and executor.processes:
+            if executor.wappalyzer is not self:
+                raise ValueError("The worker processes of the executor run another Wappalyzer instance")
+            return await executor.analyze(webpage)
+        return await run_in_executor(executor, self._analyze_result, webpage, False)
+
+    def _make_result(self, webpage:IWebPage, detections:Mapping[str, Technology], 
+                     detected_technologies:Set[str]) -> 'AnalysisResult':
+        """
+        Create the result of an analysis, once the implied technologies have been resolved, and memoize it on the web page.
+        The detections are copied: the result does not change with ``detected_technologies``.
+        """
+        result = AnalysisResult(webpage.url, 
+                                detections={tech_name: self._copy_technology(detections[tech_name]) 
+                                            for tech_name in detected_technologies if tech_name in detections},
+                                technologies=detected_technologies, 
+                                categories={tech_name: self.get_categories(tech_name) for tech_name in detected_technologies},
+                                partial=getattr(webpage, 'partial', False))
+        try:
+            # Store a token rather than self: the web page must not keep the Wappalyzer instance alive.
+            webpage._wappalyzer_result = (self._token, result) # type: ignore
+        except AttributeError:
+            # The page does not accept new attributes (__slots__)
+            pass
+        return result
+
+    @staticmethod
+    def _copy_technology(detected_tech:Technology) -> Technology:
+        technology = Technology(detected_tech.name)
+        technology.confidence = dict(detected_tech.confidence)
+        technology.versions = list(detected_tech.versions)
+        return technology
+
+    def _get_memoized_result(self, webpage:IWebPage) -> Optional['AnalysisResult']:
+        """
+        Get the result of this instance memoized on the web page, if any.
+        """
+        cached = getattr(webpage, '_wappalyzer_result', None)
+        if cached is not None and cached[0] is self._token:
+            return cached[1] # type: ignore
+        return None
 
-        for tech_name, technology in list(self.technologies.items()):
-            if self._has_technology(technology, webpage):
-                detected_technologies.add(tech_name)
+    def _resolve_relations(self, match:Callable[[str], bool]) -> Set[str]:
+        """
+        Evaluate the technologies in dependency order, see `_index_relations`. 
 
-        detected_technologies.update(self._get_implied_technologies(detected_technologies))
+        A technology excluded by a detected technology is not evaluated, or removed if it has been detected before. 
+        A technology requiring others is only evaluated once one of the required technologies, 
+        or a technology of one of the required categories, has been detected or implied. 
 
+        :param match: Evaluate the fingerprint of a technology, returns whether the technology is detected.
+        :return: The detected technologies, without the implied ones.
+        """
+        detected: List[str] = []
+        excluded: Set[str] = set()
+        def evaluate(tech_names: Iterable[str]) -> None:
+            for tech_name in tech_names:
+                if tech_name not in excluded and match(tech_name):
+                    detected.append(tech_name)
+                    excluded.update(self.technologies[tech_name].excludes)
+
+        evaluate(self._evaluation_order)
+        pending = self._dependent_technologies
+        while pending:
+            resolved = set(detected) | set(self._get_implied_technologies(detected))
+            categories = {int(cat) for tech_name in resolved if tech_name in self.technologies 
+                          for cat in self.technologies[tech_name].cats}
+            ready = [tech_name for tech_name in pending 
+                     if not resolved.isdisjoint(self.technologies[tech_name].requires) 
+                     or not categories.isdisjoint(self.technologies[tech_name].requiresCategory)]
+            if not ready:
+                break
+            pending = [tech_name for tech_name in pending if tech_name not in ready]
+            evaluate(ready)
+
+        detected_technologies = set(detected)
+        # The technologies detected later might exclude technologies detected before them
+        for tech_name in detected:
+            if tech_name in detected_technologies:
+                detected_technologies.difference_update(excluded_name for excluded_name in self.technologies[tech_name].excludes 
+                                                        if excluded_name != tech_name)
         return detected_technologies
 
-    def analyze_with_versions(self, webpage:IWebPage) -> Dict[str, Dict[str, Any]]:
+    def _get_related_technologies(self, technologies:Iterable[str]) -> Tuple[Set[str], Set[str]]:
         """
-        Return a dict of applications and versions that can be detected on the web page.
+        Get the technologies whose detection can change the detection of `technologies`. 
+
+        :return: Tuple: the technologies implying, requiring or excluding the `technologies` (directly or not), 
+            and the subset of them related through the ``requires``, ``requiresCategory`` or ``excludes`` relations.
+        """
+        related = set(technologies)
+        relations: Set[str] = set()
+        while True:
+            found = self._get_implying_technologies(related)
+            for tech_name in related:
+                tech_fingerprint = self.technologies.get(tech_name)
+                if tech_fingerprint is None:
+                    continue
+                relations.update(name for name in tech_fingerprint.requires if name in self.technologies)
+                relations.update(self._excluded_by.get(tech_name, ()))
+                if tech_fingerprint.requiresCategory:
+                    relations.update(name for name, fingerprint in self.technologies.items() 
+                                     if not set(tech_fingerprint.requiresCategory).isdisjoint(int(cat) for cat in fingerprint.cats))
+            found |= relations
+            if found <= related:
+                return related, relations
+            related |= found
+
+    def _resolve_implied_technologies(self, webpage:IWebPage, detected_technologies:Set[str]) -> None:
+        """
+        Add the technologies implied by `detected_technologies` to the set.
+        """
+        with maybe_span(self.tracer, 'implies', url=webpage.url) as outcome:
+            implied_technologies = self._get_implied_technologies(detected_technologies)
+            outcome['implied'] = sorted(set(implied_technologies) - detected_technologies)
+            detected_technologies.update(implied_technologies)
+
+    @staticmethod
+    def _record_metrics(metrics:IMetrics, implies_start:float, detected_technologies:Iterable[str]) -> None:
+        """
+        Record the metrics of a page analysis, once the implied technologies have been resolved.
+        """
+        metrics.observe('wappalyzer_implies_seconds', time.perf_counter() - implies_start)
+        metrics.increment('wappalyzer_pages_analyzed_total')
+        for tech_name in detected_technologies:
+            metrics.increment('wappalyzer_detections_total', technology=tech_name)
+
+    def detect(self, webpage:IWebPage, targets:Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Targeted detection: only find out whether the `targets` technologies are used by the web page.
+
+        Only the fingerprints of the targets and of the technologies implying them are evaluated, 
+        one pattern family at a time, cheapest first (url, headers, meta, scripts, html and then dom). 
+        The evaluation stops as soon as every target has been detected with full confidence 
+        and a version (or can't get a version from the remaining pattern families). 
 
         :param webpage: The Webpage to analyze
+        :param targets: Names of the technologies to look for. Unknown names are ignored.
+        :return: Dict of the detected targets and their versions, just as `analyze_with_versions`.
+
+        >>> wappalyzer.detect(webpage, targets=['WordPress', 'Drupal'])
+        {'WordPress': {'versions': ['5.4.2']}}
+        """
+        _targets = {tech_name for tech_name in targets if tech_name in self.technologies}
+        result = self._get_memoized_result(webpage)
+        if result is not None:
+            # The web page has already been fully analyzed
+            return {tech_name: {"versions": list(result.get_versions(tech_name))} 
+                    for tech_name in result.technologies & _targets}
+
+        candidates, relations = self._get_related_technologies(_targets)
+        # The evaluation can only stop once these have been evaluated
+        watched = _targets | relations
+        # Keep the ruleset order
+        pending = [tech_name for tech_name in self.technologies if tech_name in candidates]
+        detected_technologies: Set[str] = set()
+        memo: _Memo = {}
+        # Start from a clean state if the URL has already been analyzed
+        detections: Dict[str, Technology] = {}
+        metrics = get_metrics()
+        start = time.perf_counter() if metrics else 0.0
+
+        families = self._get_families(webpage)
+        for index, family in enumerate(families):
+            for tech_name in pending:
+                if self._has_technology(self.technologies[tech_name], webpage, families=(family,), memo=memo, detections=detections):
+                    detected_technologies.add(tech_name)
+            
+            remaining_families = families[index+1:]
+            # A detected technology that is not a target already gave all we need: its implies.
+            pending = [tech_name for tech_name in pending if tech_name not in detected_technologies or 
+                       (tech_name in _targets and not self._is_resolved(detections, tech_name, remaining_families))]
+            if watched.isdisjoint(pending):
+                break
+
+        if metrics:
+            metrics.observe('wappalyzer_match_seconds', time.perf_counter() - start)
+            start = time.perf_counter()
+
+        detected_technologies = self._resolve_relations(detected_technologies.__contains__)
+        self._resolve_implied_technologies(webpage, detected_technologies)
+        detected_technologies &= _targets
+
+        if metrics:
+            self._record_metrics(metrics, start, detected_technologies)
+
+        self.detected_technologies[webpage.url] = detections
+        return {tech_name: {"versions": list(detections[tech_name].versions) if tech_name in detections else []} 
+                for tech_name in detected_technologies}
+
+    @staticmethod
+    def _get_families(webpage:IWebPage) -> Sequence[str]:
+        """
+        Get the pattern families that can be evaluated on the web page.
+        Partial web pages only hold the response headers: see `WebPage.new_from_url_headers`.
         """
-        detected_apps = self.analyze(webpage)
-        versioned_apps = {}
+        return HEADERS_FAMILIES if getattr(webpage, 'partial', False) else FAMILIES
 
-        for app_name in detected_apps:
-            versions = self.get_versions(webpage.url, app_name)
-            versioned_apps[app_name] = {"versions": versions}
+    def _is_settled(self, detections:Mapping[str, Technology], tech_fingerprint:Fingerprint, remaining_families:Iterable[str]) -> bool:
+        """
+        Whether the remaining pattern families of the fingerprint can't change the detected technologies and versions: 
+        the technology has been detected with full confidence and none of the remaining patterns extracts a version.
+        """
+        detected_tech = detections[tech_fingerprint.name]
+        return detected_tech.confidenceTotal >= 100 and tech_fingerprint.versioned_families.isdisjoint(remaining_families)
 
-        return versioned_apps
+    def _is_resolved(self, detections:Mapping[str, Technology], tech_name:str, remaining_families:Iterable[str]) -> bool:
+        """
+        Whether the technology has been detected with full confidence and a version, 
+        or can't get a version from the remaining pattern families.
+        """
+        try:
+            detected_tech = detections[tech_name]
+        except KeyError:
+            return False
+        if detected_tech.confidenceTotal < 100:
+            return False
+        return bool(detected_tech.versions) or self.technologies[tech_name].versioned_families.isdisjoint(remaining_families)
+
+    def analyze_with_versions(self, webpage:IWebPage) -> Dict[str, Dict[str, Any]]:
+        """
+        Return a dict of applications and versions that can be detected on the web page.
+
+        :param webpage: The Webpage to analyze
+        """
+        return self.analyze_result(webpage).with_versions()
 
     def analyze_with_categories(self, webpage:IWebPage) -> Dict[str, Dict[str, Any]]:
         """
@@ -404,14 +1149,7 @@ class Wappalyzer:
         'Docker': {'categories': ['Containers']}}
 
         """
-        detected_technologies = self.analyze(webpage)
-        categorised_technologies = {}
-
-        for tech_name in detected_technologies:
-            cat_names = self.get_categories(tech_name)
-            categorised_technologies[tech_name] = {"categories": cat_names}
-
-        return categorised_technologies
+        return self.analyze_result(webpage).with_categories()
 
     def analyze_with_versions_and_categories(self, webpage:IWebPage) -> Dict[str, Dict[str, Any]]:
         """
@@ -429,14 +1167,7 @@ class Wappalyzer:
         'Yoast SEO': {'categories': ['SEO'], 'versions': ['14.6.1']}}
 
         """
-        versioned_apps = self.analyze_with_versions(webpage)
-        versioned_and_categorised_apps = versioned_apps
-
-        for app_name in versioned_apps:
-            cat_names = self.get_categories(app_name)
-            versioned_and_categorised_apps[app_name]["categories"] = cat_names
-
-        return versioned_and_categorised_apps
+        return self.analyze_result(webpage).with_versions_and_categories()
 
     def _sort_app_versions(self, version_a: str, version_b: str) -> int:
         return len(version_a) - len(version_b)
@@ -475,7 +1206,9 @@ def analyze(url:str,
             update:bool=False, 
             useragent:str=None,
             timeout:int=10,
-            verify:bool=True) -> Dict[str, Dict[str, Any]]:
+            verify:bool=True,
+            headers_only:bool=False,
+            fast:bool=False) -> Dict[str, Dict[str, Any]]:
     """
     Quick utility method to analyze a website with minimal configurable options. 
 
@@ -487,18 +1220,22 @@ def analyze(url:str,
         - `useragent`: Request user agent
         - `timeout`: Request timeout
         - `verify`: SSL cert verify
+        - `headers_only`: Do not download the content, only analyze the URL and the response headers. 
+          The results are partial. 
+        - `fast`: Skip the patterns that can't change the results, see `Wappalyzer`. 
     
     :Return: 
         `dict`. Just as `Wappalyzer.analyze_with_versions_and_categories`. 
     :Note: More information might be added to the returned values in the future
     """
     # Create Wappalyzer
-    wappalyzer=Wappalyzer.latest(update=update)
+    wappalyzer=Wappalyzer.latest(update=update, fast=fast)
     # Create WebPage
     headers={}
     if useragent:
         headers['User-Agent'] = useragent
-    webpage=WebPage.new_from_url(url, 
+    new_webpage = WebPage.new_from_url_headers if headers_only else WebPage.new_from_url
+    webpage=new_webpage(url, 
         headers=headers, 
         timeout=timeout, 
         verify=verify)
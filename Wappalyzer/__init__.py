@@ -4,8 +4,9 @@ Welcome to ``python-Wappalyzer`` API documentation!
 :see: `Wappalyzer` and `WebPage`.
 """
 
-from .Wappalyzer import Wappalyzer, analyze
+from .Wappalyzer import Wappalyzer, AnalysisResult, analyze
 from .webpage import WebPage
 __all__ = ["Wappalyzer", 
            "WebPage", 
+           "AnalysisResult",
            "analyze"]
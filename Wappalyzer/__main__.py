@@ -1,6 +1,7 @@
 import argparse
 import json
-from .Wappalyzer import analyze
+import sys
+from .Wappalyzer import analyze, Wappalyzer
 
 def get_parser() -> argparse.ArgumentParser:
     """Get the CLI `argparse.ArgumentParser`"""
@@ -10,14 +11,82 @@ def get_parser() -> argparse.ArgumentParser:
     parser.add_argument('--user-agent', help='Request user agent', dest='useragent')
     parser.add_argument('--timeout', help='Request timeout', type=int, default=10)
     parser.add_argument('--no-verify', action='store_true', help='Skip SSL cert verify', dest='noverify')
+    parser.add_argument('--headers-only', action='store_true', help='Only analyze the response headers, without downloading the content. '
+                        'The results are partial and printed as {"partial": true, "technologies": {...}}', dest='headersonly')
+    parser.add_argument('--fast', action='store_true', help='Skip the patterns that cannot change the results')
     return parser
 
 def main(args) -> None:
     """Entrypoint
     :param args: `Namespace` returned by `argparse.ArgumentParser.parse_args`. 
     """
-    result = analyze(args.url, update=args.update, useragent=args.useragent, timeout=args.timeout, verify=not args.noverify)
-    print(json.dumps(result))
+    result = analyze(args.url, update=args.update, useragent=args.useragent, timeout=args.timeout, verify=not args.noverify, 
+                     headers_only=args.headersonly, fast=args.fast)
+    if args.headersonly:
+        print(json.dumps({'partial': True, 'technologies': result}))
+    else:
+        print(json.dumps(result))
+
+def get_serve_parser() -> argparse.ArgumentParser:
+    """Get the `argparse.ArgumentParser` of the ``serve`` command"""
+    parser = argparse.ArgumentParser(description="python-Wappalyzer HTTP analysis service", prog="python -m Wappalyzer serve")
+    parser.add_argument('--host', help='Bind address', default='127.0.0.1')
+    parser.add_argument('--port', help='Port', type=int, default=8080)
+    parser.add_argument('--processes', help='Number of worker processes, defaults to the number of CPUs', type=int)
+    parser.add_argument('--queue-size', help='Maximum number of pages waiting for analysis, '
+                        'the server responds 503 when the queue is full', type=int, default=256, dest='queuesize')
+    parser.add_argument('--max-request-size', help='Maximum size of a request body, in MiB', type=int, default=32, 
+                        dest='maxrequestsize')
+    parser.add_argument('--update', action='store_true', help='Use the latest technologies file downloaded from the internet')
+    parser.add_argument('--timeout', help='Request timeout', type=int, default=10)
+    parser.add_argument('--fast', action='store_true', help='Skip the patterns that cannot change the results')
+    return parser
+
+def serve_main(args) -> None:
+    """Entrypoint of the ``serve`` command
+    :param args: `Namespace` returned by `get_serve_parser`. 
+    """
+    from .server import serve
+    serve(host=args.host, port=args.port, wappalyzer=Wappalyzer.latest(update=args.update, fast=args.fast), 
+          processes=args.processes, queue_size=args.queuesize, timeout=args.timeout, 
+          max_request_size=args.maxrequestsize * 1024 * 1024)
+
+def get_profile_parser() -> argparse.ArgumentParser:
+    """Get the `argparse.ArgumentParser` of the ``profile-rules`` command"""
+    parser = argparse.ArgumentParser(description="Rank the patterns of a ruleset by cost over a corpus of pages", 
+                                     prog="python -m Wappalyzer profile-rules")
+    parser.add_argument('corpus', help='Directory of HTML files, WARC, HAR or NDJSON file')
+    parser.add_argument('--technologies-file', help='Ruleset to profile, defaults to the bundled technologies.json', dest='technologiesfile')
+    parser.add_argument('--compare', help='Another version of the ruleset, to compare the costs with', metavar='TECHNOLOGIES_FILE')
+    parser.add_argument('--top', help='Number of patterns and fingerprints reported', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    return parser
+
+def profile_main(args) -> None:
+    """Entrypoint of the ``profile-rules`` command
+    :param args: `Namespace` returned by `get_profile_parser`. 
+    """
+    from .profiler import compare_profiles, format_comparison, iter_corpus, profile_ruleset
+    wappalyzers = [Wappalyzer.latest(technologies_file=args.technologiesfile)]
+    if args.compare:
+        wappalyzers.append(Wappalyzer.latest(technologies_file=args.compare))
+    profiles = profile_ruleset(iter_corpus(args.corpus), *wappalyzers)
+    comparison = compare_profiles(*profiles) if args.compare else None
+    if args.json:
+        report = {'profile': profiles[-1].to_dict(args.top)}
+        if comparison:
+            report['comparison'] = dict(comparison, technologies=comparison['technologies'][:args.top])
+        print(json.dumps(report))
+    else:
+        print(profiles[-1].format(args.top))
+        if comparison:
+            print()
+            print(format_comparison(comparison, args.top))
 
 if __name__ == '__main__':
-    main(get_parser().parse_args())
+    if sys.argv[1:2] == ['serve']:
+        serve_main(get_serve_parser().parse_args(sys.argv[2:]))
+    elif sys.argv[1:2] == ['profile-rules']:
+        profile_main(get_profile_parser().parse_args(sys.argv[2:]))
+    else:
+        main(get_parser().parse_args())
@@ -0,0 +1,238 @@
+"""
+Compact, columnar storage of the results of many pages.
+
+Each technology gets a dense integer id and the detections of a page are stored as a bitset (a Python ``int``).
+Versions and confidence are only stored when there is something to store, and the categories are stored once
+per technology, not once per page.
+
+>>> from Wappalyzer.columnar import BatchResults
+>>> batch = BatchResults(wappalyzer)
+>>> for record in iter_warc('crawl.warc.gz'):
+...     batch.add(wappalyzer.analyze_result(record.to_webpage()))
+>>> batch.count('WordPress', 'Nginx')
+1234
+>>> matrix = batch.to_array() # numpy boolean array: pages x technologies
+>>> (matrix[:, batch.ids['WordPress']] & matrix[:, batch.ids['Nginx']]).sum()
+1234
+"""
+import csv
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, TextIO, Tuple
+
+from .Wappalyzer import Wappalyzer, AnalysisResult
+
+class BatchResults:
+    """
+    Columnar container of the results of many pages.
+    """
+
+    def __init__(self, wappalyzer: Wappalyzer) -> None:
+        """
+        :param wappalyzer: The Wappalyzer instance that analyzes the pages,
+            technology ids are assigned in the order of its ruleset.
+        """
+        self.technologies: List[str] = list(wappalyzer.technologies)
+        """Technology names, by id."""
+        self.ids: Dict[str, int] = {tech_name: index for index, tech_name in enumerate(self.technologies)}
+        """Technology ids, by name."""
+        self.urls: List[str] = []
+        """Page URLs, by page index."""
+        self.bitsets: List[int] = []
+        """Detected technologies, by page index: bit ``n`` is set if the technology with id ``n`` is detected."""
+        self.implied: List[int] = []
+        """Technologies only detected through the implies of other technologies, by page index."""
+        self.versions: Dict[Tuple[int, int], List[str]] = {}
+        """Versions by (page index, technology id), only when some versions have been found."""
+        self.confidence: Dict[Tuple[int, int], int] = {}
+        """Confidence by (page index, technology id), only when it's not 100."""
+        self.unknown_confidence: Set[int] = set()
+        """Indexes of the pages whose confidence is not known, see `add_technologies`."""
+        self._categories: Dict[int, List[str]] = {}
+        self._wappalyzer = wappalyzer
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def _get_id(self, tech_name: str) -> int:
+        tech_id = self.ids.get(tech_name)
+        if tech_id is None:
+            # Implied technology that is not in the ruleset
+            tech_id = self.ids[tech_name] = len(self.technologies)
+            self.technologies.append(tech_name)
+        return tech_id
+
+    def add(self, result: AnalysisResult) -> int:
+        """
+        Add the result of a page, see `Wappalyzer.analyze_result`.
+
+        :return: The page index.
+        """
+        page = len(self.urls)
+        bitset, implied = 0, 0
+        for tech_name in result.technologies:
+            tech_id = self._get_id(tech_name)
+            bitset |= 1 << tech_id
+            confidence = result.get_confidence(tech_name)
+            if confidence is None:
+                implied |= 1 << tech_id
+            elif confidence != 100:
+                self.confidence[(page, tech_id)] = confidence
+            versions = result.get_versions(tech_name)
+            if versions:
+                self.versions[(page, tech_id)] = list(versions)
+        self.urls.append(result.url)
+        self.bitsets.append(bitset)
+        self.implied.append(implied)
+        return page
+
+    def add_technologies(self, url: str, technologies: Mapping[str, Mapping[str, Any]]) -> int:
+        """
+        Add the result of a page as returned by `Wappalyzer.analyze_with_versions` and co,
+        for instance by `Wappalyzer.pipeline.analyze_records`. The confidence is not known: `get_confidence` returns None.
+
+        :return: The page index.
+        """
+        page = len(self.urls)
+        bitset = 0
+        for tech_name, infos in technologies.items():
+            tech_id = self._get_id(tech_name)
+            bitset |= 1 << tech_id
+            if infos.get('versions'):
+                self.versions[(page, tech_id)] = list(infos['versions'])
+        self.urls.append(url)
+        self.bitsets.append(bitset)
+        self.implied.append(0)
+        self.unknown_confidence.add(page)
+        return page
+
+    def _mask(self, tech_names: Iterable[str]) -> int:
+        mask = 0
+        for tech_name in tech_names:
+            if tech_name not in self.ids:
+                raise KeyError(tech_name)
+            mask |= 1 << self.ids[tech_name]
+        return mask
+
+    def get_technologies(self, page: int) -> Set[str]:
+        """
+        Get the names of the technologies detected on a page.
+        """
+        bitset = self.bitsets[page]
+        return {self.technologies[tech_id] for tech_id in range(bitset.bit_length()) if bitset >> tech_id & 1}
+
+    def get_versions(self, page: int, tech_name: str) -> List[str]:
+        """
+        Get the versions of a technology on a page.
+        """
+        return self.versions.get((page, self.ids[tech_name]), [])
+
+    def get_confidence(self, page: int, tech_name: str) -> Optional[int]:
+        """
+        Get the confidence of a technology on a page, None if it has not been detected by the patterns
+        or if it's not known.
+        """
+        tech_id = self.ids[tech_name]
+        if not (self.bitsets[page] >> tech_id & 1) or self.implied[page] >> tech_id & 1 or page in self.unknown_confidence:
+            return None
+        return self.confidence.get((page, tech_id), 100)
+
+    def get_categories(self, tech_name: str) -> List[str]:
+        """
+        Get the category names of a technology, computed once per technology.
+        """
+        tech_id = self.ids[tech_name]
+        if tech_id not in self._categories:
+            self._categories[tech_id] = self._wappalyzer.get_categories(tech_name)
+        return self._categories[tech_id]
+
+    def pages(self, *tech_names: str) -> Iterator[int]:
+        """
+        Iterate over the indexes of the pages running all the given technologies.
+        """
+        mask = self._mask(tech_names)
+        return (page for page, bitset in enumerate(self.bitsets) if bitset & mask == mask)
+
+    def count(self, *tech_names: str) -> int:
+        """
+        Count the pages running all the given technologies.
+
+        >>> batch.count('WordPress', 'PHP')
+        """
+        mask = self._mask(tech_names)
+        return sum(1 for bitset in self.bitsets if bitset & mask == mask)
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Count the pages running each technology.
+        """
+        counts = [0] * len(self.technologies)
+        for bitset in self.bitsets:
+            while bitset:
+                lowest = bitset & -bitset
+                counts[lowest.bit_length() - 1] += 1
+                bitset ^= lowest
+        return {tech_name: count for tech_name, count in zip(self.technologies, counts) if count}
+
+    def to_array(self) -> Any:
+        """
+        Get the detections as a ``numpy`` boolean array of shape (pages, technologies),
+        indexed by page index and technology id. Requires ``numpy``.
+        """
+        try:
+            import numpy # type: ignore
+        except ImportError as err:
+            raise ImportError("BatchResults.to_array() requires numpy") from err
+        width = (len(self.technologies) + 7) // 8
+        buffer = b''.join(bitset.to_bytes(width, 'little') for bitset in self.bitsets)
+        bits = numpy.unpackbits(numpy.frombuffer(buffer, dtype=numpy.uint8).reshape(len(self.bitsets), width),
+                                axis=1, count=len(self.technologies), bitorder='little')
+        return bits.astype(bool)
+
+    def to_columns(self) -> Dict[str, List[Any]]:
+        """
+        Get the detections in long format: one row per (page, technology), as a dict of equal-length column lists.
+        Columns: ``page``, ``url``, ``technology``, ``versions``, ``confidence``, ``implied``.
+        Ready for ``pyarrow.table()`` or ``pandas.DataFrame()``.
+        """
+        columns: Dict[str, List[Any]] = {name: [] for name in ('page', 'url', 'technology', 'versions', 'confidence', 'implied')}
+        for page, bitset in enumerate(self.bitsets):
+            for tech_id in range(bitset.bit_length()):
+                if bitset >> tech_id & 1:
+                    tech_name = self.technologies[tech_id]
+                    columns['page'].append(page)
+                    columns['url'].append(self.urls[page])
+                    columns['technology'].append(tech_name)
+                    columns['versions'].append(self.versions.get((page, tech_id), []))
+                    columns['confidence'].append(self.get_confidence(page, tech_name))
+                    columns['implied'].append(bool(self.implied[page] >> tech_id & 1))
+        return columns
+
+    def to_ndjson(self, output: TextIO) -> int:
+        """
+        Write the results as newline delimited JSON objects with keys ``url`` and ``technologies``,
+        just as `Wappalyzer.pipeline.write_ndjson`.
+
+        :return: The number of results written.
+        """
+        for page, url in enumerate(self.urls):
+            technologies = {tech_name: {'versions': self.get_versions(page, tech_name),
+                                        'categories': self.get_categories(tech_name)}
+                            for tech_name in sorted(self.get_technologies(page))}
+            output.write(json.dumps({'url': url, 'technologies': technologies}) + '\n')
+        return len(self.urls)
+
+    def to_csv(self, output: TextIO) -> int:
+        """
+        Write the detections as CSV, one row per (page, technology).
+        Columns: ``url``, ``technology``, ``versions`` (separated with ``;``), ``confidence``, ``categories`` (separated with ``;``).
+
+        :return: The number of rows written.
+        """
+        writer = csv.writer(output)
+        writer.writerow(['url', 'technology', 'versions', 'confidence', 'categories'])
+        columns = self.to_columns()
+        for url, tech_name, versions, confidence in zip(columns['url'], columns['technology'],
+                                                        columns['versions'], columns['confidence']):
+            writer.writerow([url, tech_name, ';'.join(versions), '' if confidence is None else confidence,
+                             ';'.join(self.get_categories(tech_name))])
+        return len(columns['url'])
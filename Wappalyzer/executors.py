@@ -0,0 +1,152 @@
+"""
+Keep the CPU-bound work of async applications off the event loop.
+
+Parsing the HTML and matching the patterns of a large page take long enough to stall every other
+connection of the event loop. `AnalysisExecutor` runs them in a pool of threads or worker processes.
+The number of pages submitted to the pool is bounded: when it's full, the callers wait for a slot
+instead of queueing an unbounded number of pages in memory. The detections of the pages analyzed in the pool
+are not stored in ``Wappalyzer.detected_technologies``: use the results.
+
+>>> from Wappalyzer import Wappalyzer, WebPage
+>>> from Wappalyzer.executors import AnalysisExecutor
+>>> wappalyzer = Wappalyzer.latest()
+>>> async with AnalysisExecutor(wappalyzer, threads=4) as executor, aiohttp.ClientSession() as session:
+...     webpage = await WebPage.new_from_url_async('http://example.com', aiohttp_client_session=session, executor=executor)
+...     result = await wappalyzer.analyze_async(webpage, executor=executor)
+
+With ``processes``, the ruleset is sent once to each worker process. `AnalysisExecutor.analyze_bytes`
+parses and analyzes a response in one go in a worker: it's the cheapest path, only the response content
+and the result cross the process boundary.
+"""
+import asyncio
+import concurrent.futures
+import os
+from typing import Any, Callable, Mapping, Optional, Type, TypeVar, Union
+
+from requests.structures import CaseInsensitiveDict
+
+from . import pipeline
+from .Wappalyzer import Wappalyzer, AnalysisResult
+from .webpage import IWebPage, WebPage
+
+_T = TypeVar('_T')
+
+def _analyze_page(url: str, html: str, headers: Mapping[str, str], partial: bool) -> AnalysisResult:
+    """
+    Analyze a page with the worker's Wappalyzer instance.
+    """
+    wappalyzer = pipeline._worker_wappalyzer
+    assert wappalyzer is not None
+    webpage = pipeline._worker_webpage_class(url, html, headers)
+    webpage.partial = partial
+    # Do not keep the detections of each page in long running workers
+    return wappalyzer._analyze_result(webpage, False)
+
+def _analyze_bytes(url: str, body: bytes, headers: Mapping[str, str]) -> AnalysisResult:
+    """
+    Parse and analyze a response with the worker's Wappalyzer instance.
+    """
+    wappalyzer = pipeline._worker_wappalyzer
+    assert wappalyzer is not None
+    webpage = pipeline._worker_webpage_class.new_from_bytes(url, body, headers=headers)
+    return wappalyzer._analyze_result(webpage, False)
+
+class AnalysisExecutor:
+    """
+    A pool of threads or worker processes for the HTML parsing and the pattern matching, with a bounded queue.
+    """
+
+    def __init__(self, wappalyzer: Optional[Wappalyzer] = None,
+                 threads: Optional[int] = None,
+                 processes: int = 0,
+                 max_pending: Optional[int] = None,
+                 webpage_class: Type[WebPage] = WebPage) -> None:
+        """
+        :param wappalyzer: Wappalyzer instance, defaults to ``Wappalyzer.latest()``.
+        :param threads: Number of threads, defaults to the number of CPUs. Ignored if ``processes`` is set.
+        :param processes: Number of worker processes, 0 to use a thread pool.
+        :param max_pending: Maximum number of tasks running or waiting in the pool,
+            defaults to twice the number of workers.
+        :param webpage_class: WebPage class used to parse the HTML.
+        """
+        self.wappalyzer = wappalyzer or Wappalyzer.latest()
+        self.processes = processes
+        self.webpage_class = webpage_class
+        self.executor: concurrent.futures.Executor
+        """The underlying `concurrent.futures.Executor`."""
+        if processes:
+            workers = processes
+            # The ruleset is pickled once per worker, by the initializer
+            self.executor = concurrent.futures.ProcessPoolExecutor(processes,
+                initializer=pipeline._init_worker, initargs=(self.wappalyzer, webpage_class))
+        else:
+            workers = threads or os.cpu_count() or 1
+            self.executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.max_pending = max_pending or 2 * workers
+        # Created in the event loop, by run
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> 'AnalysisExecutor':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stop the pool, once the submitted tasks are done.
+        """
+        self.executor.shutdown(wait=True)
+
+    async def run(self, func: Callable[..., _T], *args: Any) -> _T:
+        """
+        Run a function in the pool, waiting for a slot if ``max_pending`` tasks are already submitted.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+        async with self._semaphore:
+            return await asyncio.get_event_loop().run_in_executor(self.executor, func, *args)
+
+    async def analyze(self, webpage: IWebPage) -> AnalysisResult:
+        """
+        Same as `Wappalyzer.analyze_result`, in the pool. See `Wappalyzer.analyze_async`.
+        """
+        wappalyzer = self.wappalyzer
+        result = wappalyzer._get_memoized_result(webpage)
+        if result is not None:
+            return result
+        if not self.processes:
+            return await self.run(wappalyzer._analyze_result, webpage, False)
+        # The HTML is cheaper to send than the parsed page: the worker parses it again
+        result = await self.run(_analyze_page, webpage.url, webpage.html, CaseInsensitiveDict(webpage.headers),
+                                getattr(webpage, 'partial', False))
+        return wappalyzer._make_result(webpage, result.detections, set(result.technologies))
+
+    async def analyze_bytes(self, url: str, body: bytes, headers: Mapping[str, str]) -> AnalysisResult:
+        """
+        Parse the raw content of a response and analyze it, in the pool.
+
+        :param url: URL of the response.
+        :param body: Raw content, decoded as by `WebPage.new_from_bytes`.
+        :param headers: The HTTP response headers.
+        """
+        if not self.processes:
+            def parse_and_analyze() -> AnalysisResult:
+                return self.wappalyzer._analyze_result(self.webpage_class.new_from_bytes(url, body, headers=headers), False)
+            return await self.run(parse_and_analyze)
+        return await self.run(_analyze_bytes, url, body, CaseInsensitiveDict(headers))
+
+def _is_process_pool(executor: Union[concurrent.futures.Executor, AnalysisExecutor]) -> bool:
+    if isinstance(executor, AnalysisExecutor):
+        return bool(executor.processes)
+    return isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+
+async def run_in_executor(executor: Union[concurrent.futures.Executor, AnalysisExecutor, None],
+                          func: Callable[..., _T], *args: Any) -> _T:
+    """
+    Run a function in an `AnalysisExecutor`, a `concurrent.futures.Executor`,
+    or the default executor of the event loop if None.
+    """
+    if isinstance(executor, AnalysisExecutor):
+        return await executor.run(func, *args)
+    return await asyncio.get_event_loop().run_in_executor(executor, func, *args)
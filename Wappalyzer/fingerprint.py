@@ -6,19 +6,30 @@ This module is an implementation detail and is not considered public API.
 import sre_compile
 import re
 import logging
-from typing import Optional, Optional, Union, Mapping, Dict, List, Any
+from typing import Optional, Optional, Union, Mapping, Dict, Iterator, List, Set, Any
+
+from .regex_backends import RegexCompiler
 
 logger = logging.getLogger(name="python-Wappalyzer")
 
+# Supported pattern families, cheapest to evaluate first: 
+# the full-text search of the HTML and the DOM selection come last.
+FAMILIES = ('url', 'headers', 'meta', 'scripts', 'html', 'dom')
+# Pattern families that can be evaluated without the content of the web page
+HEADERS_FAMILIES = ('url', 'headers')
+
 class Pattern:
     def __init__(self, string:str, 
                  regex: Optional['re.Pattern']=None, 
                  version: Optional[str]=None, 
-                 confidence: Optional[str] = None) -> None:
+                 confidence: Optional[str] = None, 
+                 backend: str = 're') -> None:
         self.string: str = string
         self.regex: 're.Pattern' = regex or sre_compile.compile('', 0)
         self.version: Optional[str] = version
         self.confidence: int = int(confidence) if confidence else 100
+        self.backend: str = backend
+        """Name of the regex backend the expression is compiled with, see `Wappalyzer.regex_backends`."""
 
 class DomSelector:
     def __init__(self, 
@@ -59,7 +70,6 @@ class Technology:
 # Prepare patterns for fields (TODO): 
 # - "scriptSrc": "regex string"
 # - "js": dict string contains ins file to string (with version extraction).
-# - "requires" / "excludes" rules/
 # - "text" field.
 
 # Inspired by projectdiscovery/wappalyzergo (MIT License)
@@ -71,7 +81,14 @@ class Fingerprint:
     See https://github.com/AliasIO/wappalyzer#json-fields
     """
     
-    def __init__(self, name:str, **attrs: Any) -> None:
+    def __init__(self, name:str, regexes: Optional[RegexCompiler] = None, **attrs: Any) -> None:
+        """
+        :param name: The technology name.
+        :param regexes: Compiler of the regular expressions, shared by all the fingerprints of a ruleset: 
+            identical expressions are only compiled once. Defaults to the standard library ``re`` 
+            then the ``regex`` module, see `Wappalyzer.regex_backends`.
+        :param attrs: The technology dict, as in ``technologies.json``.
+        """
         # Required infos
         self.name: str = name
 
@@ -87,21 +104,23 @@ class Fingerprint:
 
         # Implies and cie
         self.implies: List[str] = self._prepare_list(attrs['implies']) if 'implies' in attrs else []
-        # self.requires: List[str] = self._prepare_list(attrs['requires']) if 'requires' in attrs else [] # Not supported
-        # self.requiresCategory: List[str] = self._prepare_list(attrs['requiresCategory']) if 'requiresCategory' in attrs else [] # Not supported
-        # self.excludes: List[str] = self._prepare_list(attrs['excludes']) if 'excludes' in attrs else [] # Not supported
+        self.requires: List[str] = self._prepare_list(attrs['requires']) if 'requires' in attrs else []
+        self.requiresCategory: List[int] = [int(cat) for cat in self._prepare_list(attrs['requiresCategory'])] if 'requiresCategory' in attrs else []
+        self.excludes: List[str] = self._prepare_list(attrs['excludes']) if 'excludes' in attrs else []
 
         # Patterns
-        self.dom: List[DomSelector] = self._prepare_dom(attrs['dom']) if 'dom' in attrs else []
+        if regexes is None:
+            regexes = RegexCompiler()
+        self.dom: List[DomSelector] = self._prepare_dom(attrs['dom'], regexes) if 'dom' in attrs else []
         
-        self.headers: Mapping[str, List[Pattern]] = self._prepare_headers(attrs['headers']) if 'headers' in attrs else {}
-        self.meta: Mapping[str, List[Pattern]] = self._prepare_meta(attrs['meta']) if 'meta' in attrs else {}
+        self.headers: Mapping[str, List[Pattern]] = self._prepare_headers(attrs['headers'], regexes) if 'headers' in attrs else {}
+        self.meta: Mapping[str, List[Pattern]] = self._prepare_meta(attrs['meta'], regexes) if 'meta' in attrs else {}
 
-        self.html: List[Pattern] = self._prepare_pattern(attrs['html']) if 'html' in attrs else []
-        self.text: List[Pattern] = self._prepare_pattern(attrs['text']) if 'text' in attrs else []
-        self.url: List[Pattern] = self._prepare_pattern(attrs['url']) if 'url' in attrs else []
-        self.scriptSrc: List[Pattern] = self._prepare_pattern(attrs['scriptSrc']) if 'scriptSrc' in attrs else []
-        self.scripts: List[Pattern] = self._prepare_pattern(attrs['scripts']) if 'scripts' in attrs else []
+        self.html: List[Pattern] = self._prepare_pattern(attrs['html'], regexes) if 'html' in attrs else []
+        self.text: List[Pattern] = self._prepare_pattern(attrs['text'], regexes) if 'text' in attrs else []
+        self.url: List[Pattern] = self._prepare_pattern(attrs['url'], regexes) if 'url' in attrs else []
+        self.scriptSrc: List[Pattern] = self._prepare_pattern(attrs['scriptSrc'], regexes) if 'scriptSrc' in attrs else []
+        self.scripts: List[Pattern] = self._prepare_pattern(attrs['scripts'], regexes) if 'scripts' in attrs else []
 
         # self.cookies: Mapping[str, List[Pattern]] Not supported
         # self.dns: Mapping[str, List[Pattern]] Not supported
@@ -109,6 +128,26 @@ class Fingerprint:
         # self.css: List[Pattern] Not supported (yet)
         # self.robots: List[Pattern] Not supported (yet)
         # self.xhr: List[Pattern] Not supported
+
+        # Pattern families that can extract a version number
+        self.versioned_families: Set[str] = {family for family in FAMILIES 
+                if any(pattern.version for pattern in self.iter_patterns(family))}
+
+    def iter_patterns(self, family: str) -> Iterator[Pattern]:
+        """
+        Iterate over all the patterns of a pattern family.
+        DOM selectors that only check for existence do not have patterns.
+        """
+        if family in ('headers', 'meta'):
+            for patterns in getattr(self, family).values():
+                yield from patterns
+        elif family == 'dom':
+            for selector in self.dom:
+                yield from selector.text or ()
+                for patterns in (selector.attributes or {}).values():
+                    yield from patterns
+        else:
+            yield from getattr(self, family)
     
     @classmethod
     def _prepare_list(cls, thing: Any) -> List[Any]:
@@ -118,33 +157,28 @@ class Fingerprint:
             return thing
 
     @classmethod
-    def _prepare_pattern(cls, pattern: Union[str, List[str]]) -> List[Pattern]:
+    def _prepare_pattern(cls, pattern: Union[str, List[str]], 
+                         regexes: Optional[RegexCompiler] = None) -> List[Pattern]:
         """
         Prepare regular expression patterns.
         Strip out key:value pairs from the pattern and compile the regular
         expression.
+
+        :param regexes: Compiler of the regular expressions.
         """
+        if regexes is None:
+            regexes = RegexCompiler()
         pattern_objects = []
         if isinstance(pattern, list):
             for p in pattern:
-                pattern_objects.extend(cls._prepare_pattern(p))
+                pattern_objects.extend(cls._prepare_pattern(p, regexes))
         else:
             attrs = {}
             patterns = pattern.split('\\;')
             for index, expression in enumerate(patterns):
                 if index == 0:
                     attrs['string'] = expression
-                    try:
-                        attrs['regex'] = re.compile(expression, re.I) # type: ignore
-                    except re.error as err:
-                        # Wappalyzer is a JavaScript application therefore some of the regex wont compile in Python.
-                        logger.debug(
-                            "Caught '{error}' compiling regex: {regex}".format(
-                                error=err, regex=patterns)
-                        )
-                        # regex that never matches:
-                        # http://stackoverflow.com/a/1845097/413622
-                        attrs['regex'] = re.compile(r'(?!x)x') # type: ignore
+                    attrs['regex'], attrs['backend'] = regexes.compile(expression)
                 else:
                     attr = expression.split(':')
                     if len(attr) > 1:
@@ -154,30 +188,34 @@ class Fingerprint:
             pattern_objects.append(Pattern(**attrs)) # type: ignore
 
         return pattern_objects
-    
+
     @classmethod
-    def _prepare_pattern_dict(cls, thing: Dict[str, Union[str, List[str]]]) -> Mapping[str, List[Pattern]]:
+    def _prepare_pattern_dict(cls, thing: Dict[str, Union[str, List[str]]], 
+                              regexes: Optional[RegexCompiler] = None) -> Mapping[str, List[Pattern]]:
         for k in thing:
-            thing[k] = cls._prepare_pattern(thing[k]) # type: ignore
+            thing[k] = cls._prepare_pattern(thing[k], regexes) # type: ignore
         return thing # type: ignore
     
     @classmethod
-    def _prepare_meta(cls,  thing: Union[str, List[str], Dict[str, Union[str, List[str]]]]) -> Mapping[str, List[Pattern]]:
+    def _prepare_meta(cls,  thing: Union[str, List[str], Dict[str, Union[str, List[str]]]], 
+                      regexes: Optional[RegexCompiler] = None) -> Mapping[str, List[Pattern]]:
         # Ensure dict
         if not isinstance(thing, dict):
             thing = {'generator': thing}
         # Enure lowercase keys
-        return cls._prepare_pattern_dict({k.lower():v for k,v in thing.items()})
+        return cls._prepare_pattern_dict({k.lower():v for k,v in thing.items()}, regexes)
 
     @classmethod
-    def _prepare_headers(cls,  thing: Dict[str, Union[str, List[str]]]) -> Mapping[str, List[Pattern]]:
+    def _prepare_headers(cls,  thing: Dict[str, Union[str, List[str]]], 
+                         regexes: Optional[RegexCompiler] = None) -> Mapping[str, List[Pattern]]:
         # Enure lowercase keys
-        return cls._prepare_pattern_dict({k.lower():v for k,v in thing.items()})
+        return cls._prepare_pattern_dict({k.lower():v for k,v in thing.items()}, regexes)
     
     @classmethod
     def _prepare_dom(cls, thing: Union[str, List[str], 
                                     Dict[str, Dict[str, 
-                                        Union[str, List[str]]]]]) -> List[DomSelector]:
+                                        Union[str, List[str]]]]], 
+                     regexes: Optional[RegexCompiler] = None) -> List[DomSelector]:
         selectors = []
         if isinstance(thing, str):
             selectors.append(DomSelector(thing, exists=True))
@@ -193,10 +231,10 @@ class Fingerprint:
                 if clause.get('exists') is not None:
                     _exists = True
                 if clause.get('text'):
-                    _prep_text_patterns = cls._prepare_pattern(clause['text'])
+                    _prep_text_patterns = cls._prepare_pattern(clause['text'], regexes)
                 if clause.get('attributes'):
                     _prep_attr_patterns ={}
                     for _key, pattern in clause['attributes'].items(): #type: ignore
-                        _prep_attr_patterns[_key] = cls._prepare_pattern(pattern)
+                        _prep_attr_patterns[_key] = cls._prepare_pattern(pattern, regexes)
                 selectors.append(DomSelector(cssselect, exists=_exists, text=_prep_text_patterns, attributes=_prep_attr_patterns))
         return selectors
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""
+Differential re-analysis: when a page is scanned again, only the pattern families whose inputs changed are evaluated.
+
+Each input of the page is hashed separately: the URL, each header, each meta, the script list and the HTML
+(the DOM is derived from the HTML). The detections are stored per pattern family in a `PageState`,
+with the input digests. On the next scan, the detections of the families whose inputs did not change are
+reused. For the ``headers`` and ``meta`` families, only the fingerprints checking a header or meta that
+changed are evaluated again.
+
+>>> from Wappalyzer.incremental import IncrementalAnalyzer, PageState
+>>> analyzer = IncrementalAnalyzer(Wappalyzer.latest())
+>>> result, state = analyzer.analyze(WebPage.new_from_url('http://example.com'))
+>>> json.dump(state.to_dict(), open('example.com.state.json', 'w'))
+>>> # The next day
+>>> previous = PageState.from_dict(json.load(open('example.com.state.json')))
+>>> result, state = analyzer.analyze(WebPage.new_from_url('http://example.com'), previous)
+>>> state.reused
+{'url', 'meta', 'scripts', 'html', 'dom'}
+"""
+import hashlib
+import json
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+from .Wappalyzer import Wappalyzer, AnalysisResult
+from .fingerprint import Fingerprint, Technology, FAMILIES
+from .metrics import get_metrics
+from .tracing import maybe_span
+from .webpage import IWebPage
+
+# Detections of a pattern family: technology name -> (confidence by match, versions)
+_Detections = Dict[str, Tuple[Dict[str, int], List[str]]]
+# Digest of the input of a family, or digests by header/meta name
+_Digest = Union[str, Dict[str, str]]
+
+# Pattern families whose input is a mapping: they are evaluated again per fingerprint, for the changed keys only.
+KEYED_FAMILIES = ('headers', 'meta')
+
+def _digest(value: str) -> str:
+    return hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+def get_digests(webpage: IWebPage, families: Iterable[str] = FAMILIES) -> Dict[str, _Digest]:
+    """
+    Hash the inputs of each pattern family of the web page.
+    """
+    digests: Dict[str, _Digest] = {}
+    for family in families:
+        if family == 'url':
+            digests[family] = _digest(webpage.url)
+        elif family == 'headers':
+            digests[family] = {name.lower(): _digest(value) for name, value in webpage.headers.items()}
+        elif family == 'meta':
+            digests[family] = {name: _digest(value) for name, value in webpage.meta.items()}
+        elif family == 'scripts':
+            digests[family] = _digest('\n'.join(webpage.scripts))
+        else:
+            # html and dom
+            digests[family] = _digest(webpage.html)
+    return digests
+
+def merge_detections(families: Iterable[str], detections: Mapping[str, _Detections]) -> Dict[str, Technology]:
+    """
+    Merge the detections of the pattern families, in order: same versions order as `Wappalyzer.analyze`.
+    """
+    merged: Dict[str, Technology] = {}
+    for family in families:
+        for tech_name, (confidence, versions) in detections[family].items():
+            if tech_name not in merged:
+                merged[tech_name] = Technology(tech_name)
+            merged[tech_name].confidence.update(confidence)
+            merged[tech_name].versions.extend(version for version in versions
+                                              if version not in merged[tech_name].versions)
+    return merged
+
+class PageState:
+    """
+    The input digests and the per-family detections of a page analysis, to compare with the next scan.
+    JSON-serializable with `to_dict`.
+    """
+    def __init__(self, ruleset: str,
+                 digests: Dict[str, _Digest],
+                 detections: Dict[str, _Detections]) -> None:
+        """
+        :param ruleset: Digest of the ruleset that produced the detections.
+        :param digests: Input digests by pattern family.
+        :param detections: Detections by pattern family.
+        """
+        self.ruleset = ruleset
+        self.digests = digests
+        self.detections = detections
+        self.reused: Set[str] = set()
+        """The pattern families whose detections have been reused without any evaluation."""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'ruleset': self.ruleset, 'digests': self.digests,
+                'detections': {family: {tech_name: {'confidence': confidence, 'versions': versions}
+                                        for tech_name, (confidence, versions) in detections.items()}
+                               for family, detections in self.detections.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> 'PageState':
+        return cls(data['ruleset'], data['digests'],
+                   {family: {tech_name: (dict(tech['confidence']), list(tech['versions']))
+                             for tech_name, tech in detections.items()}
+                    for family, detections in data['detections'].items()})
+
+class IncrementalAnalyzer:
+    """
+    Analyze pages again, only evaluating the pattern families whose inputs changed since a previous analysis.
+    """
+    def __init__(self, wappalyzer: Optional[Wappalyzer] = None) -> None:
+        """
+        :param wappalyzer: Wappalyzer instance, defaults to ``Wappalyzer.latest()``.
+        """
+        self.wappalyzer = wappalyzer or Wappalyzer.latest()
+        self.ruleset = self._get_ruleset_digest()
+
+    def _get_ruleset_digest(self) -> str:
+        """
+        The stored detections are only valid with the same ruleset.
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        for tech_name, tech_fingerprint in self.wappalyzer.technologies.items():
+            hasher.update(json.dumps([tech_name,
+                [(family, [(pattern.string, pattern.version, pattern.confidence) for pattern in tech_fingerprint.iter_patterns(family)])
+                 for family in FAMILIES],
+                sorted(tech_fingerprint.headers), sorted(tech_fingerprint.meta),
+                tech_fingerprint.requires, tech_fingerprint.requiresCategory, tech_fingerprint.excludes,
+                [(selector.selector, bool(selector.exists), sorted(selector.attributes or ())) for selector in tech_fingerprint.dom]]).encode('utf-8'))
+        return hasher.hexdigest()
+
+    def _evaluate(self, webpage: IWebPage, family: str, fingerprints: Iterable[Fingerprint], memo: Dict[Any, Any]) -> _Detections:
+        """
+        Evaluate a pattern family of the fingerprints.
+        """
+        wappalyzer = self.wappalyzer
+        detections: Dict[str, Technology] = {}
+        for tech_fingerprint in fingerprints:
+            wappalyzer._has_technology(tech_fingerprint, webpage, families=(family,), memo=memo, detections=detections)
+        return {tech_name: (tech.confidence, tech.versions) for tech_name, tech in detections.items()}
+
+    def analyze(self, webpage: IWebPage, previous: Optional[PageState] = None) -> Tuple[AnalysisResult, PageState]:
+        """
+        Analyze the web page.
+
+        :param webpage: The Webpage to analyze
+        :param previous: The state of a previous analysis of the same page, if any.
+        :return: Tuple: the result, as `Wappalyzer.analyze_result`, and the new state of the page.
+        """
+        wappalyzer = self.wappalyzer
+        if previous is not None and previous.ruleset != self.ruleset:
+            previous = None
+        families = wappalyzer._get_families(webpage)
+        digests = get_digests(webpage, families)
+        state = PageState(self.ruleset, digests, {})
+
+        with maybe_span(wappalyzer.tracer, 'analyze', url=webpage.url) as outcome:
+            metrics = get_metrics()
+            start = time.perf_counter() if metrics else 0.0
+            memo: Dict[Any, Any] = {}
+            technologies = wappalyzer.technologies.values()
+            for family in families:
+                if previous is None or family not in previous.digests:
+                    state.detections[family] = self._evaluate(webpage, family, technologies, memo)
+                elif family in KEYED_FAMILIES:
+                    old, new = previous.digests[family], digests[family]
+                    assert isinstance(old, dict) and isinstance(new, dict)
+                    changed = {key for key in set(old) | set(new) if old.get(key) != new.get(key)}
+                    if not changed:
+                        state.reused.add(family)
+                    stale = [tech_fingerprint for tech_fingerprint in technologies
+                             if not changed.isdisjoint(getattr(tech_fingerprint, family))]
+                    detections = {tech_name: tech for tech_name, tech in previous.detections[family].items()
+                                  if changed.isdisjoint(getattr(wappalyzer.technologies[tech_name], family))}
+                    detections.update(self._evaluate(webpage, family, stale, memo) if stale else {})
+                    state.detections[family] = detections
+                elif previous.digests[family] == digests[family]:
+                    state.reused.add(family)
+                    state.detections[family] = previous.detections[family]
+                else:
+                    state.detections[family] = self._evaluate(webpage, family, technologies, memo)
+
+            detections = merge_detections(families, state.detections)
+            detected_technologies = self._resolve(webpage, detections, start)
+            outcome['detected'] = sorted(detected_technologies)
+            outcome['reused'] = sorted(state.reused)
+
+        return wappalyzer._make_result(webpage, detections, detected_technologies), state
+
+    def _resolve(self, webpage: IWebPage, detections: Dict[str, Technology], start: float) -> Set[str]:
+        """
+        Resolve the relations, store the merged detections of the page that survive them, 
+        then resolve the implied technologies.
+
+        :param start: Start time of the pattern matching, for the metrics.
+        :return: The detected technologies.
+        """
+        wappalyzer = self.wappalyzer
+        metrics = get_metrics()
+        detected_technologies = wappalyzer._resolve_relations(detections.__contains__)
+        # Every fingerprint is evaluated: drop the excluded technologies and the missing requirements
+        wappalyzer.detected_technologies[webpage.url] = {tech_name: technology for tech_name, technology in detections.items()
+                                                         if tech_name in detected_technologies}
+        if metrics:
+            metrics.observe('wappalyzer_match_seconds', time.perf_counter() - start)
+            start = time.perf_counter()
+        wappalyzer._resolve_implied_technologies(webpage, detected_technologies)
+        if metrics:
+            wappalyzer._record_metrics(metrics, start, detected_technologies)
+        return detected_technologies
@@ -0,0 +1,144 @@
+"""
+Metrics of the fetch and analysis stages.
+
+Metrics are disabled by default. Install a metrics sink to enable them:
+
+>>> from Wappalyzer.metrics import InMemoryMetrics, set_metrics
+>>> metrics = InMemoryMetrics()
+>>> set_metrics(metrics)
+>>> wappalyzer.analyze(WebPage.new_from_url('http://example.com'))
+>>> print(metrics.to_prometheus())
+
+The following metrics are reported:
+
+- ``wappalyzer_fetch_seconds``: histogram, network fetch of `WebPage.new_from_url` and co.
+- ``wappalyzer_fetched_bytes_total``: counter, size of the fetched content.
+- ``wappalyzer_parse_seconds``: histogram, HTML parsing of the WebPage.
+- ``wappalyzer_match_seconds``: histogram, pattern matching of a web page.
+- ``wappalyzer_version_seconds``: histogram, version extraction of a pattern match.
+- ``wappalyzer_implies_seconds``: histogram, resolution of the implied technologies.
+- ``wappalyzer_pages_analyzed_total``: counter.
+- ``wappalyzer_detections_total``: counter, label ``technology``.
+- ``wappalyzer_errors_total``: counter, labels ``stage`` and ``type`` (exception class name).
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+try:
+    from typing import Protocol
+except ImportError:
+    Protocol = object # type: ignore
+
+class IMetrics(Protocol):
+    """
+    Interface of a metrics sink.
+    """
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increment a counter."""
+        raise NotImplementedError()
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record a value (usually a latency in seconds) in a histogram."""
+        raise NotImplementedError()
+
+_metrics: Optional[IMetrics] = None
+
+def set_metrics(metrics: Optional[IMetrics]) -> None:
+    """
+    Install the metrics sink used by python-Wappalyzer, or disable metrics with None.
+    """
+    global _metrics
+    _metrics = metrics
+
+def get_metrics() -> Optional[IMetrics]:
+    """
+    Get the installed metrics sink, None if metrics are disabled.
+    """
+    return _metrics
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+class _Histogram:
+    __slots__ = ('buckets', 'sum', 'count')
+    def __init__(self, size: int) -> None:
+        self.buckets: List[int] = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+class InMemoryMetrics(IMetrics):
+    """
+    Zero-dependency, thread-safe, in-process metrics sink.
+    Exports a snapshot in the Prometheus text format with `to_prometheus`.
+    """
+
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        """
+        :param buckets: Upper bounds of the histogram buckets.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._counters: Dict[_Key, float] = {}
+        self._histograms: Dict[_Key, _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram.buckets[index] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def get_counter(self, name: str, **labels: str) -> float:
+        """
+        Get the value of a counter.
+        """
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def get_count(self, name: str, **labels: str) -> int:
+        """
+        Get the number of values recorded in a histogram.
+        """
+        histogram = self._histograms.get((name, tuple(sorted(labels.items()))))
+        return histogram.count if histogram else 0
+
+    @staticmethod
+    def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+        if not labels:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                              for k, v in labels) + '}'
+
+    def to_prometheus(self) -> str:
+        """
+        Snapshot of the metrics in the Prometheus text exposition format.
+        """
+        lines: List[str] = []
+        typed = set()
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append('# TYPE {} counter'.format(name))
+                    typed.add(name)
+                lines.append('{}{} {}'.format(name, self._format_labels(labels), value))
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append('# TYPE {} histogram'.format(name))
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.buckets):
+                    cumulative += count
+                    lines.append('{}_bucket{} {}'.format(name, self._format_labels(labels + (('le', repr(bound)),)), cumulative))
+                lines.append('{}_bucket{} {}'.format(name, self._format_labels(labels + (('le', '+Inf'),)), histogram.count))
+                lines.append('{}_sum{} {}'.format(name, self._format_labels(labels), histogram.sum))
+                lines.append('{}_count{} {}'.format(name, self._format_labels(labels), histogram.count))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,241 @@
+"""
+Reuse the detections of near-duplicate pages.
+
+Large hosting platforms serve thousands of pages built from the same templates, differing only in titles,
+IDs or contents. `NearDuplicateAnalyzer` computes a cheap structural sketch of each page: a 64-bit simhash
+of the tag sequence (shingles of 3 tags), of the script URLs, of the meta names and of the normalized headers.
+The sketches of the pages recently analyzed are kept in a bounded index. When a page is near-duplicate of an
+indexed page (the Hamming distance of the sketches is within the similarity threshold):
+
+- the ``url``, ``headers`` and ``meta`` pattern families are evaluated as usual, they are cheap,
+- the detections of the ``scripts``, ``html`` and ``dom`` families are reused from the indexed page,
+  except for the fingerprints of these families that can extract a version: they are evaluated again.
+
+Only the pages fully analyzed are indexed. The results of a near-duplicate are approximate:
+a technology only present in the changed parts of the page might be missed.
+
+>>> from Wappalyzer.neardup import NearDuplicateAnalyzer
+>>> analyzer = NearDuplicateAnalyzer(Wappalyzer.latest(), threshold=0.95)
+>>> for webpage in webpages:
+...     result = analyzer.analyze(webpage)
+>>> analyzer.hit_rate
+0.83
+
+The lookups are counted by the ``wappalyzer_near_duplicate_lookups_total`` metric, label ``result`` (``hit`` or ``miss``),
+see `Wappalyzer.metrics`. The ``analyze`` stage outcome has a ``near_duplicate`` attribute: the URL of the indexed page, if any.
+"""
+import collections
+import hashlib
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .Wappalyzer import Wappalyzer, AnalysisResult
+from .incremental import IncrementalAnalyzer, merge_detections, _Detections
+from .metrics import get_metrics
+from .tracing import maybe_span
+from .webpage import IWebPage
+
+# Pattern families whose detections are reused from a near-duplicate page.
+# The other ones are cheap and always evaluated.
+REUSED_FAMILIES = ('scripts', 'html', 'dom')
+
+# Headers whose values change from a response to another, only their names are part of the sketch
+VOLATILE_HEADERS = frozenset(('date', 'expires', 'last-modified', 'etag', 'age', 'content-length', 'set-cookie',
+                              'x-request-id', 'x-runtime', 'cf-ray', 'report-to', 'nel'))
+
+SKETCH_BITS = 64
+
+_TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9:-]*)')
+_DIGITS_RE = re.compile(r'\d+')
+
+def _iter_features(webpage: IWebPage) -> Iterator[str]:
+    """
+    Iterate over the structural features of the web page.
+    """
+    tags = [tag.lower() for tag in _TAG_RE.findall(webpage.html)]
+    for index in range(max(len(tags) - 2, 1)):
+        yield 'tag:' + ' '.join(tags[index:index + 3])
+    for script in webpage.scripts:
+        yield 'script:' + _DIGITS_RE.sub('0', script)
+    for name in webpage.meta:
+        yield 'meta:' + name
+    for name, value in webpage.headers.items():
+        name = name.lower()
+        yield 'header:' + name if name in VOLATILE_HEADERS else 'header:{}:{}'.format(name, _DIGITS_RE.sub('0', value))
+
+def get_sketch(webpage: IWebPage) -> int:
+    """
+    Compute the simhash of the structural features of the web page, as a 64-bit integer.
+    The sketches of similar pages only differ by a few bits.
+    """
+    weights = [0] * SKETCH_BITS
+    for feature in set(_iter_features(webpage)):
+        value = int.from_bytes(hashlib.blake2b(feature.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+        for bit in range(SKETCH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    sketch = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            sketch |= 1 << bit
+    return sketch
+
+def get_distance(sketch: int, other: int) -> int:
+    """
+    Get the Hamming distance of two sketches: the number of different bits.
+    """
+    return bin(sketch ^ other).count('1')
+
+class _Entry:
+    __slots__ = ('url', 'sketch', 'detections')
+    def __init__(self, url: str, sketch: int, detections: Dict[str, _Detections]) -> None:
+        self.url = url
+        self.sketch = sketch
+        self.detections = detections
+
+class NearDuplicateIndex:
+    """
+    A bounded index of page sketches, the least recently used are evicted.
+
+    The sketches are split in bands: two sketches within the maximum distance have at least one identical band,
+    so only the entries sharing a band with the looked up sketch are compared.
+    """
+
+    def __init__(self, max_distance: int, size: int = 4096) -> None:
+        """
+        :param max_distance: Maximum Hamming distance of near-duplicate sketches, in bits.
+        :param size: Maximum number of entries.
+        """
+        self.max_distance = max_distance
+        self.size = size
+        self._entries: 'collections.OrderedDict[int, _Entry]' = collections.OrderedDict()
+        bands = min(max_distance + 1, SKETCH_BITS)
+        width = SKETCH_BITS // bands
+        # (shift, mask) of each band, the last one holds the remaining bits
+        self._bands: List[Tuple[int, int]] = [(index * width, (1 << (width if index < bands - 1 else SKETCH_BITS - index * width)) - 1)
+                                              for index in range(bands)]
+        self._buckets: Dict[Tuple[int, int], Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _iter_keys(self, sketch: int) -> Iterator[Tuple[int, int]]:
+        for index, (shift, mask) in enumerate(self._bands):
+            yield index, sketch >> shift & mask
+
+    def add(self, entry: _Entry) -> None:
+        if entry.sketch in self._entries:
+            self._entries.move_to_end(entry.sketch)
+            self._entries[entry.sketch] = entry
+            return
+        self._entries[entry.sketch] = entry
+        for key in self._iter_keys(entry.sketch):
+            self._buckets.setdefault(key, set()).add(entry.sketch)
+        if len(self._entries) > self.size:
+            _, evicted = self._entries.popitem(last=False)
+            for key in self._iter_keys(evicted.sketch):
+                bucket = self._buckets[key]
+                bucket.discard(evicted.sketch)
+                if not bucket:
+                    del self._buckets[key]
+
+    def find(self, sketch: int) -> Optional[_Entry]:
+        """
+        Find the nearest entry within the maximum distance, if any.
+        """
+        candidates: Set[int] = set()
+        for key in self._iter_keys(sketch):
+            candidates.update(self._buckets.get(key, ()))
+        best: Optional[int] = None
+        best_distance = self.max_distance + 1
+        for candidate in candidates:
+            distance = get_distance(sketch, candidate)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        if best is None:
+            return None
+        self._entries.move_to_end(best)
+        return self._entries[best]
+
+class NearDuplicateAnalyzer:
+    """
+    Analyze web pages, reusing the detections of the near-duplicate pages analyzed recently.
+    """
+
+    def __init__(self, wappalyzer: Optional[Wappalyzer] = None,
+                 threshold: float = 0.95,
+                 size: int = 4096) -> None:
+        """
+        :param wappalyzer: Wappalyzer instance, defaults to ``Wappalyzer.latest()``.
+        :param threshold: Minimum similarity of near-duplicate pages, between 0 and 1:
+            the fraction of identical bits of their sketches. 1 only reuses the detections of identical sketches.
+        :param size: Maximum number of pages in the index.
+        """
+        if not 0 <= threshold <= 1:
+            raise ValueError("The similarity threshold must be between 0 and 1")
+        self.wappalyzer = wappalyzer or Wappalyzer.latest()
+        self.threshold = threshold
+        self.index = NearDuplicateIndex(int((1 - threshold) * SKETCH_BITS), size)
+        self.lookups = 0
+        """Number of pages looked up in the index."""
+        self.hits = 0
+        """Number of pages whose detections have been reused from a near-duplicate."""
+        self._incremental = IncrementalAnalyzer(self.wappalyzer)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of the pages looked up that were near-duplicates.
+        """
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def analyze(self, webpage: IWebPage) -> AnalysisResult:
+        """
+        Analyze the web page, or reuse the detections of a near-duplicate.
+
+        :param webpage: The Webpage to analyze
+        :return: The result, as `Wappalyzer.analyze_result`.
+        """
+        wappalyzer = self.wappalyzer
+        result = wappalyzer._get_memoized_result(webpage)
+        if result is not None:
+            return result
+        if getattr(webpage, 'partial', False):
+            # Only headers, nothing to reuse
+            return wappalyzer.analyze_result(webpage)
+
+        metrics = get_metrics()
+        sketch = get_sketch(webpage)
+        neighbor = self.index.find(sketch)
+        self.lookups += 1
+        if metrics:
+            metrics.increment('wappalyzer_near_duplicate_lookups_total', result='miss' if neighbor is None else 'hit')
+        if neighbor is None:
+            result, state = self._incremental.analyze(webpage)
+            self.index.add(_Entry(webpage.url, sketch, state.detections))
+            return result
+        self.hits += 1
+
+        with maybe_span(wappalyzer.tracer, 'analyze', url=webpage.url) as outcome:
+            start = time.perf_counter() if metrics else 0.0
+            memo: Dict[Any, Any] = {}
+            families = wappalyzer._get_families(webpage)
+            detections: Dict[str, _Detections] = {}
+            for family in families:
+                if family in REUSED_FAMILIES and family in neighbor.detections:
+                    reused = neighbor.detections[family]
+                    # Versions might differ: evaluate the versioned patterns again
+                    versioned = [wappalyzer.technologies[tech_name] for tech_name in reused
+                                 if family in wappalyzer.technologies[tech_name].versioned_families]
+                    detections[family] = {tech_name: tech for tech_name, tech in reused.items()
+                                          if family not in wappalyzer.technologies[tech_name].versioned_families}
+                    if versioned:
+                        detections[family].update(self._incremental._evaluate(webpage, family, versioned, memo))
+                else:
+                    detections[family] = self._incremental._evaluate(webpage, family, wappalyzer.technologies.values(), memo)
+            merged = merge_detections(families, detections)
+            detected_technologies = self._incremental._resolve(webpage, merged, start)
+            outcome['detected'] = sorted(detected_technologies)
+            outcome['near_duplicate'] = neighbor.url
+
+        return wappalyzer._make_result(webpage, merged, detected_technologies)
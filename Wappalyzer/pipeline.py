@@ -0,0 +1,134 @@
+"""
+Analyze a stream of stored pages, optionally with a pool of worker processes, and write the results as NDJSON.
+
+>>> from Wappalyzer import Wappalyzer
+>>> from Wappalyzer.sources import iter_warc
+>>> from Wappalyzer.pipeline import analyze_records, write_ndjson
+>>> wappalyzer = Wappalyzer.latest(technologies_file='new-technologies.json')
+>>> with open('results.ndjson', 'w') as output:
+...     write_ndjson(analyze_records(iter_warc('crawl.warc.gz'), wappalyzer, processes=8), output)
+"""
+import itertools
+import json
+import multiprocessing
+import os
+from typing import Any, Dict, Iterable, Iterator, Optional, TextIO, Tuple, Type
+
+from .Wappalyzer import Wappalyzer
+from .sources import Record
+from .webpage import WebPage
+
+Result = Tuple[str, Dict[str, Dict[str, Any]]]
+
+# State of the worker processes
+_worker_wappalyzer: Optional[Wappalyzer] = None
+_worker_webpage_class: Type[WebPage] = WebPage
+
+def _init_worker(wappalyzer: Wappalyzer, webpage_class: Type[WebPage]) -> None:
+    """
+    Install the Wappalyzer instance in a worker process: the ruleset is only pickled once per worker.
+    """
+    global _worker_wappalyzer, _worker_webpage_class
+    _worker_wappalyzer = wappalyzer
+    _worker_webpage_class = webpage_class
+
+def _analyze_record(record: Record) -> Result:
+    """
+    Analyze a record with the worker's Wappalyzer instance.
+    """
+    assert _worker_wappalyzer is not None
+    webpage = record.to_webpage(_worker_webpage_class)
+    try:
+        return webpage.url, _worker_wappalyzer.analyze_with_versions_and_categories(webpage)
+    finally:
+        # Do not keep the detections of each page in long running workers
+        _worker_wappalyzer.detected_technologies.pop(webpage.url, None)
+
+def analyze_records(records: Iterable[Record],
+                    wappalyzer: Optional[Wappalyzer] = None,
+                    processes: int = 0,
+                    webpage_class: Type[WebPage] = WebPage,
+                    chunksize: int = 16) -> Iterator[Result]:
+    """
+    Analyze the records, in the order they are given.
+
+    :param records: Stored pages, see `Wappalyzer.sources`. Records are pickled to the worker processes: 
+        `FileRecord` objects only hold paths, the files are read by the workers.
+    :param wappalyzer: Wappalyzer instance, defaults to ``Wappalyzer.latest()``.
+    :param processes: Number of worker processes, 0 to analyze the records in the current process.
+    :param webpage_class: WebPage class used to parse the HTML.
+    :param chunksize: Number of records sent to a worker at once.
+    :return: Iterator of tuples: URL, result of `Wappalyzer.analyze_with_versions_and_categories`.
+    """
+    wappalyzer = wappalyzer or Wappalyzer.latest()
+    if processes:
+        with multiprocessing.Pool(processes, initializer=_init_worker,
+                                  initargs=(wappalyzer, webpage_class)) as pool:
+            yield from pool.imap(_analyze_record, records, chunksize)
+    else:
+        _init_worker(wappalyzer, webpage_class)
+        for record in records:
+            yield _analyze_record(record)
+
+def write_ndjson(results: Iterable[Result], output: TextIO) -> int:
+    """
+    Write the results as newline delimited JSON objects with keys ``url`` and ``technologies``.
+
+    :return: The number of results written.
+    """
+    count = 0
+    for url, technologies in results:
+        output.write(json.dumps({'url': url, 'technologies': technologies}) + '\n')
+        count += 1
+    return count
+
+def analyze_to_ndjson(records: Iterable[Record], 
+                      output_path: str,
+                      checkpoint_path: Optional[str] = None,
+                      checkpoint_every: int = 1000,
+                      **kwargs: Any) -> int:
+    """
+    Analyze the records and write the results to a NDJSON file, with resumable checkpoints.
+
+    Every `checkpoint_every` results, the output is flushed to disk and the number of records done 
+    is saved in the checkpoint file. Calling again with the same records (in the same order) and 
+    the same files resumes the scan after the last checkpoint: the results written after it are discarded. 
+
+    >>> from Wappalyzer.sources import iter_directory
+    >>> analyze_to_ndjson(iter_directory('snapshots/'), 'results.ndjson', 'results.checkpoint', processes=8)
+
+    :param records: Stored pages, see `Wappalyzer.sources`.
+    :param output_path: The NDJSON results file.
+    :param checkpoint_path: The checkpoint file, None to always start from scratch.
+    :param checkpoint_every: Number of results between two checkpoints.
+    :param kwargs: Passed to `analyze_records`.
+    :return: The total number of results in the output file.
+    """
+    done, offset = 0, 0
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r', encoding='utf-8') as fd:
+            checkpoint = json.load(fd)
+        done, offset = checkpoint['records'], checkpoint['offset']
+    if not os.path.exists(output_path):
+        done, offset = 0, 0
+
+    def save_checkpoint() -> None:
+        output.flush()
+        os.fsync(output.fileno())
+        if checkpoint_path:
+            tmp_path = checkpoint_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as fd:
+                json.dump({'records': done, 'offset': output.tell()}, fd)
+            os.replace(tmp_path, checkpoint_path)
+
+    with open(output_path, 'r+b' if done else 'wb') as output:
+        # Drop the results written after the checkpoint
+        output.seek(offset)
+        output.truncate()
+        for url, technologies in analyze_records(itertools.islice(records, done, None), **kwargs):
+            output.write(json.dumps({'url': url, 'technologies': technologies}).encode('utf-8') + b'\n')
+            done += 1
+            if done % checkpoint_every == 0:
+                save_checkpoint()
+        save_checkpoint()
+    return done
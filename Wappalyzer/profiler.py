@@ -0,0 +1,318 @@
+"""
+Audit the cost of a ruleset against a local corpus of pages, before rolling it out.
+
+Every pattern and DOM selector of every fingerprint is timed individually on each page, without the
+deduplication and the shortcuts of the engine: the profile tells what each pattern costs on its own.
+
+>>> from Wappalyzer.profiler import profile_ruleset, iter_corpus
+>>> profile, = profile_ruleset(iter_corpus('crawl.warc.gz'), Wappalyzer.latest())
+>>> print(profile.format(top=20))
+
+Or with the command line:
+
+.. code-block:: shell
+
+    python -m Wappalyzer profile-rules crawl.warc.gz --technologies-file technologies.json
+    python -m Wappalyzer profile-rules pages/ --technologies-file old.json --compare new.json
+"""
+import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple, Type
+
+from .Wappalyzer import Wappalyzer
+from .fingerprint import FAMILIES, Pattern
+from .sources import Record, iter_directory, iter_har, iter_ndjson, iter_warc
+from .webpage import IWebPage, WebPage
+
+class PatternCost:
+    """
+    The cost of a pattern, or of a DOM selector, over the corpus.
+    """
+    __slots__ = ('technology', 'family', 'key', 'pattern', 'seconds', 'evaluations', 'matches')
+
+    def __init__(self, technology: str, family: str, key: str, pattern: str) -> None:
+        self.technology = technology
+        self.family = family
+        self.key = key
+        """Header or meta name, empty for the other families."""
+        self.pattern = pattern
+        """The regular expression, or the CSS selector."""
+        self.seconds = 0.0
+        self.evaluations = 0
+        """Number of strings searched."""
+        self.matches = 0
+        """Number of pages where the pattern matched."""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class RulesetProfile:
+    """
+    The costs of the patterns of a ruleset over a corpus of pages.
+    """
+
+    def __init__(self, wappalyzer: Wappalyzer) -> None:
+        """
+        :param wappalyzer: The ruleset to profile.
+        """
+        self.wappalyzer = wappalyzer
+        self.pages = 0
+        self.costs: Dict[Tuple[str, str, str, str], PatternCost] = {}
+        """The pattern costs, by (technology, family, key, pattern)."""
+        self.detections: Dict[str, int] = {}
+        """Number of pages matched by at least one pattern, by technology."""
+        for tech_name, tech_fingerprint in wappalyzer.technologies.items():
+            for family in FAMILIES:
+                for key, pattern in self._iter_patterns(tech_fingerprint, family):
+                    self._get_cost(tech_name, family, key, pattern)
+
+    @staticmethod
+    def _iter_patterns(tech_fingerprint: Any, family: str) -> Iterator[Tuple[str, str]]:
+        if family in ('headers', 'meta'):
+            for name, patterns in getattr(tech_fingerprint, family).items():
+                for pattern in patterns:
+                    yield name, pattern.string
+        elif family == 'dom':
+            for selector in tech_fingerprint.dom:
+                yield '', selector.selector
+                for pattern in selector.text or ():
+                    yield 'text', pattern.string
+                for name, patterns in (selector.attributes or {}).items():
+                    for pattern in patterns:
+                        yield name, pattern.string
+        else:
+            for pattern in getattr(tech_fingerprint, family):
+                yield '', pattern.string
+
+    def _get_cost(self, tech_name: str, family: str, key: str, pattern: str) -> PatternCost:
+        cost_key = (tech_name, family, key, pattern)
+        cost = self.costs.get(cost_key)
+        if cost is None:
+            cost = self.costs[cost_key] = PatternCost(tech_name, family, key, pattern)
+        return cost
+
+    def _search(self, tech_name: str, family: str, key: str, pattern: Pattern, contents: Sequence[str]) -> bool:
+        cost = self._get_cost(tech_name, family, key, pattern.string)
+        start = time.perf_counter()
+        matched = False
+        for content in contents:
+            if pattern.regex.search(content):
+                matched = True
+        cost.seconds += time.perf_counter() - start
+        cost.evaluations += len(contents)
+        cost.matches += matched
+        return matched
+
+    def add(self, webpage: IWebPage) -> None:
+        """
+        Time every pattern of the ruleset on the web page.
+        """
+        self.pages += 1
+        for tech_name, tech_fingerprint in self.wappalyzer.technologies.items():
+            matched = False
+            for pattern in tech_fingerprint.url:
+                matched |= self._search(tech_name, 'url', '', pattern, (webpage.url,))
+            for family, inputs in (('headers', webpage.headers), ('meta', webpage.meta)):
+                for name, patterns in getattr(tech_fingerprint, family).items():
+                    contents = (inputs[name],) if name in inputs else ()
+                    for pattern in patterns:
+                        matched |= self._search(tech_name, family, name, pattern, contents)
+            for pattern in tech_fingerprint.scripts:
+                matched |= self._search(tech_name, 'scripts', '', pattern, webpage.scripts)
+            for pattern in tech_fingerprint.html:
+                matched |= self._search(tech_name, 'html', '', pattern, (webpage.html,))
+            for selector in tech_fingerprint.dom:
+                cost = self._get_cost(tech_name, 'dom', '', selector.selector)
+                start = time.perf_counter()
+                items = list(webpage.select(selector.selector))
+                cost.seconds += time.perf_counter() - start
+                cost.evaluations += 1
+                cost.matches += bool(items)
+                if items and selector.exists:
+                    matched = True
+                for pattern in selector.text or ():
+                    matched |= self._search(tech_name, 'dom', 'text', pattern, [item.inner_html for item in items])
+                for name, patterns in (selector.attributes or {}).items():
+                    contents = [item.attributes[name] for item in items if item.attributes.get(name)]
+                    for pattern in patterns:
+                        matched |= self._search(tech_name, 'dom', name, pattern, contents)
+            if matched:
+                self.detections[tech_name] = self.detections.get(tech_name, 0) + 1
+
+    @property
+    def seconds(self) -> float:
+        """Total time of the patterns."""
+        return sum(cost.seconds for cost in self.costs.values())
+
+    def get_patterns(self) -> List[PatternCost]:
+        """
+        Get the costs of the patterns, slowest first.
+        """
+        return sorted(self.costs.values(), key=lambda cost: -cost.seconds)
+
+    def get_technologies(self) -> Dict[str, float]:
+        """
+        Get the time of the patterns of each fingerprint, slowest first.
+        """
+        technologies: Dict[str, float] = {tech_name: 0.0 for tech_name in self.wappalyzer.technologies}
+        for cost in self.costs.values():
+            technologies[cost.technology] += cost.seconds
+        return dict(sorted(technologies.items(), key=lambda item: -item[1]))
+
+    def get_families(self) -> Dict[str, float]:
+        """
+        Get the time of the patterns of each family, slowest first.
+        """
+        families: Dict[str, float] = {family: 0.0 for family in FAMILIES}
+        for cost in self.costs.values():
+            families[cost.family] += cost.seconds
+        return dict(sorted(families.items(), key=lambda item: -item[1]))
+
+    def get_unmatched(self) -> List[PatternCost]:
+        """
+        Get the patterns that never matched on the corpus, slowest first.
+        """
+        return [cost for cost in self.get_patterns() if not cost.matches]
+
+    def _percent(self, seconds: float) -> float:
+        total = self.seconds
+        return 100 * seconds / total if total else 0.0
+
+    def _rate(self, matches: int) -> float:
+        return 100 * matches / self.pages if self.pages else 0.0
+
+    def to_dict(self, top: int = 20) -> Dict[str, Any]:
+        """
+        Get a JSON-serializable report.
+
+        :param top: Number of patterns and fingerprints reported.
+        """
+        technologies = self.get_technologies()
+        return {
+            'pages': self.pages,
+            'seconds': self.seconds,
+            'patterns': [dict(cost.to_dict(), percent=self._percent(cost.seconds), match_rate=self._rate(cost.matches))
+                         for cost in self.get_patterns()[:top]],
+            'technologies': [{'technology': tech_name, 'seconds': seconds, 'percent': self._percent(seconds),
+                              'match_rate': self._rate(self.detections.get(tech_name, 0))}
+                             for tech_name, seconds in list(technologies.items())[:top]],
+            'families': {family: {'seconds': seconds, 'percent': self._percent(seconds)}
+                         for family, seconds in self.get_families().items()},
+            'unmatched': [{'technology': cost.technology, 'family': cost.family, 'key': cost.key, 'pattern': cost.pattern}
+                          for cost in self.get_unmatched()],
+        }
+
+    def format(self, top: int = 20) -> str:
+        """
+        Get a human readable report.
+
+        :param top: Number of patterns and fingerprints reported.
+        """
+        report = self.to_dict(top)
+        lines = ['{} patterns, {} fingerprints, {} pages, {:.3f}s'.format(
+            len(self.costs), len(self.wappalyzer.technologies), self.pages, report['seconds'])]
+        lines += ['', 'Slowest patterns:', '{:>7} {:>10} {:>7}  {}'.format('time', 'seconds', 'match', 'pattern')]
+        for cost in report['patterns']:
+            lines.append('{:>6.1f}% {:>10.4f} {:>6.1f}%  {} {}{}: {}'.format(cost['percent'], cost['seconds'], cost['match_rate'],
+                cost['technology'], cost['family'], ' ' + cost['key'] if cost['key'] else '', _shorten(cost['pattern'])))
+        lines += ['', 'Slowest fingerprints:', '{:>7} {:>10} {:>7}  {}'.format('time', 'seconds', 'match', 'technology')]
+        for tech in report['technologies']:
+            lines.append('{:>6.1f}% {:>10.4f} {:>6.1f}%  {}'.format(tech['percent'], tech['seconds'], tech['match_rate'],
+                                                                tech['technology']))
+        lines += ['', 'Families:']
+        for family, cost in report['families'].items():
+            lines.append('{:>6.1f}% {:>10.4f}  {}'.format(cost['percent'], cost['seconds'], family))
+        lines += ['', 'Never matched: {} of {} patterns'.format(len(report['unmatched']), len(self.costs))]
+        for cost in report['unmatched'][:top]:
+            lines.append('  {} {}{}: {}'.format(cost['technology'], cost['family'],
+                                               ' ' + cost['key'] if cost['key'] else '', _shorten(cost['pattern'])))
+        return '\n'.join(lines)
+
+def _shorten(text: str, width: int = 80) -> str:
+    return text if len(text) <= width else text[:width - 3] + '...'
+
+def compare_profiles(before: RulesetProfile, after: RulesetProfile) -> Dict[str, Any]:
+    """
+    Compare the costs of two versions of a ruleset, profiled on the same corpus.
+
+    :return: A JSON-serializable dict: ``before`` and ``after`` total seconds, the ``ratio`` of the totals,
+        and the ``technologies``: the cost difference of each fingerprint, largest increase first,
+        with the ``status`` ``added``, ``removed`` or ``changed``.
+    """
+    old, new = before.get_technologies(), after.get_technologies()
+    technologies = []
+    for tech_name in list(old) + [tech_name for tech_name in new if tech_name not in old]:
+        if tech_name not in new:
+            status = 'removed'
+        elif tech_name not in old:
+            status = 'added'
+        else:
+            status = 'changed'
+        seconds_before, seconds_after = old.get(tech_name, 0.0), new.get(tech_name, 0.0)
+        technologies.append({'technology': tech_name, 'status': status, 'before': seconds_before,
+                             'after': seconds_after, 'delta': seconds_after - seconds_before})
+    technologies.sort(key=lambda tech: -tech['delta'])
+    return {
+        'before': before.seconds,
+        'after': after.seconds,
+        'ratio': after.seconds / before.seconds if before.seconds else None,
+        'technologies': technologies,
+    }
+
+def format_comparison(comparison: Dict[str, Any], top: int = 20) -> str:
+    """
+    Get a human readable report of `compare_profiles`.
+    """
+    ratio = comparison['ratio']
+    lines = ['Total: {:.3f}s -> {:.3f}s ({})'.format(comparison['before'], comparison['after'],
+             '{:+.1f}%'.format(100 * (ratio - 1)) if ratio is not None else 'n/a')]
+    lines += ['', 'Largest cost increases:', '{:>10} {:>10} {:>10}  {}'.format('before', 'after', 'delta', 'technology')]
+    for tech in comparison['technologies'][:top]:
+        if tech['delta'] <= 0:
+            break
+        lines.append('{:>10.4f} {:>10.4f} {:>+10.4f}  {}{}'.format(tech['before'], tech['after'], tech['delta'], tech['technology'],
+                     ' ({})'.format(tech['status']) if tech['status'] != 'changed' else ''))
+    return '\n'.join(lines)
+
+def iter_corpus(path: str) -> Iterator[Record]:
+    """
+    Iterate over a corpus of pages: a directory of HTML files (see `Wappalyzer.sources.iter_directory`),
+    a WARC, HAR or NDJSON file (see `Wappalyzer.sources.iter_ndjson`), plain or gzip.
+    """
+    if os.path.isdir(path):
+        return iter_directory(path)
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith(('.ndjson', '.jsonl')):
+        return iter_ndjson(path)
+    if name.endswith('.har'):
+        return iter_har(path)
+    if name.endswith('.warc'):
+        return iter_warc(path)
+    if name.endswith('.arc'):
+        # The legacy ARC format has different record headers
+        raise ValueError("ARC files are not supported: {}, convert them to WARC first".format(path))
+    raise ValueError("Unknown corpus type: {}, expected a directory, a WARC, HAR or NDJSON file".format(path))
+
+def profile_ruleset(records: Iterable[Record], *wappalyzers: Wappalyzer,
+                    webpage_class: Type[WebPage] = WebPage) -> List[RulesetProfile]:
+    """
+    Profile one or several rulesets over a corpus. Each page is parsed once and profiled with each ruleset in turn, 
+    in alternating order. The first page is profiled once more beforehand, untimed, to warm up the caches 
+    (CSS selectors compilation): it would bias the comparison of the rulesets.
+
+    :param records: Stored pages, see `Wappalyzer.sources`.
+    :param wappalyzers: The rulesets to profile.
+    :param webpage_class: WebPage class used to parse the HTML.
+    :return: The profiles, in the order of the rulesets.
+    """
+    profiles = [RulesetProfile(wappalyzer) for wappalyzer in wappalyzers]
+    for index, record in enumerate(records):
+        webpage = record.to_webpage(webpage_class)
+        if index == 0:
+            for wappalyzer in wappalyzers:
+                RulesetProfile(wappalyzer).add(webpage)
+        for profile in (profiles if index % 2 == 0 else reversed(profiles)):
+            profile.add(webpage)
+    return profiles
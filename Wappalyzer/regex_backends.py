@@ -0,0 +1,193 @@
+"""
+Regular expression engines for the patterns of the ruleset.
+
+The patterns of ``technologies.json`` are JavaScript regular expressions. Each one is compiled
+with the first backend of a preference list that supports it:
+
+- ``re``: the standard library engine, backtracking.
+- ``regex``: the `regex <https://pypi.org/project/regex/>`_ module, backtracking, closer to JavaScript
+  (variable-length lookbehinds, for instance) and able to give up on a pattern after a timeout.
+  Install it with ``pip install python-Wappalyzer[regex]``.
+- ``re2``: Google's `RE2 <https://github.com/google/re2>`_ engine, matches in linear time of the input
+  but does not support backreferences nor lookarounds.
+  Install it with ``pip install python-Wappalyzer[re2]``.
+
+The patterns no backend can compile never match, their backend is ``none``.
+The backend of each pattern is recorded in ``Pattern.backend``, see `Wappalyzer.get_regex_backends`.
+
+>>> wappalyzer = Wappalyzer.latest(regex_backends=('re2', 'regex', 're'))
+>>> wappalyzer.get_regex_backends()
+{'re2': 1884, 'regex': 2, 'none': 1}
+
+Use ``regex_backends=('re2',)`` to guarantee linear-time matching, at the cost of the patterns RE2 does not support.
+"""
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+try:
+    from typing import Protocol
+except ImportError:
+    Protocol = object # type: ignore
+
+logger = logging.getLogger(name="python-Wappalyzer")
+
+# The standard library first: same matches as before,
+# then the regex module for the expressions the standard library can't compile.
+DEFAULT_BACKENDS = ('re', 'regex')
+
+# Backend of the expressions that no backend can compile
+NONE_BACKEND = 'none'
+
+class IRegexBackend(Protocol):
+    """
+    Interface of a regular expression backend.
+    """
+    name: str
+    """Backend name."""
+    def compile(self, expression: str) -> Any:
+        """
+        Compile a case insensitive expression.
+
+        :return: A compiled expression, with the ``search`` and ``findall`` methods of a `re.Pattern`.
+        :raise Exception: If the backend does not support the expression.
+        """
+        raise NotImplementedError()
+
+class StdlibBackend:
+    """
+    The standard library `re` module.
+    """
+    name = 're'
+
+    def compile(self, expression: str) -> 're.Pattern':
+        return re.compile(expression, re.I)
+
+class _TimeoutRegex:
+    """
+    A `regex` module pattern that gives up after a timeout: the expression does not match.
+    """
+    def __init__(self, regex: Any, timeout: float) -> None:
+        self.regex = regex
+        self.timeout = timeout
+
+    @property
+    def pattern(self) -> str:
+        return self.regex.pattern # type: ignore
+
+    def search(self, string: str) -> Any:
+        try:
+            return self.regex.search(string, timeout=self.timeout)
+        except TimeoutError:
+            logger.debug("Regex timed out: {}".format(self.regex.pattern))
+            return None
+
+    def findall(self, string: str) -> List[Any]:
+        try:
+            return self.regex.findall(string, timeout=self.timeout) # type: ignore
+        except TimeoutError:
+            logger.debug("Regex timed out: {}".format(self.regex.pattern))
+            return []
+
+class RegexModuleBackend:
+    """
+    The third-party `regex` module.
+    """
+    name = 'regex'
+
+    def __init__(self, timeout: Optional[float] = None) -> None:
+        """
+        :param timeout: Matching time limit of a pattern against a content, in seconds.
+            The pattern does not match when it times out.
+        """
+        # Raise ImportError now if not installed. The module is not stored: the backends are pickled with the ruleset.
+        import regex
+        self.timeout = timeout
+
+    def compile(self, expression: str) -> Any:
+        import regex
+        compiled = regex.compile(expression, regex.I | regex.V0)
+        if self.timeout is not None:
+            return _TimeoutRegex(compiled, self.timeout)
+        return compiled
+
+class RE2Backend:
+    """
+    Google's RE2 engine, from the ``google-re2`` package.
+    """
+    name = 're2'
+
+    def __init__(self) -> None:
+        import re2
+
+    def compile(self, expression: str) -> Any:
+        import re2
+        options = re2.Options()
+        options.case_sensitive = False
+        # The unsupported expressions are expected, do not log them on stderr
+        options.log_errors = False
+        return re2.compile(expression, options)
+
+def get_backend(name: str, timeout: Optional[float] = None) -> IRegexBackend:
+    """
+    Create a backend by name.
+
+    :param timeout: Matching time limit of the ``regex`` backend.
+    :raise ValueError: If the name is unknown.
+    :raise ImportError: If the backend is not installed.
+    """
+    if name == 're':
+        return StdlibBackend()
+    if name == 'regex':
+        return RegexModuleBackend(timeout)
+    if name == 're2':
+        return RE2Backend()
+    raise ValueError("Unknown regex backend: {!r}, use 're', 'regex' or 're2'".format(name))
+
+class RegexCompiler:
+    """
+    Compiles each regular expression with the first backend that supports it.
+
+    It's also the intern table of the ruleset: identical expressions are compiled once.
+    """
+
+    def __init__(self, backends: Optional[Sequence[str]] = None, timeout: Optional[float] = None) -> None:
+        """
+        :param backends: Names of the backends, by preference. The backends not installed are skipped. 
+            Defaults to `DEFAULT_BACKENDS`.
+        :param timeout: Matching time limit of the ``regex`` backend, in seconds.
+        :raise ValueError: If none of the backends is installed.
+        """
+        self.backends: List[IRegexBackend] = []
+        for name in backends or DEFAULT_BACKENDS:
+            try:
+                self.backends.append(get_backend(name, timeout))
+            except ImportError:
+                if backends:
+                    logger.warning("Regex backend {!r} is not installed, skipping it".format(name))
+        if not self.backends:
+            raise ValueError("None of the regex backends {} is installed".format(', '.join(backends or DEFAULT_BACKENDS)))
+        self._compiled: Dict[str, Tuple[Any, str]] = {}
+
+    def compile(self, expression: str) -> Tuple[Any, str]:
+        """
+        Compile an expression.
+
+        :return: Tuple: the compiled expression and the backend name.
+        """
+        compiled = self._compiled.get(expression)
+        if compiled is None:
+            compiled = self._compiled[expression] = self._compile(expression)
+        return compiled
+
+    def _compile(self, expression: str) -> Tuple[Any, str]:
+        errors = []
+        for backend in self.backends:
+            try:
+                return backend.compile(expression), backend.name
+            except Exception as err:
+                errors.append('{}: {}'.format(backend.name, err))
+        # Wappalyzer is a JavaScript application therefore some of the regex wont compile in Python.
+        logger.debug("Caught '{errors}' compiling regex: {regex}".format(errors='; '.join(errors), regex=expression))
+        # regex that never matches:
+        # http://stackoverflow.com/a/1845097/413622
+        return re.compile(r'(?!x)x'), NONE_BACKEND
@@ -0,0 +1,357 @@
+"""
+Fetch many URLs fairly across hosts: a scheduling layer in front of the WebPage fetch.
+
+URL lists are often skewed, a few hosts hold most of the URLs. With ``asyncio.gather`` over
+`WebPage.new_from_url_async`, those hosts are hammered and their slow responses hold the connections
+every other host waits for. `HostScheduler` keeps a queue of URLs per host and:
+
+- caps the number of concurrent requests per host, and overall,
+- starts the requests round-robin across the hosts having queued URLs,
+- adapts the timeout of each host to its observed latency (smoothed latency plus four times its deviation,
+  as the TCP retransmission timeout), between ``min_timeout`` and ``max_timeout``,
+- backs off a host exponentially after connection errors, timeouts and ``429`` or ``503`` responses
+  (honoring ``Retry-After``), then retries the URL.
+
+The state of the idle hosts (no queued nor running request) is kept for their next requests,
+up to ``max_idle_hosts``: the least recently used are dropped.
+
+>>> from Wappalyzer.scheduler import HostScheduler
+>>> async with HostScheduler(per_host=2, concurrency=64) as scheduler:
+...     async for url, webpage in scheduler.fetch_all(urls):
+...         if isinstance(webpage, Exception):
+...             print(url, webpage)
+...         else:
+...             print(url, wappalyzer.analyze(webpage))
+
+The fetch metrics are reported as with `WebPage.new_from_url_async` (see `Wappalyzer.metrics`),
+``wappalyzer_errors_total`` only counts the final failures. The retries are counted by
+``wappalyzer_fetch_retries_total``, label ``reason`` (status code or exception class name).
+"""
+import asyncio
+import collections
+import time
+import urllib.parse
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, Optional, Tuple, Type, Union
+
+import aiohttp
+
+from .metrics import get_metrics
+from .tracing import ITracer, maybe_span
+from .webpage import IWebPage, WebPage
+
+# Responses that make the host back off
+RETRY_STATUSES = frozenset((429, 503))
+
+class _Request:
+    __slots__ = ('url', 'future', 'attempts')
+    def __init__(self, url: str, future: 'asyncio.Future[IWebPage]') -> None:
+        self.url = url
+        self.future = future
+        self.attempts = 0
+
+class HostState:
+    """
+    Scheduling state of a host.
+    """
+    def __init__(self, name: str, timeout: float) -> None:
+        self.name = name
+        self.queue: Deque[_Request] = collections.deque()
+        """Queued requests."""
+        self.active = 0
+        """Number of requests in flight."""
+        self.latency: Optional[float] = None
+        """Smoothed latency of the successful requests, in seconds."""
+        self.deviation = 0.0
+        """Smoothed deviation of the latency, in seconds."""
+        self.timeout = timeout
+        """Timeout of the next requests, in seconds."""
+        self.failures = 0
+        """Number of consecutive failures."""
+        self.backoff_until = 0.0
+        """No request is started before this time of the event loop clock."""
+
+    def __repr__(self) -> str:
+        return '<HostState {} queued={} active={} timeout={:.3f}s failures={}>'.format(
+            self.name, len(self.queue), self.active, self.timeout, self.failures)
+
+def _get_retry_after(headers: Any) -> Optional[float]:
+    """
+    Get the ``Retry-After`` delay in seconds, only the delay-seconds form is supported.
+    """
+    try:
+        return max(float(headers.get('Retry-After', '')), 0.0)
+    except ValueError:
+        return None
+
+class HostScheduler:
+    """
+    Fetch web pages with per-host queues, concurrency caps, round-robin fairness,
+    adaptive timeouts and exponential backoff.
+    """
+
+    def __init__(self, webpage_class: Type[WebPage] = WebPage,
+                 per_host: int = 2,
+                 concurrency: int = 32,
+                 timeout: float = 10,
+                 min_timeout: float = 5,
+                 max_timeout: float = 60,
+                 retries: int = 3,
+                 backoff: float = 0.5,
+                 max_backoff: float = 60,
+                 verify: bool = True,
+                 max_idle_hosts: int = 1024,
+                 aiohttp_client_session: Optional[aiohttp.ClientSession] = None,
+                 tracer: Optional[ITracer] = None,
+                 executor: Any = None,
+                 **kwargs: Any) -> None:
+        """
+        :param webpage_class: WebPage class used to parse the HTML.
+        :param per_host: Maximum number of concurrent requests per host.
+        :param concurrency: Maximum number of concurrent requests.
+        :param timeout: Timeout of the first requests to a host, in seconds.
+        :param min_timeout: Lower bound of the adaptive timeouts, in seconds.
+        :param max_timeout: Upper bound of the adaptive timeouts, in seconds.
+        :param retries: Number of retries of a URL after an error, a timeout or a ``429``/``503`` response.
+        :param backoff: Backoff delay of a host after its first failure, doubled after each
+            consecutive failure, in seconds.
+        :param max_backoff: Upper bound of the backoff delays, in seconds.
+        :param verify: Verify the SSL certificates, when the session is created by the scheduler.
+        :param max_idle_hosts: Maximum number of idle hosts whose state is kept.
+        :param aiohttp_client_session: `aiohttp.ClientSession` instance to use, optional.
+        :param tracer: Get callbacks for the fetch and parse stages, see `Wappalyzer.tracing` (optional).
+        :param executor: Parse the HTML in this `Wappalyzer.executors.AnalysisExecutor` or `concurrent.futures.Executor`,
+            off the event loop (optional).
+        :param \\*\\*kwargs: Any other arguments are passed to `aiohttp.ClientSession.get` method,
+            except ``timeout``.
+        """
+        self.webpage_class = webpage_class
+        self.per_host = per_host
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_idle_hosts = max_idle_hosts
+        self.tracer = tracer
+        self.executor = executor
+        self.hosts: Dict[str, HostState] = {}
+        """Scheduling state by host name."""
+        self.active = 0
+        """Number of requests in flight."""
+        self._verify = verify
+        self._session = aiohttp_client_session
+        self._own_session = aiohttp_client_session is None
+        self._kwargs = kwargs
+        # Hosts having queued requests, in round-robin order
+        self._ready: Deque[HostState] = collections.deque()
+        # Idle hosts, least recently used first
+        self._idle: 'collections.OrderedDict[str, HostState]' = collections.OrderedDict()
+        # Running requests by task
+        self._tasks: Dict['asyncio.Task[None]', Tuple[HostState, _Request]] = {}
+
+    async def __aenter__(self) -> 'HostScheduler':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Cancel the queued and running requests and close the session if it has been created by the scheduler.
+        """
+        for host in self._ready:
+            for request in host.queue:
+                request.future.cancel()
+            host.queue.clear()
+        self._ready.clear()
+        for task, (_, request) in list(self._tasks.items()):
+            request.future.cancel()
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=self._verify, limit=self.concurrency))
+        return self._session
+
+    def submit(self, url: str) -> 'asyncio.Future[IWebPage]':
+        """
+        Queue a URL.
+
+        :return: A future of the WebPage. Cancel it to drop the URL.
+        """
+        future: 'asyncio.Future[IWebPage]' = asyncio.get_running_loop().create_future()
+        name = urllib.parse.urlsplit(url).hostname or ''
+        host = self.hosts.get(name)
+        if host is None:
+            host = self.hosts[name] = HostState(name, self.timeout)
+        self._idle.pop(name, None)
+        if not host.queue:
+            self._ready.append(host)
+        host.queue.append(_Request(url, future))
+        self._dispatch()
+        return future
+
+    async def fetch(self, url: str) -> IWebPage:
+        """
+        Fetch a web page, waiting for its turn.
+        """
+        return await self.submit(url)
+
+    async def fetch_all(self, urls: Iterable[str]) -> AsyncIterator[Tuple[str, Union[IWebPage, BaseException]]]:
+        """
+        Fetch web pages, waiting for their turn.
+
+        :return: Asynchronous iterator of tuples: URL and WebPage, or the exception raised by the last attempt.
+            In completion order. The URLs cancelled by `close` come with a `asyncio.CancelledError`.
+        """
+        completed: 'asyncio.Queue[Tuple[str, asyncio.Future[IWebPage]]]' = asyncio.Queue()
+        futures = []
+        for url in urls:
+            future = self.submit(url)
+            future.add_done_callback(lambda future, url=url: completed.put_nowait((url, future)))
+            futures.append(future)
+        try:
+            for _ in range(len(futures)):
+                url, future = await completed.get()
+                if future.cancelled():
+                    yield url, asyncio.CancelledError()
+                else:
+                    yield url, future.exception() or future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _dispatch(self) -> None:
+        """
+        Start the queued requests, round-robin across the hosts, within the concurrency limits.
+        """
+        now = asyncio.get_running_loop().time()
+        # Number of hosts visited in a row without starting any request
+        idle = 0
+        while self._ready and self.active < self.concurrency and idle < len(self._ready):
+            host = self._ready[0]
+            self._ready.rotate(-1)
+            if host.active >= self.per_host or host.backoff_until > now:
+                idle += 1
+                continue
+            request = host.queue.popleft()
+            if not host.queue:
+                self._ready.remove(host)
+            if request.future.done():
+                # Cancelled
+                self._release(host)
+                continue
+            idle = 0
+            host.active += 1
+            self.active += 1
+            task = asyncio.get_running_loop().create_task(self._run(host, request))
+            self._tasks[task] = host, request
+            task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task: 'asyncio.Task[None]') -> None:
+        host, _ = self._tasks.pop(task)
+        self._release(host)
+
+    def _release(self, host: HostState) -> None:
+        """
+        Mark the host idle if it has no queued nor running request, and drop the least recently used idle hosts.
+        """
+        if host.queue or host.active or self.hosts.get(host.name) is not host:
+            return
+        self._idle[host.name] = host
+        self._idle.move_to_end(host.name)
+        while len(self._idle) > self.max_idle_hosts:
+            name, _ = self._idle.popitem(last=False)
+            del self.hosts[name]
+
+    def _update_timeout(self, host: HostState, latency: float) -> None:
+        if host.latency is None:
+            host.latency, host.deviation = latency, latency / 2
+        else:
+            host.deviation = 0.75 * host.deviation + 0.25 * abs(host.latency - latency)
+            host.latency = 0.875 * host.latency + 0.125 * latency
+        host.timeout = min(max(host.latency + 4 * host.deviation, self.min_timeout), self.max_timeout)
+
+    def _back_off(self, host: HostState, delay: Optional[float]) -> None:
+        loop = asyncio.get_running_loop()
+        host.failures += 1
+        if delay is None:
+            delay = self.backoff * 2 ** (host.failures - 1)
+        delay = min(delay, self.max_backoff)
+        host.backoff_until = max(host.backoff_until, loop.time() + delay)
+        loop.call_at(host.backoff_until, self._dispatch)
+
+    async def _run(self, host: HostState, request: _Request) -> None:
+        """
+        Fetch the URL once, then retry or parse the page.
+        """
+        metrics = get_metrics()
+        request.attempts += 1
+        error: Optional[BaseException] = None
+        reason, retry_after = None, None
+        start = time.perf_counter()
+        try:
+            with maybe_span(self.tracer, 'fetch', url=request.url, attempt=request.attempts) as outcome:
+                async with self._get_session().get(request.url, timeout=aiohttp.ClientTimeout(total=host.timeout),
+                                                   **self._kwargs) as response:
+                    outcome['status'] = response.status
+                    if response.status in RETRY_STATUSES:
+                        reason, retry_after = str(response.status), _get_retry_after(response.headers)
+                        error = aiohttp.ClientResponseError(response.request_info, response.history,
+                            status=response.status, message=response.reason or '', headers=response.headers)
+                    else:
+                        body = await response.read()
+                        outcome['bytes'] = len(body)
+        except asyncio.TimeoutError as err:
+            reason, error = type(err).__name__, err
+            # The adaptive timeout was too short
+            host.timeout = min(host.timeout * 2, self.max_timeout)
+        except aiohttp.ClientError as err:
+            reason, error = type(err).__name__, err
+        except Exception as err:
+            # Not worth a retry, like an invalid URL
+            error = err
+        finally:
+            host.active -= 1
+            self.active -= 1
+        latency = time.perf_counter() - start
+
+        if error is None:
+            host.failures = 0
+            self._update_timeout(host, latency)
+        elif reason is not None and request.attempts <= self.retries and not request.future.done():
+            if metrics:
+                metrics.increment('wappalyzer_fetch_retries_total', reason=reason)
+            self._back_off(host, retry_after)
+            if not host.queue:
+                self._ready.append(host)
+            host.queue.appendleft(request)
+        else:
+            if reason is not None:
+                self._back_off(host, retry_after)
+            if metrics:
+                metrics.increment('wappalyzer_errors_total', stage='fetch', type=type(error).__name__)
+            if not request.future.done():
+                request.future.set_exception(error)
+        # Start the next request before parsing this page
+        self._dispatch()
+
+        if error is None:
+            if metrics:
+                metrics.observe('wappalyzer_fetch_seconds', latency)
+                metrics.increment('wappalyzer_fetched_bytes_total', len(body))
+            try:
+                webpage = await self.webpage_class._new_from_bytes_async(str(response.url), body, response.headers,
+                                                                         self.tracer, self.executor)
+            except Exception as err:
+                if not request.future.done():
+                    request.future.set_exception(err)
+            else:
+                if not request.future.done():
+                    request.future.set_result(webpage)
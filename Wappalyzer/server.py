@@ -0,0 +1,264 @@
+"""
+Long-running HTTP analysis service: the ruleset is loaded once and shared by all the clients.
+
+Start it with ``python -m Wappalyzer serve``.
+
+Endpoints:
+
+- ``POST /analyze/url``: ``{"url": "http://example.com"}``, the server fetches the page.
+- ``POST /analyze/page``: ``{"url": "http://example.com", "html": "<html>...", "headers": {"Server": "nginx"}}``.
+- ``POST /analyze/batch``: ``{"pages": [...]}``, a list of URL or page objects.
+- ``GET /health``: status, queue usage and number of technologies.
+- ``GET /metrics``: Prometheus text format, see `Wappalyzer.metrics`. 
+  `serve` installs an `InMemoryMetrics` sink if none is installed.
+
+The analyze endpoints respond with ``{"url": "...", "technologies": {...}}``, the same technologies
+as `Wappalyzer.analyze_with_versions_and_categories`. The batch endpoint responds with ``{"results": [...]}``,
+failed items have an ``error`` key instead of ``technologies``.
+
+The pattern matching runs in a pool of worker processes. The number of pages accepted at once is bounded:
+when the queue is full the server responds ``503 Service Unavailable`` with a ``Retry-After`` header.
+The request bodies larger than ``max_request_size`` are rejected with ``413 Request Entity Too Large``,
+the pages fetched by the server are truncated to this size.
+
+:Note: The engine metrics of the worker processes are not reported by ``/metrics``, only the service
+    and fetch metrics are.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import time
+from typing import Any, Dict, List, Mapping, Optional, Type
+
+import aiohttp
+from aiohttp import web
+from requests.structures import CaseInsensitiveDict
+
+from . import pipeline
+from .Wappalyzer import Wappalyzer
+from .metrics import InMemoryMetrics, get_metrics, set_metrics
+from .sources import PageRecord, _add_header
+from .webpage import WebPage
+
+logger = logging.getLogger(name="python-Wappalyzer")
+
+def _analyze_page(url: str, html: str, headers: Mapping[str, str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Analyze a submitted page with the worker's Wappalyzer instance.
+    """
+    wappalyzer = pipeline._worker_wappalyzer
+    assert wappalyzer is not None
+    try:
+        return wappalyzer.analyze_with_versions_and_categories(pipeline._worker_webpage_class(url, html, headers))
+    finally:
+        wappalyzer.detected_technologies.pop(url, None)
+
+class _QueueFull(Exception):
+    pass
+
+class AnalysisService:
+    """
+    The aiohttp application of the analysis service.
+
+    >>> from aiohttp import web
+    >>> service = AnalysisService(Wappalyzer.latest(), processes=4)
+    >>> web.run_app(service.make_app(), port=8080)
+    """
+
+    def __init__(self, wappalyzer: Optional[Wappalyzer] = None,
+                 processes: Optional[int] = None,
+                 queue_size: int = 256,
+                 timeout: float = 10,
+                 webpage_class: Type[WebPage] = WebPage,
+                 max_request_size: int = 32 * 1024 * 1024) -> None:
+        """
+        :param wappalyzer: Wappalyzer instance, defaults to ``Wappalyzer.latest()``.
+        :param processes: Number of worker processes, defaults to the number of CPUs.
+            0 to analyze the pages in a single thread of the server process.
+        :param queue_size: Maximum number of pages being analyzed or waiting for a worker.
+        :param timeout: Timeout of the page fetches, in seconds.
+        :param webpage_class: WebPage class used to parse the HTML.
+        :param max_request_size: Maximum size of the request bodies, in bytes. Submitted pages can be large.
+            The pages fetched by the server are truncated to this size.
+        """
+        self.wappalyzer = wappalyzer or Wappalyzer.latest()
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.webpage_class = webpage_class
+        self.max_request_size = max_request_size
+        self.pending = 0
+        self._executor: Optional[concurrent.futures.Executor] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def make_app(self) -> web.Application:
+        """
+        Create the aiohttp application. The worker pool is started and stopped with the application.
+        """
+        app = web.Application(client_max_size=self.max_request_size)
+        app.add_routes([
+            web.post('/analyze/url', self.handle_url),
+            web.post('/analyze/page', self.handle_page),
+            web.post('/analyze/batch', self.handle_batch),
+            web.get('/health', self.handle_health),
+            web.get('/metrics', self.handle_metrics),
+        ])
+        app.on_startup.append(self._start)
+        app.on_cleanup.append(self._stop)
+        return app
+
+    async def _start(self, app: web.Application) -> None:
+        if self.processes:
+            # The ruleset is pickled once per worker, by the initializer
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.processes,
+                initializer=pipeline._init_worker, initargs=(self.wappalyzer, self.webpage_class))
+        else:
+            pipeline._init_worker(self.wappalyzer, self.webpage_class)
+            self._executor = concurrent.futures.ThreadPoolExecutor(1)
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def _stop(self, app: web.Application) -> None:
+        if self._session:
+            await self._session.close()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def _reserve(self, count: int) -> None:
+        """
+        Reserve room in the queue for `count` pages, or raise `_QueueFull`.
+        """
+        if self.pending + count > self.queue_size:
+            metrics = get_metrics()
+            if metrics:
+                metrics.increment('wappalyzer_server_rejected_total')
+            raise _QueueFull()
+        self.pending += count
+
+    async def _fetch(self, url: str) -> PageRecord:
+        assert self._session is not None
+        metrics = get_metrics()
+        start = time.perf_counter()
+        try:
+            async with self._session.get(url) as response:
+                # Don't load arbitrarily large pages in memory
+                chunks: List[bytes] = []
+                size = 0
+                while size < self.max_request_size:
+                    chunk = await response.content.read(self.max_request_size - size)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    size += len(chunk)
+                body = b''.join(chunks)
+        except Exception as err:
+            if metrics:
+                metrics.increment('wappalyzer_errors_total', stage='fetch', type=type(err).__name__)
+            raise
+        if metrics:
+            metrics.observe('wappalyzer_fetch_seconds', time.perf_counter() - start)
+            metrics.increment('wappalyzer_fetched_bytes_total', len(body))
+        headers = CaseInsensitiveDict()
+        for name, value in response.headers.items():
+            _add_header(headers, name, value)
+        return PageRecord(str(response.url), body, headers)
+
+    async def _analyze(self, item: Any) -> Dict[str, Any]:
+        """
+        Analyze an URL or page object of a request.
+        """
+        if not isinstance(item, dict) or not isinstance(item.get('url'), str):
+            raise ValueError("'url' is required")
+        loop = asyncio.get_running_loop()
+        metrics = get_metrics()
+        start = time.perf_counter()
+        if 'html' in item or 'headers' in item:
+            html, headers = item.get('html', ''), item.get('headers', {})
+            if not isinstance(html, str) or not isinstance(headers, dict):
+                raise ValueError("'html' must be a string and 'headers' an object")
+            url = item['url']
+            technologies = await loop.run_in_executor(self._executor, _analyze_page, url, html, headers)
+        else:
+            record = await self._fetch(item['url'])
+            url, technologies = await loop.run_in_executor(self._executor, pipeline._analyze_record, record)
+        if metrics:
+            metrics.observe('wappalyzer_server_analysis_seconds', time.perf_counter() - start)
+        return {'url': url, 'technologies': technologies}
+
+    async def _handle(self, request: web.Request, endpoint: str) -> web.Response:
+        metrics = get_metrics()
+        try:
+            try:
+                data = await request.json()
+            except ValueError:
+                raise ValueError("Invalid JSON")
+            if not isinstance(data, dict):
+                raise ValueError("A JSON object is expected")
+            if endpoint == 'batch':
+                items = data.get('pages')
+                if not isinstance(items, list):
+                    raise ValueError("'pages' must be a list")
+            elif endpoint == 'url':
+                items = [{'url': data.get('url')}]
+            else:
+                items = [dict(data, html=data.get('html', ''))]
+            self._reserve(len(items))
+            try:
+                results: List[Any] = await asyncio.gather(*(self._analyze(item) for item in items),
+                                                          return_exceptions=(endpoint == 'batch'))
+            finally:
+                self.pending -= len(items)
+        except _QueueFull:
+            response = web.json_response({'error': 'The analysis queue is full'}, status=503, headers={'Retry-After': '1'})
+        except web.HTTPRequestEntityTooLarge:
+            response = web.json_response({'error': 'The request body is larger than {} bytes'.format(self.max_request_size)},
+                                         status=413)
+        except ValueError as err:
+            response = web.json_response({'error': str(err)}, status=400)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            response = web.json_response({'error': 'Could not fetch the page: {}'.format(type(err).__name__)}, status=502)
+        else:
+            if endpoint == 'batch':
+                for index, result in enumerate(results):
+                    if isinstance(result, Exception):
+                        results[index] = {'url': items[index].get('url') if isinstance(items[index], dict) else None,
+                                          'error': str(result) or type(result).__name__}
+                response = web.json_response({'results': results})
+            else:
+                response = web.json_response(results[0])
+        if metrics:
+            metrics.increment('wappalyzer_server_requests_total', endpoint=endpoint, status=str(response.status))
+        return response
+
+    async def handle_url(self, request: web.Request) -> web.Response:
+        return await self._handle(request, 'url')
+
+    async def handle_page(self, request: web.Request) -> web.Response:
+        return await self._handle(request, 'page')
+
+    async def handle_batch(self, request: web.Request) -> web.Response:
+        return await self._handle(request, 'batch')
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'status': 'ok',
+            'pending': self.pending,
+            'queue_size': self.queue_size,
+            'processes': self.processes,
+            'technologies': len(self.wappalyzer.technologies),
+        })
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        metrics = get_metrics()
+        text = metrics.to_prometheus() if isinstance(metrics, InMemoryMetrics) else ''
+        return web.Response(text=text, content_type='text/plain')
+
+def serve(host: str = '127.0.0.1', port: int = 8080, **kwargs: Any) -> None:
+    """
+    Run the analysis service until interrupted.
+
+    :param kwargs: Passed to `AnalysisService`.
+    """
+    if get_metrics() is None:
+        set_metrics(InMemoryMetrics())
+    web.run_app(AnalysisService(**kwargs).make_app(), host=host, port=port)
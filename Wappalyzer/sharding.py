@@ -0,0 +1,219 @@
+"""
+Analyze very large web pages on several cores: the ruleset is split into shards evaluated concurrently
+by worker processes.
+
+The HTML text is shared with the workers through shared memory instead of being pickled for each shard.
+The ``dom`` patterns need the parsed tree: they are evaluated in the calling process meanwhile.
+The partial detections are merged before resolving the implied technologies, so the results are
+the same as `Wappalyzer.analyze_result`.
+
+>>> from Wappalyzer import Wappalyzer, WebPage
+>>> from Wappalyzer.sharding import ShardedAnalyzer
+>>> with ShardedAnalyzer(Wappalyzer.latest(), shards=4) as analyzer:
+...     analyzer.analyze_with_versions_and_categories(WebPage.new_from_url('http://example.com'))
+
+:Note: Requires Python 3.8 or later (`multiprocessing.shared_memory`).
+"""
+import multiprocessing
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from requests.structures import CaseInsensitiveDict
+
+from .Wappalyzer import Wappalyzer, AnalysisResult
+from .fingerprint import FAMILIES, Technology
+from .metrics import get_metrics
+from .tracing import maybe_span
+from .webpage import IWebPage, ITag
+
+# Pattern families evaluated by the workers
+SHARD_FAMILIES = tuple(family for family in FAMILIES if family != 'dom')
+
+_Task = Tuple[int, str, int, str, Dict[str, str], List[str], Dict[str, str]]
+
+# State of the worker processes
+_worker_wappalyzer: Optional[Wappalyzer] = None
+_worker_shards: List[List[str]] = []
+
+def _init_worker(wappalyzer: Wappalyzer, shards: List[List[str]]) -> None:
+    global _worker_wappalyzer, _worker_shards
+    _worker_wappalyzer = wappalyzer
+    _worker_shards = shards
+
+class _ShardPage:
+    """
+    A web page rebuilt in a worker process, without the HTML tree.
+    """
+    partial = False
+    def __init__(self, url: str, html: str, headers: Mapping[str, str],
+                 scripts: List[str], meta: Mapping[str, str]) -> None:
+        self.url = url
+        self.html = html
+        self.headers = CaseInsensitiveDict(headers)
+        self.scripts = scripts
+        self.meta = meta
+    def select(self, selector: str) -> Iterable[ITag]:
+        raise NotImplementedError("DOM selectors are evaluated by the parent process")
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to the shared memory of the parent process, that owns it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # type: ignore # Python 3.13+
+    except TypeError:
+        # Workers forked once the resource tracker of the parent is running share it: it already tracks the memory
+        shared_tracker = resource_tracker._resource_tracker._fd is not None # type: ignore
+        shm = shared_memory.SharedMemory(name=name)
+        if not shared_tracker:
+            # Otherwise the resource tracker of the worker would destroy it: https://bugs.python.org/issue39959
+            resource_tracker.unregister(shm._name, 'shared_memory') # type: ignore
+        return shm
+
+def _analyze_shard(task: _Task) -> Dict[str, Technology]:
+    """
+    Evaluate the fingerprints of a shard, except the DOM selectors.
+
+    :return: The detected technologies.
+    """
+    index, shm_name, size, url, headers, scripts, meta = task
+    assert _worker_wappalyzer is not None
+    shm = _attach(shm_name)
+    try:
+        html = str(shm.buf[:size], 'utf-8')
+    finally:
+        shm.close()
+    webpage = _ShardPage(url, html, headers, scripts, meta)
+    memo: Dict[Any, Any] = {}
+    detections: Dict[str, Technology] = {}
+    for tech_name in _worker_shards[index]:
+        _worker_wappalyzer._has_technology(_worker_wappalyzer.technologies[tech_name], webpage,
+                                           families=SHARD_FAMILIES, memo=memo, detections=detections)
+    return detections
+
+def split_ruleset(wappalyzer: Wappalyzer, shards: int) -> List[List[str]]:
+    """
+    Split the technologies having non-DOM patterns into shards holding about the same number of patterns.
+    The ruleset order is kept in each shard.
+    """
+    weights = {tech_name: sum(1 for family in SHARD_FAMILIES for _ in tech_fingerprint.iter_patterns(family))
+               for tech_name, tech_fingerprint in wappalyzer.technologies.items()}
+    loads = [0] * shards
+    assignment: Dict[str, int] = {}
+    # Greedy: heaviest technologies first, in the least loaded shard
+    for tech_name in sorted((t for t, w in weights.items() if w), key=lambda t: -weights[t]):
+        index = loads.index(min(loads))
+        assignment[tech_name] = index
+        loads[index] += weights[tech_name]
+    result: List[List[str]] = [[] for _ in range(shards)]
+    for tech_name in wappalyzer.technologies:
+        if tech_name in assignment:
+            result[assignment[tech_name]].append(tech_name)
+    return result
+
+class ShardedAnalyzer:
+    """
+    Analyze the web pages larger than a threshold with a sharded ruleset, the other ones as usual.
+    """
+
+    def __init__(self, wappalyzer: Optional[Wappalyzer] = None,
+                 shards: Optional[int] = None,
+                 threshold: int = 1024 * 1024) -> None:
+        """
+        :param wappalyzer: Wappalyzer instance, defaults to ``Wappalyzer.latest()``.
+        :param shards: Number of shards and worker processes, defaults to the number of CPUs.
+        :param threshold: Size of the HTML, in characters, above which a page is analyzed with the sharded ruleset.
+        """
+        self.wappalyzer = wappalyzer or Wappalyzer.latest()
+        self.threshold = threshold
+        self.shards = split_ruleset(self.wappalyzer, shards or os.cpu_count() or 1)
+        self._pool = multiprocessing.Pool(len(self.shards), initializer=_init_worker,
+                                          initargs=(self.wappalyzer, self.shards))
+
+    def close(self) -> None:
+        """
+        Stop the worker processes.
+        """
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self) -> 'ShardedAnalyzer':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def analyze_result(self, webpage: IWebPage) -> AnalysisResult:
+        """
+        Same as `Wappalyzer.analyze_result`.
+        """
+        wappalyzer = self.wappalyzer
+        result = wappalyzer._get_memoized_result(webpage)
+        if result is not None:
+            return result
+        if len(webpage.html) < self.threshold or getattr(webpage, 'partial', False):
+            return wappalyzer.analyze_result(webpage)
+
+        with maybe_span(wappalyzer.tracer, 'analyze', url=webpage.url, shards=len(self.shards)) as outcome:
+            metrics = get_metrics()
+            start = time.perf_counter() if metrics else 0.0
+            body = webpage.html.encode('utf-8')
+            shm = shared_memory.SharedMemory(create=True, size=max(len(body), 1))
+            try:
+                shm.buf[:len(body)] = body
+                tasks = [(index, shm.name, len(body), webpage.url, dict(webpage.headers),
+                          list(webpage.scripts), dict(webpage.meta)) for index in range(len(self.shards))]
+                pending = self._pool.map_async(_analyze_shard, tasks)
+
+                detected_technologies: Set[str] = set()
+                detections: Dict[str, Technology] = {}
+                memo: Dict[Any, Any] = {}
+                for tech_name, tech_fingerprint in wappalyzer.technologies.items():
+                    if tech_fingerprint.dom and wappalyzer._has_technology(tech_fingerprint, webpage, families=('dom',),
+                                                                           memo=memo, detections=detections):
+                        detected_technologies.add(tech_name)
+                shard_detections = pending.get()
+            finally:
+                shm.close()
+                shm.unlink()
+
+            for shard in shard_detections:
+                for tech_name, technology in shard.items():
+                    detected_technologies.add(tech_name)
+                    if tech_name in detections:
+                        # Also detected by a DOM selector, that comes last
+                        technology.confidence.update(detections[tech_name].confidence)
+                        technology.versions.extend(version for version in detections[tech_name].versions
+                                                   if version not in technology.versions)
+                    detections[tech_name] = technology
+
+            detected_technologies = wappalyzer._resolve_relations(detected_technologies.__contains__)
+            # The shards evaluate every fingerprint: drop the excluded technologies and the missing requirements,
+            # that the single-process analysis does not evaluate
+            detections = {tech_name: technology for tech_name, technology in detections.items()
+                          if tech_name in detected_technologies}
+
+            if metrics:
+                metrics.observe('wappalyzer_match_seconds', time.perf_counter() - start)
+                start = time.perf_counter()
+            wappalyzer._resolve_implied_technologies(webpage, detected_technologies)
+            if metrics:
+                wappalyzer._record_metrics(metrics, start, detected_technologies)
+            outcome['detected'] = sorted(detected_technologies)
+
+        wappalyzer.detected_technologies[webpage.url] = detections
+        return wappalyzer._make_result(webpage, detections, detected_technologies)
+
+    def analyze(self, webpage: IWebPage) -> Set[str]:
+        """
+        Same as `Wappalyzer.analyze`.
+        """
+        return set(self.analyze_result(webpage).technologies)
+
+    def analyze_with_versions_and_categories(self, webpage: IWebPage) -> Dict[str, Dict[str, Any]]:
+        """
+        Same as `Wappalyzer.analyze_with_versions_and_categories`.
+        """
+        return self.analyze_result(webpage).with_versions_and_categories()
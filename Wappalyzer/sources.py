@@ -0,0 +1,252 @@
+"""
+Read stored HTTP responses, to analyze them offline without any network I/O.
+
+Records are streamed one at a time from the archives and the `WebPage` objects
+are only created when needed, with `PageRecord.to_webpage`.
+
+>>> from Wappalyzer import Wappalyzer
+>>> from Wappalyzer.sources import iter_warc
+>>> wappalyzer = Wappalyzer.latest()
+>>> for record in iter_warc('crawl.warc.gz'):
+...     print(record.url, wappalyzer.analyze(record.to_webpage()))
+"""
+import base64
+import contextlib
+import gzip
+import json
+import mmap
+import os
+import pathlib
+import zlib
+import logging
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple, Type, Union
+
+from requests.structures import CaseInsensitiveDict
+
+from .webpage import WebPage, IWebPage
+
+logger = logging.getLogger(name="python-Wappalyzer")
+
+class PageRecord(NamedTuple):
+    """
+    A stored HTTP response: lightweight and picklable.
+    """
+    url: str
+    body: bytes
+    headers: Mapping[str, str]
+
+    def to_webpage(self, webpage_class: Type[WebPage] = WebPage) -> IWebPage:
+        """
+        Create the WebPage object.
+        """
+        return webpage_class.new_from_bytes(self.url, self.body, self.headers)
+
+class FileRecord(NamedTuple):
+    """
+    A HTML file stored on disk, with an optional sidecar headers file. 
+    Only the paths are held (and pickled), the file is read by `to_webpage`.
+    """
+    url: str
+    path: str
+    headers_path: Optional[str] = None
+
+    def to_webpage(self, webpage_class: Type[WebPage] = WebPage) -> IWebPage:
+        """
+        Memory-map the file and create the WebPage object.
+        """
+        headers = CaseInsensitiveDict()
+        if self.headers_path:
+            with open(self.headers_path, 'rb') as fd:
+                headers = _parse_header_lines(fd.read().splitlines())
+        with open(self.path, 'rb') as fd:
+            if os.fstat(fd.fileno()).st_size == 0:
+                # Empty files can't be mapped
+                return webpage_class.new_from_bytes(self.url, b'', headers)
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as body:
+                return webpage_class.new_from_bytes(self.url, body, headers) # type: ignore
+
+Record = Union[PageRecord, FileRecord]
+
+def _is_html(headers: Mapping[str, str]) -> bool:
+    content_type = CaseInsensitiveDict(headers).get('Content-Type', '').lower()
+    return not content_type or 'html' in content_type
+
+def _parse_header_lines(lines: List[bytes]) -> CaseInsensitiveDict:
+    """
+    Parse "Name: value" header lines, repeated headers are joined with a comma.
+    """
+    headers = CaseInsensitiveDict()
+    for line in lines:
+        name, sep, value = line.decode('iso-8859-1').partition(':')
+        if sep:
+            _add_header(headers, name.strip(), value.strip())
+    return headers
+
+def _add_header(headers: CaseInsensitiveDict, name: str, value: str) -> None:
+    headers[name] = headers[name] + ', ' + value if name in headers else value
+
+def _dechunk(body: bytes) -> bytes:
+    chunks = []
+    pos = 0
+    while True:
+        eol = body.find(b'\r\n', pos)
+        if eol < 0:
+            break
+        size = int(body[pos:eol].split(b';')[0].strip() or b'0', 16)
+        if size == 0:
+            break
+        chunks.append(body[eol+2:eol+2+size])
+        pos = eol + 2 + size + 2
+    return b''.join(chunks)
+
+def parse_http_response(data: bytes) -> Tuple[int, CaseInsensitiveDict, bytes]:
+    """
+    Parse a raw HTTP response message: status line, headers and body.
+    Chunked transfer encoding and gzip/deflate content encodings are decoded.
+
+    :return: Tuple: status code, headers, body.
+    """
+    head, _, body = data.partition(b'\r\n\r\n')
+    status_line, *lines = head.split(b'\r\n')
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        status = 0
+    headers = _parse_header_lines(lines)
+    try:
+        if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            body = _dechunk(body)
+        encoding = headers.get('Content-Encoding', '').lower()
+        if encoding in ('gzip', 'x-gzip'):
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            body = zlib.decompress(body)
+    except (ValueError, zlib.error) as err:
+        logger.debug("Could not decode HTTP response body: {}".format(err))
+    return status, headers, body
+
+@contextlib.contextmanager
+def _open(path: Union[str, BinaryIO]) -> Iterator[BinaryIO]:
+    if not isinstance(path, str):
+        yield path
+        return
+    with open(path, 'rb') as fd:
+        magic = fd.read(2)
+        fd.seek(0)
+        if magic == b'\x1f\x8b':
+            # Reads multi-member (gzip-per-record) files as a single stream.
+            with gzip.GzipFile(fileobj=fd, mode='rb') as gzfd:
+                yield gzfd # type: ignore
+        else:
+            yield fd
+
+def iter_warc(path: Union[str, BinaryIO], html_only: bool = True) -> Iterator[PageRecord]:
+    """
+    Stream the HTTP responses stored in a WARC file (plain or gzip-per-record).
+
+    :param path: File path or binary file object.
+    :param html_only: Skip the responses that are not HTML documents.
+    """
+    with _open(path) as fd:
+        while True:
+            line = fd.readline()
+            if not line:
+                break
+            if not line.startswith(b'WARC/'):
+                # Blank lines between records
+                continue
+            lines = []
+            while True:
+                line = fd.readline()
+                if not line.strip():
+                    break
+                lines.append(line.rstrip(b'\r\n'))
+            warc_headers = _parse_header_lines(lines)
+            block = fd.read(int(warc_headers.get('Content-Length', 0)))
+
+            if warc_headers.get('WARC-Type') != 'response' or \
+                    not warc_headers.get('Content-Type', '').startswith('application/http'):
+                continue
+            _, headers, body = parse_http_response(block)
+            if html_only and not _is_html(headers):
+                continue
+            url = warc_headers.get('WARC-Target-URI', '').strip('<>')
+            yield PageRecord(url, body, headers)
+
+def iter_har(path: Union[str, BinaryIO], html_only: bool = True) -> Iterator[PageRecord]:
+    """
+    Iterate over the HTTP responses stored in a HAR file.
+
+    :param path: File path or binary file object.
+    :param html_only: Skip the responses that are not HTML documents.
+
+    :Note: HAR files are JSON documents, they are loaded at once.
+    """
+    with _open(path) as fd:
+        har = json.load(fd)
+    for entry in har['log']['entries']:
+        response = entry['response']
+        headers = CaseInsensitiveDict()
+        for header in response.get('headers', []):
+            _add_header(headers, header['name'], header['value'])
+        content = response.get('content', {})
+        if content.get('mimeType') and 'Content-Type' not in headers:
+            headers['Content-Type'] = content['mimeType']
+        if html_only and not _is_html(headers):
+            continue
+        text = content.get('text', '')
+        if content.get('encoding') == 'base64':
+            body = base64.b64decode(text)
+        else:
+            body = text.encode('utf-8')
+            # The text is already decoded
+            headers['Content-Type'] = '{}; charset=utf-8'.format(headers.get('Content-Type', 'text/html').split(';')[0])
+        yield PageRecord(entry['request']['url'], body, headers)
+
+def iter_ndjson(path: Union[str, BinaryIO]) -> Iterator[PageRecord]:
+    """
+    Stream the pages stored in a newline delimited JSON file (plain or gzip), 
+    one ``{"url": "...", "html": "...", "headers": {...}}`` object per line, as accepted by the analysis service.
+
+    :param path: File path or binary file object.
+    """
+    with _open(path) as fd:
+        for line in fd:
+            if not line.strip():
+                continue
+            page = json.loads(line)
+            headers = CaseInsensitiveDict()
+            for name, value in (page.get('headers') or {}).items():
+                _add_header(headers, name, value)
+            # The text is already decoded
+            headers['Content-Type'] = '{}; charset=utf-8'.format(headers.get('Content-Type', 'text/html').split(';')[0])
+            yield PageRecord(page['url'], page.get('html', '').encode('utf-8'), headers)
+
+def iter_directory(path: str, 
+                   extensions: Iterable[str] = ('.html', '.htm'),
+                   headers_suffix: str = '.headers',
+                   url_for: Optional[Callable[[pathlib.Path], str]] = None) -> Iterator[FileRecord]:
+    """
+    Walk a directory tree of saved HTML files, in a stable order (sorted by path) so a scan can be resumed, 
+    see `Wappalyzer.pipeline.analyze_to_ndjson`. 
+
+    The HTTP response headers of a file are read from its sidecar file, if any: ``index.html.headers`` 
+    holds the headers of ``index.html``, as ``Name: value`` lines (a leading status line is ignored).
+
+    :param path: Root directory.
+    :param extensions: Extensions of the HTML files.
+    :param headers_suffix: Suffix of the sidecar headers files.
+    :param url_for: Function returning the URL of a file, defaults to the ``file://`` URI.
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        names = set(filenames)
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(extensions):
+                continue
+            file_path = pathlib.Path(dirpath, filename).absolute()
+            headers_name = filename + headers_suffix
+            yield FileRecord(url_for(file_path) if url_for else file_path.as_uri(), 
+                             str(file_path), 
+                             str(file_path.with_name(headers_name)) if headers_name in names else None)
@@ -0,0 +1,139 @@
+"""
+Stage-level tracing of individual page analyses.
+
+Pass a tracer to `Wappalyzer` and to the `WebPage` factories to get start/end callbacks for each stage:
+
+- ``fetch``: attributes ``url``; outcome ``status``, ``bytes``.
+- ``parse``: attributes ``url``; outcome ``scripts``, ``meta``.
+- ``analyze``: attributes ``url``; outcome ``detected``.
+- ``family``: evaluation of a pattern family of a fingerprint.
+  Attributes ``url``, ``technology``, ``family``; outcome ``matched``.
+- ``dom.select``: attributes ``url``, ``technology``, ``selector``; outcome ``elements``.
+- ``implies``: attributes ``url``; outcome ``implied``.
+
+When a stage raises an exception, the outcome has an ``error`` attribute: the exception class name.
+
+>>> from Wappalyzer.tracing import RecordingTracer
+>>> tracer = RecordingTracer()
+>>> wappalyzer = Wappalyzer.latest(tracer=tracer)
+>>> wappalyzer.analyze(WebPage.new_from_url('http://example.com', tracer=tracer))
+>>> sorted(tracer.spans, key=lambda s: s.duration)[-1]
+Span(stage='fetch', attributes={'url': 'http://example.com', 'status': 200, 'bytes': 1256}, duration=0.84)
+"""
+import contextlib
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+try:
+    from typing import Protocol
+except ImportError:
+    Protocol = object # type: ignore
+
+class ITracer(Protocol):
+    """
+    Interface of a tracer.
+    """
+    def start(self, stage: str, attributes: Dict[str, Any]) -> Any:
+        """
+        Called when a stage starts.
+
+        :return: Any token, it's passed back to `end`.
+        """
+        raise NotImplementedError()
+    def end(self, token: Any, outcome: Dict[str, Any]) -> None:
+        """
+        Called when a stage ends, with the outcome attributes.
+        """
+        raise NotImplementedError()
+
+@contextlib.contextmanager
+def span(tracer: ITracer, stage: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Trace a stage. Fill the yielded dict with the outcome attributes.
+    """
+    token = tracer.start(stage, attributes)
+    outcome: Dict[str, Any] = {}
+    try:
+        yield outcome
+    except BaseException as err:
+        outcome['error'] = type(err).__name__
+        raise
+    finally:
+        tracer.end(token, outcome)
+
+class Span(NamedTuple):
+    """
+    A stage recorded by `RecordingTracer`.
+    """
+    stage: str
+    attributes: Dict[str, Any]
+    duration: float
+
+class RecordingTracer(ITracer):
+    """
+    Records all the stages in memory, with their duration in seconds.
+    """
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+
+    def start(self, stage: str, attributes: Dict[str, Any]) -> Any:
+        return stage, attributes, time.perf_counter()
+
+    def end(self, token: Any, outcome: Dict[str, Any]) -> None:
+        stage, attributes, start = token
+        self.spans.append(Span(stage, dict(attributes, **outcome), time.perf_counter() - start))
+
+class OpenTelemetryTracer(ITracer):
+    """
+    Adapter that reports the stages as OpenTelemetry spans, named ``wappalyzer.<stage>``.
+
+    The span of a stage is the current span until the stage ends: the nested stages, 
+    such as ``family`` in ``analyze``, are its children.
+
+    >>> from opentelemetry import trace
+    >>> tracer = OpenTelemetryTracer(trace.get_tracer('python-Wappalyzer'))
+    """
+    def __init__(self, tracer: Any, prefix: str = 'wappalyzer.') -> None:
+        """
+        :param tracer: A ``opentelemetry.trace.Tracer`` object.
+        :param prefix: Prefix of the span names.
+        """
+        self._tracer = tracer
+        self._prefix = prefix
+
+    @staticmethod
+    def _convert(value: Any) -> Any:
+        # Attribute values must be primitive types or sequences of them
+        if isinstance(value, (str, bool, int, float)):
+            return value
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return [str(v) for v in value]
+        return str(value)
+
+    def start(self, stage: str, attributes: Dict[str, Any]) -> Any:
+        from opentelemetry import context, trace
+        otel_span = self._tracer.start_span(self._prefix + stage,
+            attributes={k: self._convert(v) for k, v in attributes.items() if v is not None})
+        return otel_span, context.attach(trace.set_span_in_context(otel_span))
+
+    def end(self, token: Any, outcome: Dict[str, Any]) -> None:
+        from opentelemetry import context
+        otel_span, context_token = token
+        context.detach(context_token)
+        for k, v in outcome.items():
+            if v is not None:
+                otel_span.set_attribute(k, self._convert(v))
+        otel_span.end()
+
+def maybe_span(tracer: Optional[ITracer], stage: str, **attributes: Any) -> Any:
+    """
+    Same as `span`, but does nothing if the tracer is None.
+    """
+    if tracer is None:
+        return _NullSpan()
+    return span(tracer, stage, **attributes)
+
+class _NullSpan:
+    def __enter__(self) -> Dict[str, Any]:
+        return {}
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
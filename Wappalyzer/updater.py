@@ -0,0 +1,178 @@
+"""
+Keep the technologies ruleset of a long-running process up to date, without restarting it.
+"""
+import hashlib
+import json
+import logging
+import threading
+import requests
+
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from Wappalyzer.Wappalyzer import Wappalyzer, TECHNOLOGIES_URL, DETECTED_URLS_SIZE
+from Wappalyzer.fingerprint import Fingerprint
+from Wappalyzer.regex_backends import RegexCompiler
+from Wappalyzer.tracing import ITracer
+
+logger = logging.getLogger(name="python-Wappalyzer")
+
+class RulesetUpdater:
+    """
+    Holds a `Wappalyzer` instance and refreshes its technologies ruleset in a background thread.
+
+    The new ``technologies.json`` file is downloaded and compiled off the hot path,
+    then atomically swapped in: analyses already running finish with the previous instance.
+    Only the fingerprints whose definition changed are compiled again.
+
+    .. python::
+
+        from Wappalyzer import WebPage
+        from Wappalyzer.updater import RulesetUpdater
+        with RulesetUpdater(interval=3600) as updater:
+            # Always get the wappalyzer instance from the updater
+            results = updater.wappalyzer.analyze(WebPage.new_from_url('http://example.com'))
+
+    """
+
+    def __init__(self, technologies_file:Optional[str]=None,
+                 url:str=TECHNOLOGIES_URL,
+                 interval:float=24*3600,
+                 timeout:float=30,
+                 tracer:Optional[ITracer]=None,
+                 fast:bool=False,
+                 regex_backends:Optional[Sequence[str]]=None,
+                 regex_timeout:Optional[float]=None,
+                 detected_urls:Optional[int]=DETECTED_URLS_SIZE) -> None:
+        """
+        :param technologies_file: Initial technologies file. Defaults to the ``data/technologies.json`` file inside the package.
+        :param url: URL of the ``technologies.json`` file to download.
+        :param interval: Number of seconds between two refreshes.
+        :param timeout: Download timeout.
+        :param tracer: Options of the `Wappalyzer` instances: ``tracer``, ``fast``, ``regex_backends``, ``regex_timeout`` 
+            and ``detected_urls``. 
+            A refreshed ruleset gets the options of the current instance.
+        """
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self.last_refresh: Optional[datetime] = None
+
+        self._definitions: Dict[str, str] = {}
+        self._etag: Optional[str] = None
+        self._digest: Optional[str] = None
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if technologies_file:
+            with open(technologies_file, 'r', encoding='utf-8') as fd:
+                obj = json.load(fd)
+        else:
+            obj = Wappalyzer._load_default_technologies()
+        self._wappalyzer: Wappalyzer
+        self._wappalyzer, self._definitions = self._compile(obj, {'tracer': tracer, 'fast': fast, 
+            'regex_backends': regex_backends, 'regex_timeout': regex_timeout, 'detected_urls': detected_urls})
+
+    @property
+    def wappalyzer(self) -> Wappalyzer:
+        """
+        The current `Wappalyzer` instance.
+
+        Get it once per analysis: it's replaced by a new instance when the ruleset is refreshed.
+        """
+        return self._wappalyzer
+
+    def _get_options(self) -> Dict[str, Any]:
+        """
+        Get the options of the current `Wappalyzer` instance.
+        """
+        wappalyzer = self._wappalyzer
+        return {'tracer': wappalyzer.tracer, 'fast': wappalyzer.fast, 
+                'regex_backends': wappalyzer.regex_backends, 'regex_timeout': wappalyzer.regex_timeout, 
+                'detected_urls': wappalyzer.detected_urls}
+
+    def _compile(self, obj:Dict[str, Any], options:Dict[str, Any]) -> Tuple[Wappalyzer, Dict[str, str]]:
+        """
+        Create a new `Wappalyzer` from a technologies file content,
+        reusing the fingerprints of the current instance when their definition did not change.
+
+        :param options: Options of the new instance, see `Wappalyzer`.
+        :return: Tuple: the new instance and the definitions of its fingerprints.
+        """
+        technologies: Dict[str, Any] = {}
+        definitions: Dict[str, str] = {}
+        regexes = RegexCompiler(options['regex_backends'], options['regex_timeout'])
+        compiled = 0
+        for name, attrs in obj['technologies'].items():
+            definitions[name] = json.dumps(attrs, sort_keys=True)
+            if self._definitions.get(name) == definitions[name]:
+                technologies[name] = self._wappalyzer.technologies[name]
+            else:
+                technologies[name] = Fingerprint(name=name, regexes=regexes, **attrs)
+                compiled += 1
+        wappalyzer = Wappalyzer(categories=obj['categories'], technologies=technologies, **options)
+        logger.debug("Compiled {} out of {} fingerprints".format(compiled, len(technologies)))
+        return wappalyzer, definitions
+
+    def refresh(self) -> bool:
+        """
+        Download the technologies file and swap in the new ruleset if it has changed.
+
+        :return: Whether the ruleset has been updated.
+        """
+        with self._refresh_lock:
+            headers = {'If-None-Match': self._etag} if self._etag else {}
+            response = requests.get(self.url, headers=headers, timeout=self.timeout)
+            self.last_refresh = datetime.now()
+            if response.status_code == 304:
+                logger.debug("python-Wappalyzer technologies.json file not modified")
+                return False
+            response.raise_for_status()
+            etag = response.headers.get('ETag')
+            digest = hashlib.sha256(response.content).hexdigest()
+            if digest == self._digest:
+                self._etag = etag
+                return False
+            # The ETag is only recorded once the ruleset is in use: a broken download is retried.
+            wappalyzer, definitions = self._compile(response.json(), self._get_options())
+            # Atomic swap: running analyses keep a reference to the previous instance.
+            self._wappalyzer, self._definitions = wappalyzer, definitions
+            self._etag, self._digest = etag, digest
+            logger.info("python-Wappalyzer technologies ruleset updated")
+            return True
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception as err:
+                logger.error("Could not refresh Wappalyzer technologies ruleset because of error : '{}'. Keeping the current one. ".format(err))
+            if self._stopped.wait(self.interval):
+                break
+
+    def start(self) -> None:
+        """
+        Start refreshing the ruleset in a background thread, right now and then every `interval` seconds.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="python-Wappalyzer-updater", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout:Optional[float]=None) -> None:
+        """
+        Stop the background thread.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self) -> 'RulesetUpdater':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
@@ -4,7 +4,8 @@
 The following objects are importable form this module: `WebPage`, `IWebPage`, `ITag`.
 
 :Note: You can directly use/subclass one of the ``WebPage`` classes provided 
-    in modules `_bs4` and `_stdlib` if you'de like more control. 
+    in modules `_bs4`, `_lxml` and `_stdlib` if you'de like more control. 
+    The `_lxml` module is faster on large documents but requires the ``cssselect`` package.
     Alternatively, your can write your own ``WebPage`` from scratch by suclassing the `IWebPage` interface.
 """
 from ._common import IWebPage, ITag
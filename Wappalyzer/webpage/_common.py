@@ -4,7 +4,11 @@ Wraps only the information strictly necessary to run the Wappalyzer engine.
 """
 
 import abc
-from typing import Iterable, List, Mapping, Any
+import codecs
+import functools
+import re
+import time
+from typing import Iterable, List, Mapping, Any, Optional, Union
 try:
     from typing import Protocol
 except ImportError:
@@ -14,12 +18,51 @@ import aiohttp
 import requests
 from requests.structures import CaseInsensitiveDict
 
+from ..metrics import get_metrics
+from ..tracing import ITracer, maybe_span
+
 def _raise_not_dict(obj:Any, name:str) -> None:
     try:
         list(obj.keys())
     except AttributeError: 
         raise ValueError(f"{name} must be a dictionary-like object")
 
+_charset_regexp = re.compile(r'charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+_meta_charset_regexp = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+def _lookup_encoding(name: Union[str, bytes, None]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name if isinstance(name, str) else name.decode('ascii')).name
+    except (LookupError, UnicodeDecodeError):
+        return None
+
+def decode_html(body: Union[bytes, memoryview], headers: Mapping[str, str]) -> str:
+    """
+    Decode the raw HTML without scanning the whole content to guess the charset.
+
+    The encoding is determined by, in order: the byte order mark, the charset declared in the 
+    ``Content-Type`` header, the ``<meta charset>`` declaration in the first KB of the document. 
+    It defaults to UTF-8. Invalid bytes are replaced with U+FFFD.
+
+    :param body: Raw content, any bytes-like object.
+    :param headers: The HTTP response headers
+    """
+    for bom, bom_encoding in ((codecs.BOM_UTF8, 'utf-8-sig'), 
+                              (codecs.BOM_UTF16_LE, 'utf-16'), 
+                              (codecs.BOM_UTF16_BE, 'utf-16')):
+        if body[:len(bom)] == bom:
+            return str(body, bom_encoding, 'replace')
+    
+    content_type = CaseInsensitiveDict(headers).get('Content-Type', '')
+    match = _charset_regexp.search(content_type)
+    encoding = _lookup_encoding(match.group(1) if match else None)
+    if not encoding:
+        match = _meta_charset_regexp.search(body[:1024])
+        encoding = _lookup_encoding(match.group(1) if match else None)
+    return str(body, encoding or 'utf-8', 'replace')
+
 class ITag(Protocol):
     """
     A HTML tag, decoupled from any particular HTTP library's API.
@@ -61,7 +104,13 @@ class BaseWebPage(IWebPage):
 
     Subclasses must implement _parse_html() and select(string).
     """
-    def __init__(self, url:str, html:str, headers:Mapping[str, str]):
+
+    partial = False
+    """
+    Whether the web page only holds the HTTP response headers, see `new_from_url_headers`.
+    """
+
+    def __init__(self, url:str, html:str, headers:Mapping[str, str], tracer:Optional[ITracer]=None):
         """
         Initialize a new WebPage object manually.  
 
@@ -71,6 +120,7 @@ class BaseWebPage(IWebPage):
         :param url: The web page URL.
         :param html: The web page content (HTML)
         :param headers: The HTTP response headers
+        :param tracer: Get callbacks for the parse stage, see `Wappalyzer.tracing`.
         """
         _raise_not_dict(headers, "headers")
         self.url = url
@@ -78,13 +128,43 @@ class BaseWebPage(IWebPage):
         self.headers = CaseInsensitiveDict(headers)
         self.scripts: List[str] = []
         self.meta: Mapping[str, str] = {}
-        self._parse_html()
+        metrics = get_metrics()
+        if metrics or tracer:
+            start = time.perf_counter()
+            with maybe_span(tracer, 'parse', url=url) as outcome:
+                try:
+                    self._parse_html()
+                except Exception as err:
+                    if metrics:
+                        metrics.increment('wappalyzer_errors_total', stage='parse', type=type(err).__name__)
+                    raise
+                outcome['scripts'] = len(self.scripts)
+                outcome['meta'] = len(self.meta)
+            if metrics:
+                metrics.observe('wappalyzer_parse_seconds', time.perf_counter() - start)
+        else:
+            self._parse_html()
 
     def _parse_html(self):
         raise NotImplementedError()
     
     @classmethod
-    def new_from_url(cls, url: str, **kwargs:Any) -> IWebPage:
+    def new_from_bytes(cls, url:str, body:Union[bytes, memoryview], headers:Mapping[str, str], 
+                       tracer:Optional[ITracer]=None) -> IWebPage:
+        """
+        Constructs a new WebPage object from the raw content of the web page. 
+
+        The charset is not guessed from the content: see `decode_html`.
+
+        :param url: The web page URL.
+        :param body: The web page raw content, any bytes-like object.
+        :param headers: The HTTP response headers
+        :param tracer: Get callbacks for the parse stage, see `Wappalyzer.tracing`.
+        """
+        return cls(url, html=decode_html(body, headers), headers=headers, tracer=tracer)
+
+    @classmethod
+    def new_from_url(cls, url: str, tracer:Optional[ITracer]=None, **kwargs:Any) -> IWebPage:
         """
         Constructs a new WebPage object for the URL,
         using the `requests` module to fetch the HTML.
@@ -98,25 +178,41 @@ class BaseWebPage(IWebPage):
         :param timeout: (optional) How many seconds to wait for the server to send data before giving up. 
         :param proxies: (optional) Dictionary mapping protocol to the URL of the proxy.
         :param verify: (optional) Boolean, it controls whether we verify the SSL certificate validity. 
+        :param tracer: (optional) Get callbacks for the fetch and parse stages, see `Wappalyzer.tracing`.
         :param \*\*kwargs: Any other arguments are passed to `requests.get` method as well. 
         """
-        response = requests.get(url, **kwargs)
-        return cls.new_from_response(response)
+        metrics = get_metrics()
+        start = time.perf_counter()
+        with maybe_span(tracer, 'fetch', url=url) as outcome:
+            try:
+                response = requests.get(url, **kwargs)
+            except Exception as err:
+                if metrics:
+                    metrics.increment('wappalyzer_errors_total', stage='fetch', type=type(err).__name__)
+                raise
+            outcome['status'] = response.status_code
+            outcome['bytes'] = len(response.content)
+        if metrics:
+            metrics.observe('wappalyzer_fetch_seconds', time.perf_counter() - start)
+            metrics.increment('wappalyzer_fetched_bytes_total', len(response.content))
+        return cls.new_from_response(response, tracer=tracer)
 
     @classmethod
-    def new_from_response(cls, response:requests.Response) -> IWebPage:
+    def new_from_response(cls, response:requests.Response, tracer:Optional[ITracer]=None) -> IWebPage:
         """
         Constructs a new WebPage object for the response,
         using the `BeautifulSoup` module to parse the HTML.
 
         :param response: `requests.Response` object
+        :param tracer: (optional) Get callbacks for the parse stage, see `Wappalyzer.tracing`.
         """
-        return cls(response.url, html=response.text, headers=response.headers)
+        return cls.new_from_bytes(response.url, response.content, headers=response.headers, tracer=tracer)
 
 
     @classmethod
     async def new_from_url_async(cls, url: str, verify: bool = True,
-                                 aiohttp_client_session: aiohttp.ClientSession = None, **kwargs:Any) -> IWebPage:
+                                 aiohttp_client_session: aiohttp.ClientSession = None, 
+                                 tracer: Optional[ITracer] = None, executor: Any = None, **kwargs:Any) -> IWebPage:
         """
         Same as new_from_url only Async.
 
@@ -135,6 +231,9 @@ class BaseWebPage(IWebPage):
         :param cookies: Dict. HTTP Cookies to send with the request (optional).
         :param timeout: Int. override the session's timeout (optional)
         :param proxy: Proxy URL, `str` or `yarl.URL` (optional).
+        :param tracer: Get callbacks for the fetch and parse stages, see `Wappalyzer.tracing` (optional).
+        :param executor: Parse the HTML in this `Wappalyzer.executors.AnalysisExecutor` or `concurrent.futures.Executor`, 
+            off the event loop (optional). With a process pool, the parsed page is pickled back.
         :param \*\*kwargs: Any other arguments are passed to `aiohttp.ClientSession.get` method as well. 
 
         """
@@ -143,11 +242,42 @@ class BaseWebPage(IWebPage):
             connector = aiohttp.TCPConnector(ssl=verify)
             aiohttp_client_session = aiohttp.ClientSession(connector=connector)
 
-        async with aiohttp_client_session.get(url, **kwargs) as response:
-            return await cls.new_from_response_async(response)
+        metrics = get_metrics()
+        start = time.perf_counter()
+        with maybe_span(tracer, 'fetch', url=url) as outcome:
+            try:
+                async with aiohttp_client_session.get(url, **kwargs) as response:
+                    body = await response.read()
+            except Exception as err:
+                if metrics:
+                    metrics.increment('wappalyzer_errors_total', stage='fetch', type=type(err).__name__)
+                raise
+            outcome['status'] = response.status
+            outcome['bytes'] = len(body)
+        if metrics:
+            metrics.observe('wappalyzer_fetch_seconds', time.perf_counter() - start)
+            metrics.increment('wappalyzer_fetched_bytes_total', len(body))
+        return await cls._new_from_bytes_async(str(response.url), body, response.headers, tracer, executor)
 
     @classmethod
-    async def new_from_response_async(cls, response:aiohttp.ClientResponse) -> IWebPage:
+    async def _new_from_bytes_async(cls, url:str, body:bytes, headers:Mapping[str, str], 
+                                    tracer:Optional[ITracer], executor:Any) -> IWebPage:
+        """
+        Parse the response in the executor, if any.
+        """
+        if executor is None:
+            return cls.new_from_bytes(url, body, headers=headers, tracer=tracer)
+        from ..executors import run_in_executor, _is_process_pool
+        if _is_process_pool(executor):
+            # The tracer would report to a copy in the worker process
+            tracer = None
+        # The aiohttp headers can't be pickled
+        return await run_in_executor(executor, functools.partial(cls.new_from_bytes, url, body, 
+                                     headers=CaseInsensitiveDict(headers), tracer=tracer))
+
+    @classmethod
+    async def new_from_response_async(cls, response:aiohttp.ClientResponse, tracer:Optional[ITracer]=None, 
+                                      executor:Any=None) -> IWebPage:
         """
         Constructs a new WebPage object for the response,
         using the `BeautifulSoup` module to parse the HTML.
@@ -160,6 +290,67 @@ class BaseWebPage(IWebPage):
         >>> webpage = await WebPage.new_from_response_async(page)
 
         :param response: `aiohttp.ClientResponse` object
+        :param tracer: Get callbacks for the parse stage, see `Wappalyzer.tracing` (optional).
+        :param executor: Parse the HTML in this `Wappalyzer.executors.AnalysisExecutor` or `concurrent.futures.Executor`, 
+            off the event loop (optional).
         """
-        html = await response.text()
-        return cls(str(response.url), html=html, headers=response.headers)
\ No newline at end of file
+        body = await response.read()
+        return await cls._new_from_bytes_async(str(response.url), body, response.headers, tracer, executor)
+
+    @classmethod
+    def new_from_headers(cls, url:str, headers:Mapping[str, str]) -> IWebPage:
+        """
+        Constructs a new partial WebPage object, from the HTTP response headers only. 
+
+        :param url: The web page URL.
+        :param headers: The HTTP response headers
+        """
+        webpage = cls(url, html='', headers=headers)
+        webpage.partial = True
+        return webpage
+
+    @classmethod
+    def new_from_url_headers(cls, url: str, **kwargs:Any) -> IWebPage:
+        """
+        Constructs a new partial WebPage object for the URL, without downloading the content. 
+
+        Sends a HEAD request, or a GET request closed right after the headers are received 
+        if the server does not support HEAD. 
+
+        >>> from Wappalyzer import WebPage
+        >>> page = WebPage.new_from_url_headers('exemple.com', timeout=5)
+
+        :param url: URL 
+        :param \*\*kwargs: Any other arguments are passed to `requests.head` and `requests.get` methods. 
+        """
+        kwargs.setdefault('allow_redirects', True)
+        response = requests.head(url, **kwargs)
+        if response.status_code in (405, 501):
+            with requests.get(url, stream=True, **kwargs) as response:
+                pass
+        return cls.new_from_headers(response.url, headers=response.headers)
+
+    @classmethod
+    async def new_from_url_headers_async(cls, url: str, verify: bool = True,
+                                 aiohttp_client_session: aiohttp.ClientSession = None, **kwargs:Any) -> IWebPage:
+        """
+        Same as new_from_url_headers only Async.
+
+        :param url: URL
+        :param aiohttp_client_session: `aiohttp.ClientSession` instance to use, optional.
+        :param verify: (optional) Boolean, it controls whether we verify the SSL certificate validity. 
+        :param \*\*kwargs: Any other arguments are passed to `aiohttp.ClientSession.head` and ``get`` methods as well. 
+        """
+        if not aiohttp_client_session:
+            connector = aiohttp.TCPConnector(ssl=verify)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                return await cls.new_from_url_headers_async(url, aiohttp_client_session=session, **kwargs)
+
+        kwargs.setdefault('allow_redirects', True)
+        async with aiohttp_client_session.head(url, **kwargs) as response:
+            if response.status not in (405, 501):
+                return cls.new_from_headers(str(response.url), headers=response.headers)
+        async with aiohttp_client_session.get(url, **kwargs) as response:
+            # Do not download the content
+            response.close()
+            return cls.new_from_headers(str(response.url), headers=response.headers)
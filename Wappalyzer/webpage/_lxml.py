@@ -0,0 +1,106 @@
+"""
+Implementation of WebPage based on lxml only, depends on cssselect.
+
+CSS selectors are translated to XPath expressions and compiled once: the DOM selectors of the ruleset
+when it's loaded (see `precompile_selectors`), the other selectors on first use, in a bounded cache
+(`SELECTOR_CACHE_SIZE`).
+Selection then runs natively in libxml2.
+"""
+import functools
+import html
+import logging
+from typing import Dict, Iterable, Iterator, Optional
+
+import lxml.html # type: ignore
+from lxml import etree # type: ignore
+from cssselect import HTMLTranslator, SelectorError # type: ignore
+from cached_property import cached_property # type: ignore
+
+from ._common import BaseWebPage, BaseTag
+
+logger = logging.getLogger(name="python-Wappalyzer")
+
+_translator = HTMLTranslator()
+
+# Maximum number of compiled selectors that are not in the ruleset
+SELECTOR_CACHE_SIZE = 4096
+
+# Compiled DOM selectors of the last loaded ruleset
+_ruleset_xpaths: Dict[str, Optional[etree.XPath]] = {}
+
+def _translate(selector: str) -> Optional[etree.XPath]:
+    try:
+        return etree.XPath(_translator.css_to_xpath(selector))
+    except (SelectorError, etree.XPathSyntaxError) as err:
+        logger.debug("Caught '{error}' compiling CSS selector: {selector}".format(error=err, selector=selector))
+        return None
+
+@functools.lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def _compile_other(selector: str) -> Optional[etree.XPath]:
+    return _translate(selector)
+
+def precompile_selectors(selectors: Iterable[str]) -> None:
+    """
+    Compile the DOM selectors of a ruleset, when it's loaded. They replace the selectors of the previous ruleset, 
+    that are reused if unchanged.
+    """
+    global _ruleset_xpaths
+    previous = _ruleset_xpaths
+    _ruleset_xpaths = {selector: previous[selector] if selector in previous else _translate(selector) 
+                       for selector in selectors}
+
+def compile_selector(selector: str) -> Optional[etree.XPath]:
+    """
+    Get the compiled XPath expression equivalent to a CSS selector, or None if the selector is not supported.
+    """
+    try:
+        return _ruleset_xpaths[selector]
+    except KeyError:
+        return _compile_other(selector)
+
+class Tag(BaseTag):
+
+    def __init__(self, elem: lxml.html.HtmlElement) -> None:
+        super().__init__(elem.tag, dict(elem.attrib))
+        self._elem = elem
+
+    @cached_property
+    def inner_html(self) -> str:
+        text = html.escape(self._elem.text, quote=False) if self._elem.text else ''
+        return text + ''.join(etree.tostring(child, encoding='unicode', method='html') for child in self._elem)
+
+class WebPage(BaseWebPage):
+    """
+    Alternative WebPage object that keeps a ``lxml.html`` tree, it's faster than the default
+    BeautifulSoup WebPage on large documents.
+    """
+
+    def _parse_html(self):
+        """
+        Parse the HTML with lxml to find <script> and <meta> tags.
+        """
+        try:
+            self._tree = lxml.html.document_fromstring(self.html)
+        except ValueError:
+            # Unicode strings with encoding declaration are not supported by lxml
+            self._tree = lxml.html.document_fromstring(self.html.encode('utf-8'),
+                            parser=lxml.html.HTMLParser(encoding='utf-8'))
+        except etree.ParserError:
+            # Document is empty
+            self._tree = None
+        if self._tree is None:
+            return
+        # Plain strings: the attribute values returned by lxml keep a reference to the whole tree
+        self.scripts.extend(str(src) for src in self._tree.xpath('//script/@src'))
+        self.meta = {
+            meta.get('name').lower(): meta.get('content')
+                for meta in self._tree.xpath('//meta[@name and @content]')
+        }
+
+    def select(self, selector: str) -> Iterator[Tag]:
+        """Execute a CSS select and returns results as Tag objects."""
+        xpath = compile_selector(selector)
+        if xpath is None or self._tree is None:
+            return
+        for elem in xpath(self._tree):
+            yield Tag(elem)
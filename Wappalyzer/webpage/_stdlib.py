@@ -1,76 +1,206 @@
 """
-Implementation of WebPage based on the standard library. 
+Implementation of WebPage based on the standard library.
 """
-import logging
-from typing import Iterable, Mapping, Optional
+import html
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Union
 
 from html.parser import HTMLParser
-from xml.dom import minidom
 from cached_property import cached_property # type: ignore
 
 from ._common import BaseWebPage, BaseTag
 
-from dom_query import select_all # type: ignore
+from dom_query import select_iter # type: ignore
+from dom_query.symbols import OP # type: ignore
 
-# Parsing HTLM with built-in libraries is difficult, we should not reinvent the wheel here. 
+# Parsing HTLM with built-in libraries is difficult, we should not reinvent the wheel here.
 # We provide this module only as a backup for environments where lxml cannot be installed.
 # https://stackoverflow.com/questions/2676872/how-to-parse-malformed-html-in-python-using-standard-libraries
 
+# Elements that never have content nor end tag
+VOID_ELEMENTS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                           'link', 'meta', 'param', 'source', 'track', 'wbr'))
+# Elements implicitly closed by the start tag of a sibling with the same name
+AUTOCLOSE_ELEMENTS = frozenset(('p', 'li', 'dt', 'dd', 'option', 'tr', 'td', 'th'))
+# Elements whose text content is not escaped
+RAW_TEXT_ELEMENTS = frozenset(('script', 'style'))
+
+class Node:
+    """
+    A lightweight HTML element.
+    """
+    __slots__ = ('name', 'attributes', 'children', 'parent', 'index')
+
+    def __init__(self, name: str, attributes: Dict[str, str], parent: Optional['Node'] = None) -> None:
+        self.name = name
+        self.attributes = attributes
+        self.children: List[Union['Node', str]] = []
+        self.parent = parent
+        # Position in the children of the parent, the sibling combinators don't search it
+        self.index = len(parent.children) if parent is not None else 0
+
+    def elements(self) -> Iterator['Node']:
+        """Iterate over the child elements."""
+        for child in self.children:
+            if isinstance(child, Node):
+                yield child
+
+    def following_elements(self) -> Iterator['Node']:
+        """Iterate over the next sibling elements."""
+        if self.parent is not None:
+            for child in self.parent.children[self.index + 1:]:
+                if isinstance(child, Node):
+                    yield child
+
+    def start_tag(self) -> str:
+        attrs = ''.join(' {}="{}"'.format(k, html.escape(v)) if v else ' ' + k for k, v in self.attributes.items())
+        return '<{}{}>'.format(self.name, attrs)
+
+    def to_html(self) -> str:
+        """Serialize the element."""
+        if self.name in VOID_ELEMENTS:
+            return self.start_tag()
+        return '{}{}</{}>'.format(self.start_tag(), self.inner_html(), self.name)
+
+    def inner_html(self) -> str:
+        """Serialize the content of the element."""
+        # Iterative walk: broken HTML may nest thousands of unclosed elements
+        parts: List[str] = []
+        stack = [(self, iter(self.children))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if isinstance(child, Node):
+                    parts.append(child.start_tag())
+                    if child.name not in VOID_ELEMENTS:
+                        stack.append((child, iter(child.children)))
+                        break
+                else:
+                    parts.append(child if node.name in RAW_TEXT_ELEMENTS else html.escape(child, quote=False))
+            else:
+                stack.pop()
+                if stack:
+                    parts.append('</{}>'.format(node.name))
+        return ''.join(parts)
+
 class Tag(BaseTag):
 
-    def __init__(self, name: str, attributes: Mapping[str, str], elem: minidom.Element) -> None:
+    def __init__(self, name: str, attributes: Mapping[str, str], elem: Node) -> None:
         super().__init__(name, attributes)
         self._elem = elem
-    
+
     @cached_property
     def inner_html(self) -> str:
-        return ''.join(d.toxml() for d in self._elem.childNodes)
+        return self._elem.inner_html()
 
-class ScriptMetaParser(HTMLParser):
+class TreeBuilder(HTMLParser):
+    """
+    Build a tree of `Node` from (possibly broken) HTML and collect <script> and <meta> tags in a single pass.
+    """
 
     def __init__(self):
         super().__init__()
-        self.script_src = []
-        self.meta_info = {}
+        self.root = Node('#document', {})
+        self.script_src: List[str] = []
+        self.meta_info: Dict[str, str] = {}
+        self._stack: List[Node] = [self.root]
 
     def handle_starttag(self, tag, attrs):
-        attributes = dict(attrs)
+        attributes = {k: v or '' for k, v in attrs}
         if tag == 'script':
             if attributes.get('src'):
-                self.script_src.append(attributes.get('src'))
+                self.script_src.append(attributes['src'])
         if tag == 'meta':
-            if attributes.get('name'):
-                self.meta_info.update({attributes.get('name').lower(): attributes.get('content')})
+            if attributes.get('name') and 'content' in attributes:
+                self.meta_info[attributes['name'].lower()] = attributes['content']
+
+        if tag in AUTOCLOSE_ELEMENTS and self._stack[-1].name == tag:
+            self._stack.pop()
+        parent = self._stack[-1]
+        node = Node(tag, attributes, parent)
+        parent.children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self._stack.pop()
+
+    def handle_endtag(self, tag):
+        # Ignore end tags that do not match any open element
+        for index in range(len(self._stack) - 1, 0, -1):
+            if self._stack[index].name == tag:
+                del self._stack[index:]
+                break
+
+    def handle_data(self, data):
+        self._stack[-1].children.append(data)
+
+def _has_attribute(elem: Node, name: str, test: Callable[[str], bool]) -> bool:
+    value = elem.attributes.get(name)
+    return value is not None and test(value)
+
+def _descendants(nodes: Iterable[Node]) -> Iterator[Node]:
+    for node in nodes:
+        stack = [node.elements()]
+        while stack:
+            for elem in stack[-1]:
+                yield elem
+                stack.append(elem.elements())
+                break
+            else:
+                stack.pop()
+
+def _next_sibling(nodes: Iterable[Node]) -> Iterator[Node]:
+    for node in nodes:
+        for sibling in node.following_elements():
+            yield sibling
+            break
+
+def _subsequent_siblings(nodes: Iterable[Node]) -> Iterator[Node]:
+    for node in nodes:
+        yield from node.following_elements()
+
+# Implementation of the dom_query opcodes for the Node tree.
+api = {
+    OP.TAGNAME: lambda name: lambda elem: elem.name == name,
+    OP.ID: lambda name: lambda elem: elem.attributes.get('id') == name,
+    OP.ATTR_PRESENCE: lambda name: lambda elem: name in elem.attributes,
+    OP.ATTR_EXACTLY: lambda name, string: lambda elem: elem.attributes.get(name) == string,
+    OP.ATTR_WORD: lambda name, word: lambda elem: _has_attribute(elem, name, lambda v: word in v.split()),
+    OP.ATTR_PREFIX: lambda name, string: lambda elem: _has_attribute(elem, name, lambda v: v.startswith(string)),
+    OP.ATTR_BEGIN: lambda name, string: lambda elem: _has_attribute(elem, name,
+                        lambda v: v == string or v.startswith(string + '-')),
+    OP.ATTR_SUFFIX: lambda name, string: lambda elem: _has_attribute(elem, name, lambda v: v.endswith(string)),
+    OP.ATTR_SUBSTRING: lambda name, string: lambda elem: _has_attribute(elem, name, lambda v: string in v),
+    OP.CLASSES: lambda classes: lambda elem: classes.issubset(elem.attributes.get('class', '').split()),
+    OP.DESCENDANT: _descendants,
+    OP.CHILDREN: lambda nodes: (elem for node in nodes for elem in node.elements()),
+    OP.SIBLING_NEXT: _next_sibling,
+    OP.SIBLING_SUBSEQUENT: _subsequent_siblings,
+}
 
 class WebPage(BaseWebPage):
     """
     This is an alternative WebPage object that uses only the standard library to parse HTML.
     It does require an extra dependency to parse CSS selectors, though.
+
+    The HTML is parsed once with `html.parser.HTMLParser`, which tolerates broken HTML,
+    into a lightweight tree used to find <script> and <meta> tags and to run CSS selectors.
     """
 
     def _parse_html(self):
         """
-        Parse the HTML with HTMLParser to find <script> and <meta> tags.
+        Parse the HTML with HTMLParser to build the document tree and find <script> and <meta> tags.
         """
-        script_meta_parser = ScriptMetaParser()
-        script_meta_parser.feed(self.html)
-        self.scripts.extend(script_meta_parser.script_src)
-        self.meta = script_meta_parser.meta_info
-    
-    @cached_property
-    def _dom(self) -> Optional[minidom.Document]:
-        try:
-            dom = minidom.parseString(self.html)
-        except Exception as e:
-            logging.getLogger(name="python-Wappalyzer").error(
-                f"Could not parse HTML of webpage {self.url}: {e}")
-            dom = None
-        return dom
+        builder = TreeBuilder()
+        builder.feed(self.html)
+        builder.close()
+        self._root = builder.root
+        self.scripts.extend(builder.script_src)
+        self.meta = builder.meta_info
 
     def select(self, selector: str) -> Iterable[Tag]:
         """Execute a CSS select and returns results as Tag objects."""
-        dom = self._dom
-        if not dom:
-            return ()
-        for item in select_all(dom, selector):
-            yield Tag(item.tagName, dict(item._get_attributes().items()), item)
+        for item in select_iter(self._root, selector, api=api):
+            yield Tag(item.name, item.attributes, item)
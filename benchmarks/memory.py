@@ -0,0 +1,235 @@
+"""
+Memory benchmarks of python-Wappalyzer: size the worker processes and catch leaks.
+
+Reports, with ``tracemalloc`` (Python allocations) and the resident set size (RSS, includes the
+allocations of C libraries such as libxml2):
+
+- the retained size of the compiled ruleset, ``Wappalyzer.latest()``,
+- the peak and retained memory of a page (parsed, then analyzed) by page size, for each WebPage backend,
+- the growth of ``Wappalyzer.detected_technologies`` over N analyses of distinct URLs, and of the same URL.
+
+Run it with ``make bench-memory`` or::
+
+    python benchmarks/memory.py [--pages 1000] [--json] [--check]
+
+It takes a few minutes: matching the 1 MiB pages is slow under ``tracemalloc``.
+
+With ``--check``, the process exits with status 1 if a measure exceeds its threshold, see `THRESHOLDS`.
+
+The peak memory is only measured on Python 3.9 or later (``tracemalloc.reset_peak``), it's reported as null before.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from Wappalyzer import Wappalyzer
+from Wappalyzer.webpage import IWebPage
+
+# Page sizes, in bytes
+SIZE_BUCKETS = (10 * 1024, 100 * 1024, 1024 * 1024)
+
+# Regression thresholds, in bytes. Keys are the flattened report keys.
+# About twice the measures of CPython 3.11 with the bundled ruleset: 3.8 MiB for the ruleset,
+# up to 52 (peak) and 37 (retained) bytes per byte of HTML with the bs4 backend on small pages,
+# 2 KiB per URL in detected_technologies until it's full (DETECTED_URLS_SIZE), then nothing.
+THRESHOLDS: Dict[str, float] = {
+    'ruleset.retained': 8 * 1024 * 1024,
+    # Parsed and analyzed page, per byte of HTML
+    'pages.*.peak_per_byte': 100,
+    'pages.*.retained_per_byte': 80,
+    # Analyzing the same URL again, or many distinct URLs, must not grow the memory
+    'detections.same_url.growth_per_analysis': 256,
+    'detections.distinct_urls.growth_per_analysis': 256,
+}
+
+def get_rss() -> Optional[int]:
+    """
+    Get the current resident set size of the process, in bytes, None if not available (Linux only).
+    """
+    try:
+        with open('/proc/self/status') as fd:
+            for line in fd:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def measure(func: Callable[[], Any]) -> Tuple[Any, Dict[str, Optional[int]]]:
+    """
+    Call the function and measure its memory usage while the returned object is kept alive.
+
+    :return: Tuple: the returned object and the measures, in bytes: ``peak`` and ``retained`` Python allocations,
+        ``rss`` growth of the resident set size. ``peak`` is None before Python 3.9.
+    """
+    gc.collect()
+    can_reset_peak = hasattr(tracemalloc, 'reset_peak')
+    if can_reset_peak:
+        tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    rss_before = get_rss()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    rss_after = get_rss()
+    return result, {
+        'peak': peak - before if can_reset_peak else None,
+        'retained': retained - before,
+        'rss': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+    }
+
+def make_html(size: int) -> str:
+    """
+    Build a synthetic page of about `size` bytes, with the usual markup: meta, scripts, links, nested blocks.
+    """
+    head = ('<!DOCTYPE html><html><head><meta charset="utf-8"><meta name="generator" content="WordPress 5.4.2">'
+            '<link rel="stylesheet" href="/wp-content/themes/twentytwenty/style.css?ver=5.4.2">'
+            '<script src="/wp-includes/js/jquery/jquery.js?ver=1.12.4"></script></head><body>')
+    block = ('<div class="post"><h2><a href="/{0}/">Post {0}</a></h2><p class="meta">By <span>author</span></p>'
+             '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt.</p>'
+             '<img src="/wp-content/uploads/{0}.jpg" alt=""><script>var post_{0} = {{"id": {0}}};</script></div>')
+    blocks = []
+    length = len(head)
+    index = 0
+    while length < size:
+        blocks.append(block.format(index))
+        length += len(blocks[-1])
+        index += 1
+    return head + ''.join(blocks) + '</body></html>'
+
+def get_backends() -> Dict[str, Type[Any]]:
+    """
+    Get the WebPage backends that can be imported.
+    """
+    backends = {}
+    for name in ('_bs4', '_lxml', '_stdlib'):
+        try:
+            module = __import__('Wappalyzer.webpage.' + name, fromlist=['WebPage'])
+        except ImportError:
+            continue
+        backends[name.lstrip('_')] = module.WebPage
+    return backends
+
+def bench_ruleset() -> Tuple[Wappalyzer, Dict[str, Any]]:
+    return measure(Wappalyzer.latest)
+
+def bench_pages(wappalyzer: Wappalyzer) -> Dict[str, Any]:
+    report: Dict[str, Any] = {}
+    headers = {'Server': 'nginx/1.18.0', 'X-Powered-By': 'PHP/7.4.3'}
+    for backend, webpage_class in get_backends().items():
+        for size in SIZE_BUCKETS:
+            html = make_html(size)
+            def parse_and_analyze() -> IWebPage:
+                webpage = webpage_class('http://example.com/', html, headers)
+                wappalyzer.analyze_result(webpage)
+                return webpage
+            start = time.perf_counter()
+            webpage, measures = measure(parse_and_analyze)
+            measures['seconds'] = time.perf_counter() - start
+            measures['peak_per_byte'] = measures['peak'] / len(html) if measures['peak'] is not None else None
+            measures['retained_per_byte'] = measures['retained'] / len(html)
+            report['{}.{}k'.format(backend, size // 1024)] = measures
+            del webpage
+            wappalyzer.detected_technologies.clear()
+    return report
+
+def bench_detections(wappalyzer: Wappalyzer, pages: int) -> Dict[str, Any]:
+    report: Dict[str, Any] = {}
+    webpage_class = get_backends()['bs4'] if 'bs4' in get_backends() else next(iter(get_backends().values()))
+    html = make_html(2 * 1024)
+    headers = {'Server': 'nginx/1.18.0'}
+    for name, url_for in (('same_url', lambda index: 'http://example.com/'),
+                          ('distinct_urls', lambda index: 'http://example{}.com/'.format(index))):
+        wappalyzer.detected_technologies.clear()
+        def analyze_all(offset: int) -> None:
+            for index in range(offset, offset + pages):
+                # The page is dropped after each analysis: only what Wappalyzer keeps is retained
+                wappalyzer.analyze_result(webpage_class(url_for(index), html, headers))
+        # Warm up: the bounded caches fill up first, then the memory must stop growing
+        analyze_all(0)
+        _, measures = measure(lambda: analyze_all(pages))
+        measures['urls'] = len(wappalyzer.detected_technologies)
+        measures['growth_per_analysis'] = measures['retained'] / pages
+        report[name] = measures
+    wappalyzer.detected_technologies.clear()
+    return report
+
+def flatten(report: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+    flat: Dict[str, Any] = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + '.'))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+def check(report: Dict[str, Any], thresholds: Dict[str, float] = THRESHOLDS) -> List[str]:
+    """
+    Compare the report with the thresholds.
+
+    :return: The failures, empty if all the measures are below their thresholds.
+    """
+    failures = []
+    for key, value in flatten(report).items():
+        for pattern, threshold in thresholds.items():
+            prefix, _, suffix = pattern.partition('*')
+            matches = key == pattern if not _ else key.startswith(prefix) and key.endswith(suffix)
+            if matches and value is not None and value > threshold:
+                failures.append('{}: {:,.0f} > {:,.0f}'.format(key, value, threshold))
+    return failures
+
+def _format_size(value: Optional[float]) -> str:
+    if value is None:
+        return 'n/a'
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(value) < 1024:
+            return '{:.1f} {}'.format(value, unit)
+        value /= 1024
+    return '{:.1f} GiB'.format(value)
+
+def format_report(report: Dict[str, Any]) -> str:
+    ruleset = report['ruleset']
+    lines = ['Ruleset: retained {}, peak {}, RSS {}'.format(
+        _format_size(ruleset['retained']), _format_size(ruleset['peak']), _format_size(ruleset['rss']))]
+    lines += ['', 'Pages (parse + analyze):',
+              '{:<14} {:>12} {:>12} {:>12} {:>10}'.format('backend.size', 'peak', 'retained', 'RSS', 'seconds')]
+    for name, measures in report['pages'].items():
+        lines.append('{:<14} {:>12} {:>12} {:>12} {:>10.3f}'.format(name, _format_size(measures['peak']),
+                     _format_size(measures['retained']), _format_size(measures['rss']), measures['seconds']))
+    lines += ['', 'detected_technologies:']
+    for name, measures in report['detections'].items():
+        lines.append('{:<14} {} URLs, retained {}, {} per analysis'.format(name, measures['urls'],
+                     _format_size(measures['retained']), _format_size(measures['growth_per_analysis'])))
+    return '\n'.join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="python-Wappalyzer memory benchmarks")
+    parser.add_argument('--pages', type=int, default=1000, help='Number of analyses for the detected_technologies growth')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 if a measure exceeds its threshold')
+    args = parser.parse_args(argv)
+
+    tracemalloc.start()
+    wappalyzer, ruleset = bench_ruleset()
+    report = {
+        'ruleset': ruleset,
+        'pages': bench_pages(wappalyzer),
+        'detections': bench_detections(wappalyzer, args.pages),
+    }
+    tracemalloc.stop()
+
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    if args.check:
+        failures = check(report)
+        for failure in failures:
+            print('FAILED ' + failure, file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
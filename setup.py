@@ -27,8 +27,16 @@ setup(
     extras_require      =   {
                              # Pin pydoctor version until https://github.com/twisted/pydoctor/issues/513 is fixed
                              'docs': ["pydoctor==21.2.2", "docutils"], 
+                             # Required by the lxml-only WebPage: Wappalyzer.webpage._lxml
+                             'lxml': ["cssselect"],
+                             # Required by Wappalyzer.columnar.BatchResults.to_array()
+                             'numpy': ["numpy"],
+                             # Regex backends of Wappalyzer.regex_backends
+                             'regex': ["regex"],
+                             're2': ["google-re2"],
                              'dev': ["tox", "mypy>=0.902", "httpretty", "pytest", "pytest-asyncio", 
-                                     "types-requests", "types-pkg_resources", "aioresponses"]
+                                     "types-requests", "types-pkg_resources", "aioresponses", "cssselect", 
+                                     "opentelemetry-sdk"]
                             },
     python_requires     =   '>=3.6',
 )
\ No newline at end of file
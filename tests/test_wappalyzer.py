@@ -1,7 +1,12 @@
 import pytest
 import requests
+import codecs
+import gzip
 import json
+import pickle
 import os
+import asyncio
+import concurrent.futures
 
 from pathlib import Path
 from contextlib import redirect_stdout
@@ -9,10 +14,26 @@ from io import StringIO
 
 from httpretty import HTTPretty, httprettified
 from aioresponses import aioresponses
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
 
 from Wappalyzer.fingerprint import Fingerprint
-from Wappalyzer import WebPage, Wappalyzer
-from Wappalyzer.__main__ import get_parser, main
+from Wappalyzer import WebPage, Wappalyzer, AnalysisResult
+from Wappalyzer.__main__ import get_parser, main, get_profile_parser, profile_main
+from Wappalyzer.updater import RulesetUpdater
+from Wappalyzer.sources import iter_warc, iter_har, iter_directory, iter_ndjson, FileRecord
+from Wappalyzer.pipeline import analyze_records, write_ndjson, analyze_to_ndjson
+from Wappalyzer.metrics import InMemoryMetrics, set_metrics
+from Wappalyzer.tracing import RecordingTracer, OpenTelemetryTracer
+from Wappalyzer.server import AnalysisService
+from Wappalyzer.sharding import ShardedAnalyzer, split_ruleset
+from Wappalyzer.columnar import BatchResults
+from Wappalyzer.incremental import IncrementalAnalyzer, PageState
+from Wappalyzer.neardup import NearDuplicateAnalyzer, get_sketch, get_distance
+from Wappalyzer.scheduler import HostScheduler
+from Wappalyzer.executors import AnalysisExecutor
+from Wappalyzer.profiler import profile_ruleset, iter_corpus
 
 @pytest.fixture
 def async_mock():
@@ -28,6 +49,27 @@ def test_new_from_url():
 
     assert webpage.html == 'snerble'
 
+@httprettified
+def test_new_from_url_charset():
+    HTTPretty.register_uri(HTTPretty.GET, 'http://example.com/',
+                            body='<html><meta charset="windows-1251">\u0442\u0435\u0441\u0442</html>'.encode('windows-1251'), 
+                            content_type='text/html')
+
+    webpage = WebPage.new_from_url('http://example.com/')
+
+    assert webpage.html == '<html><meta charset="windows-1251">\u0442\u0435\u0441\u0442</html>'
+
+def test_decode_html():
+    from Wappalyzer.webpage._common import decode_html
+    body = 'caf\xe9'.encode('latin-1')
+    assert decode_html(body, {'Content-Type': 'text/html; charset="ISO-8859-1"'}) == 'caf\xe9'
+    assert decode_html(body, {'Content-Type': 'text/html; charset=unknown'}) == 'caf\ufffd'
+    assert decode_html(b"<meta http-equiv='Content-Type' content='text/html; charset=latin-1'>" + body, {}).endswith('caf\xe9')
+    # Declared charset wins over the meta charset
+    assert decode_html(b'<meta charset="latin-1">' + 'caf\xe9'.encode('utf-8'), {'content-type': 'text/html; charset=utf-8'}).endswith('caf\xe9')
+    assert decode_html(codecs.BOM_UTF8 + 'caf\xe9'.encode('utf-8'), {'Content-Type': 'text/html; charset=latin-1'}) == 'caf\xe9'
+    assert decode_html(memoryview('caf\xe9'.encode('utf-8')), {}) == 'caf\xe9'
+
 @pytest.mark.asyncio
 async def test_new_from_url_async(async_mock):
     async_mock.get('http://example.com', status=200, body='snerble')
@@ -63,6 +105,83 @@ def test_latest_update(tmp_path: Path):
     assert wappalyzer1.technologies==wappalyzer2.technologies
     assert wappalyzer1.categories==wappalyzer2.categories
 
+@httprettified
+def test_latest_update_conditional(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.delenv('APPDATA', raising=False)
+    technologies = {"categories": {"1": {"name": "CMS", "priority": 1}}, 
+                    "technologies": {"a": {"html": "aaa", "cats": [1]}}}
+    HTTPretty.register_uri(HTTPretty.GET, 'https://raw.githubusercontent.com/AliasIO/wappalyzer/master/src/technologies.json', 
+                           body=json.dumps(technologies), etag='"v1"')
+    
+    wappalyzer = Wappalyzer.latest(update=True)
+    assert list(wappalyzer.technologies) == ['a']
+    tmp_file = tmp_path.joinpath('.python-Wappalyzer/technologies.json')
+    assert json.loads(tmp_file.with_name('technologies.json.meta').read_text())['etag'] == '"v1"'
+    
+    # Already updated in the last 24h
+    HTTPretty.reset()
+    assert list(Wappalyzer.latest(update=True).technologies) == ['a']
+    assert HTTPretty.last_request.method is None
+
+    # Not modified upstream
+    os.utime(tmp_file, (0, 0))
+    HTTPretty.register_uri(HTTPretty.GET, 'https://raw.githubusercontent.com/AliasIO/wappalyzer/master/src/technologies.json', 
+                           status=304, body='')
+    assert list(Wappalyzer.latest(update=True).technologies) == ['a']
+    assert HTTPretty.last_request.headers['If-None-Match'] == '"v1"'
+    assert tmp_file.stat().st_mtime > 0
+    assert [p.name for p in tmp_file.parent.iterdir() if p.suffix == '.tmp'] == []
+
+@httprettified
+def test_ruleset_updater(tmp_path: Path):
+    technologies = {"categories": {"1": {"name": "CMS", "priority": 1}}, 
+                    "technologies": {"a": {"html": "aaa", "cats": [1]}, "b": {"html": "bbb", "cats": [1]}}}
+    tmp_file = tmp_path.joinpath('technologies.json')
+    tmp_file.write_text(json.dumps(technologies))
+    tracer = RecordingTracer()
+    updater = RulesetUpdater(technologies_file=str(tmp_file), url='http://example.com/technologies.json', 
+                             tracer=tracer, fast=True, regex_backends=('re',), regex_timeout=1, detected_urls=10)
+    wappalyzer1 = updater.wappalyzer
+
+    technologies['technologies']['b'] = {"html": "ccc", "cats": [1]}
+    HTTPretty.register_uri(HTTPretty.GET, 'http://example.com/technologies.json', 
+                           body=json.dumps(technologies), etag='"v2"')
+    assert updater.refresh()
+    wappalyzer2 = updater.wappalyzer
+
+    assert wappalyzer1 is not wappalyzer2
+    # Unchanged fingerprints are reused, changed ones are compiled again
+    assert wappalyzer2.technologies['a'] is wappalyzer1.technologies['a']
+    assert wappalyzer2.technologies['b'] is not wappalyzer1.technologies['b']
+    assert wappalyzer2.analyze(WebPage('http://example.com', '<html>ccc</html>', {})) == {'b'}
+    assert wappalyzer1.analyze(WebPage('http://example.com', '<html>ccc</html>', {})) == set()
+    # The options are kept
+    assert wappalyzer2.tracer is tracer and wappalyzer2.fast
+    assert (wappalyzer2.regex_backends, wappalyzer2.regex_timeout, wappalyzer2.detected_urls) == (('re',), 1, 10)
+
+    # Same content
+    assert not updater.refresh()
+    assert HTTPretty.last_request.headers['If-None-Match'] == '"v2"'
+    assert updater.wappalyzer is wappalyzer2
+
+    # A broken download is retried, even if its ETag did not change
+    def conditional(body):
+        def callback(request, uri, headers):
+            if request.headers.get('If-None-Match') == '"v3"':
+                return 304, headers, ''
+            return 200, dict(headers, etag='"v3"'), body
+        return callback
+    HTTPretty.register_uri(HTTPretty.GET, 'http://example.com/technologies.json', body=conditional('{"techno'))
+    with pytest.raises(ValueError):
+        updater.refresh()
+    assert updater.wappalyzer is wappalyzer2
+    technologies['technologies']['c'] = {"html": "ddd", "cats": [1]}
+    HTTPretty.register_uri(HTTPretty.GET, 'http://example.com/technologies.json', body=conditional(json.dumps(technologies)))
+    assert updater.refresh()
+    assert 'c' in updater.wappalyzer.technologies
+    assert not updater.refresh()
+
 def test_analyze_no_technologies():
     analyzer = Wappalyzer(categories={}, technologies={})
     webpage = WebPage('http://example.com', '<html></html>', {})
@@ -340,6 +459,967 @@ def test_analyze_dom_dict_attributes():
     assert analyzer.analyze(webpageA) == {"a"}
     assert analyzer.analyze(webpageB) == {"b"}
 
+def test_detect():
+    webpage = WebPage('http://wordpress-example.com', '<html><head><meta name="generator" content="WordPress 5.4.2"></head><p class="drupal">Drupal</p></html>', {'X-Powered-By': 'PHP/7.4'})
+    technologies = {
+        "WordPress": {
+            "meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"},
+            "dom": ".wp-block",
+        },
+        "Drupal": {
+            "html": "<p class=\"drupal\">",
+            "implies": "PHP",
+        },
+        "Yoast SEO": {
+            "html": "Yoast",
+            "implies": "WordPress",
+        },
+        "PHP": {
+            "headers": {"X-Powered-By": "^php/?([\\d.]+)?\\;version:\\1"},
+        },
+        "Nginx": {
+            "headers": {"Server": "nginx"},
+        },
+    }
+    analyzer = Wappalyzer(categories={}, technologies=technologies)
+
+    assert analyzer._get_implying_technologies(['PHP']) == {'Drupal'}
+    assert analyzer.detect(webpage, targets=['WordPress', 'PHP', 'Unknown']) == {
+        'WordPress': {'versions': ['5.4.2']}, 
+        'PHP': {'versions': ['7.4']}}
+    assert analyzer.detect(webpage, targets=['Drupal']) == {'Drupal': {'versions': []}}
+    assert analyzer.detect(webpage, targets=['Nginx']) == {}
+
+    # Another page at the same URL: nothing is kept from the previous analyses
+    analyzer.analyze(WebPage('http://example.com', '<meta name="generator" content="WordPress 4.0">', {}))
+    assert analyzer.detect(WebPage('http://example.com', '<meta name="generator" content="WordPress">', {}), 
+                           targets=['WordPress']) == {'WordPress': {'versions': []}}
+
+def test_detect_short_circuit():
+    class NoDomWebPage(WebPage):
+        def select(self, selector):
+            raise AssertionError("DOM selection should have been skipped")
+
+    webpage = NoDomWebPage('http://wordpress-example.com', '<html><head><meta name="generator" content="WordPress 5.4.2"></head></html>', {})
+    technologies = {
+        "WordPress": {
+            "meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"},
+            "dom": ".wp-block",
+        },
+        "Drupal": {
+            "dom": ".drupal",
+        },
+    }
+    analyzer = Wappalyzer(categories={}, technologies=technologies)
+
+    assert analyzer.detect(webpage, targets=['WordPress']) == {'WordPress': {'versions': ['5.4.2']}}
+    with pytest.raises(AssertionError):
+        analyzer.analyze(webpage)
+
+def test_lxml_webpage():
+    LxmlWebPage = pytest.importorskip('Wappalyzer.webpage._lxml').WebPage
+    webpage = LxmlWebPage('http://example.com', '<html><head><meta name="Generator" content="WordPress 5.4.2">'
+                          '<script src="/jquery.js"></script></head>'
+                          '<p class="aaa" onclick="webpageAScript()">webpage &amp; <b>a</b></p></html>', {})
+    assert webpage.scripts == ['/jquery.js']
+    # Not lxml strings, that would keep the tree alive
+    assert type(webpage.scripts[0]) is str
+    assert webpage.meta == {'generator': 'WordPress 5.4.2'}
+    tags = list(webpage.select('p.aaa'))
+    assert [(tag.name, tag.attributes, tag.inner_html) for tag in tags] == [
+        ('p', {'class': 'aaa', 'onclick': 'webpageAScript()'}, 'webpage &amp; <b>a</b>')]
+    assert list(webpage.select('[unsupported!')) == []
+    _lxml = pytest.importorskip('Wappalyzer.webpage._lxml')
+    # The selectors that are not in the ruleset are compiled on first use, in a bounded cache
+    for index in range(_lxml.SELECTOR_CACHE_SIZE + 10):
+        _lxml.compile_selector('#id{}'.format(index))
+    assert _lxml._compile_other.cache_info().currsize == _lxml.SELECTOR_CACHE_SIZE
+    assert list(LxmlWebPage('http://example.com', '', {}).select('p')) == []
+
+    technologies = {
+        'a': { 'dom': {'.aaa': { 'attributes': {'onclick': 'webpageAScript.*'}, }} },
+        'b': { 'dom': {'p': { 'text': '<b>b</b>', }} },
+    }
+    analyzer = Wappalyzer(categories={}, technologies=technologies)
+    # The selectors of the ruleset are compiled when it's loaded
+    assert set(_lxml._ruleset_xpaths) == {'.aaa', 'p'}
+    misses = _lxml._compile_other.cache_info().misses
+    assert analyzer.analyze(webpage) == {"a"}
+    assert _lxml._compile_other.cache_info().misses == misses
+    # And when it's unpickled in a worker process
+    state = pickle.dumps(analyzer)
+    _lxml.precompile_selectors(())
+    pickle.loads(state)
+    assert set(_lxml._ruleset_xpaths) == {'.aaa', 'p'}
+
+def test_stdlib_webpage():
+    from Wappalyzer.webpage._stdlib import WebPage as StdlibWebPage
+    # Not well-formed XML
+    webpage = StdlibWebPage('http://example.com', '<html><head><meta name="Generator" content="WordPress 5.4.2">'
+                          '<script src="/jquery.js"></script></head><body><br>'
+                          '<ul><li>1<li class="second">2</ul>'
+                          '<p class="aaa" onclick="webpageAScript()">webpage &amp; <b>a</b></span></p>'
+                          '<div><p id="bbb">b</div>', {})
+    assert webpage.scripts == ['/jquery.js']
+    assert webpage.meta == {'generator': 'WordPress 5.4.2'}
+    tags = list(webpage.select('p.aaa'))
+    assert [(tag.name, tag.attributes, tag.inner_html) for tag in tags] == [
+        ('p', {'class': 'aaa', 'onclick': 'webpageAScript()'}, 'webpage &amp; <b>a</b>')]
+    assert [tag.inner_html for tag in webpage.select('ul > li')] == ['1', '2']
+    assert [tag.inner_html for tag in webpage.select('li + li.second, div > #bbb')] == ['2', 'b']
+    assert [tag.name for tag in webpage.select('head ~ body [onclick^="webpage"]')] == ['p']
+
+    technologies = {
+        'a': { 'dom': {'.aaa': { 'attributes': {'onclick': 'webpageAScript.*'}, }} },
+        'b': { 'dom': ['#bbb'] },
+        'c': { 'dom': {'p': { 'text': '<b>b</b>', }} },
+    }
+    analyzer = Wappalyzer(categories={}, technologies=technologies)
+    assert analyzer.analyze(webpage) == {"a", "b"}
+
+    # Thousands of unclosed elements don't exceed the recursion limit
+    webpage = StdlibWebPage('http://example.com', '<font>' * 5000 + '<p class="aaa" onclick="webpageAScript()">a' + '<br>b' * 5000, {})
+    assert analyzer.analyze(webpage) == {"a"}
+    font = next(iter(webpage.select('font')))
+    assert font.inner_html.startswith('<font><font>') and font.inner_html.endswith('</font></font>')
+    assert len(list(webpage.select('br + br'))) == 4999
+    assert len(list(webpage.select('p > br ~ br'))) == 4999
+
+def _warc_record(warc_type, url, block, content_type='application/http; msgtype=response'):
+    head = (f"WARC/1.0\r\nWARC-Type: {warc_type}\r\nWARC-Target-URI: {url}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(block)}\r\n\r\n").encode()
+    return gzip.compress(head + block + b"\r\n\r\n")
+
+@pytest.fixture
+def warc_file(tmp_path: Path):
+    html = '<html><head><meta name="generator" content="WordPress 5.4.2"></head><p>caf\xe9</p></html>'.encode('latin-1')
+    chunked = b"%x\r\n%s\r\n0\r\n\r\n" % (len(html), html)
+    warc = tmp_path.joinpath('crawl.warc.gz')
+    warc.write_bytes(
+        _warc_record('warcinfo', '', b'software: test', content_type='application/warc-fields') +
+        _warc_record('request', 'http://a.example.com/', b'GET / HTTP/1.1\r\n\r\n', content_type='application/http; msgtype=request') + 
+        _warc_record('response', 'http://a.example.com/', b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=latin-1\r\n"
+                     b"Transfer-Encoding: chunked\r\nServer: nginx\r\n\r\n" + chunked) +
+        _warc_record('response', 'http://a.example.com/logo.png', b"HTTP/1.1 200 OK\r\nContent-Type: image/png\r\n\r\n\x89PNG") +
+        _warc_record('response', 'http://b.example.com/', b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+                     b"Content-Encoding: gzip\r\n\r\n" + gzip.compress(b'<html>bbb</html>')))
+    return warc
+
+def test_iter_warc(warc_file):
+    records = list(iter_warc(str(warc_file)))
+    assert [r.url for r in records] == ['http://a.example.com/', 'http://b.example.com/']
+    assert records[0].headers['server'] == 'nginx'
+    assert 'caf\xe9' in records[0].to_webpage().html
+    assert records[1].body == b'<html>bbb</html>'
+    assert len(list(iter_warc(str(warc_file), html_only=False))) == 3
+
+def test_iter_har(tmp_path: Path):
+    har = {'log': {'entries': [
+        {'request': {'url': 'http://a.example.com/'}, 
+         'response': {'headers': [{'name': 'Server', 'value': 'nginx'}], 
+                      'content': {'mimeType': 'text/html', 'text': '<html>caf\xe9</html>'}}},
+        {'request': {'url': 'http://a.example.com/app.js'}, 
+         'response': {'headers': [], 'content': {'mimeType': 'application/javascript', 'text': ''}}},
+        {'request': {'url': 'http://b.example.com/'}, 
+         'response': {'headers': [], 'content': {'mimeType': 'text/html', 'encoding': 'base64', 'text': 'PGh0bWw+YmJiPC9odG1sPg=='}}},
+    ]}}
+    har_file = tmp_path.joinpath('capture.har')
+    har_file.write_text(json.dumps(har))
+    records = list(iter_har(str(har_file)))
+    assert [r.url for r in records] == ['http://a.example.com/', 'http://b.example.com/']
+    assert records[0].to_webpage().html == '<html>caf\xe9</html>'
+    assert records[1].body == b'<html>bbb</html>'
+
+@pytest.mark.parametrize("processes", [0, 2])
+def test_analyze_records(warc_file, processes):
+    technologies = {
+        "WordPress": {"meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}, "cats": [1]},
+        "Nginx": {"headers": {"Server": "nginx"}},
+        "b": {"html": "bbb"},
+    }
+    analyzer = Wappalyzer(categories={"1": {"name": "CMS"}}, technologies=technologies)
+    with StringIO() as output:
+        assert write_ndjson(analyze_records(iter_warc(str(warc_file)), analyzer, processes=processes), output) == 2
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert lines == [
+        {'url': 'http://a.example.com/', 'technologies': {
+            'WordPress': {'versions': ['5.4.2'], 'categories': ['CMS']},
+            'Nginx': {'versions': [], 'categories': []}}},
+        {'url': 'http://b.example.com/', 'technologies': {'b': {'versions': [], 'categories': []}}}]
+    assert analyzer.detected_technologies == {}
+
+@pytest.fixture
+def metrics():
+    metrics = InMemoryMetrics()
+    set_metrics(metrics)
+    yield metrics
+    set_metrics(None)
+
+@httprettified
+def test_metrics(metrics, monkeypatch):
+    HTTPretty.register_uri(HTTPretty.GET, 'http://example.com/', 
+                           body='<html><meta name="generator" content="WordPress 5.4.2"></html>')
+    technologies = {
+        "WordPress": {"meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}, "implies": "PHP"},
+        "PHP": {},
+    }
+    analyzer = Wappalyzer(categories={}, technologies=technologies)
+    analyzer.analyze(WebPage.new_from_url('http://example.com/'))
+    def raise_connection_error(*args, **kwargs):
+        raise requests.ConnectionError()
+    monkeypatch.setattr(requests, 'get', raise_connection_error)
+    with pytest.raises(requests.ConnectionError):
+        WebPage.new_from_url('http://unknown.example.com/')
+
+    assert metrics.get_count('wappalyzer_fetch_seconds') == 1
+    assert metrics.get_counter('wappalyzer_fetched_bytes_total') == 62
+    assert metrics.get_count('wappalyzer_parse_seconds') == 1
+    assert metrics.get_count('wappalyzer_match_seconds') == 1
+    assert metrics.get_count('wappalyzer_version_seconds') == 1
+    assert metrics.get_count('wappalyzer_implies_seconds') == 1
+    assert metrics.get_counter('wappalyzer_pages_analyzed_total') == 1
+    assert metrics.get_counter('wappalyzer_detections_total', technology='PHP') == 1
+    assert metrics.get_counter('wappalyzer_errors_total', stage='fetch', type='ConnectionError') == 1
+    
+    text = metrics.to_prometheus()
+    assert '# TYPE wappalyzer_detections_total counter\n' in text
+    assert 'wappalyzer_detections_total{technology="WordPress"} 1\n' in text
+    assert '# TYPE wappalyzer_parse_seconds histogram\n' in text
+    assert 'wappalyzer_parse_seconds_bucket{le="+Inf"} 1\n' in text
+    assert 'wappalyzer_parse_seconds_count 1\n' in text
+
+@httprettified
+def test_tracing():
+    HTTPretty.register_uri(HTTPretty.GET, 'http://example.com/', 
+                           body='<html><meta name="generator" content="WordPress 5.4.2"><div class="wp"></div></html>')
+    technologies = {
+        "WordPress": {"meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}, 
+                      "dom": "div.wp", "implies": "PHP"},
+        "PHP": {},
+    }
+    tracer = RecordingTracer()
+    analyzer = Wappalyzer(categories={}, technologies=technologies, tracer=tracer)
+    analyzer.analyze(WebPage.new_from_url('http://example.com/', tracer=tracer))
+
+    spans = {span.stage: span for span in tracer.spans}
+    assert [span.stage for span in tracer.spans][:2] == ['fetch', 'parse']
+    assert spans['fetch'].attributes == {'url': 'http://example.com/', 'status': 200, 'bytes': 84}
+    assert spans['parse'].attributes['meta'] == 1
+    assert spans['analyze'].attributes['detected'] == ['PHP', 'WordPress']
+    assert spans['implies'].attributes['implied'] == ['PHP']
+    assert spans['dom.select'].attributes == {'url': 'http://example.com/', 'technology': 'WordPress', 
+                                              'selector': 'div.wp', 'elements': 1}
+    families = {(s.attributes['technology'], s.attributes['family']): s.attributes['matched'] 
+                for s in tracer.spans if s.stage == 'family'}
+    assert families == {('WordPress', 'meta'): True, ('WordPress', 'dom'): True}
+    assert all(span.duration >= 0 for span in tracer.spans)
+
+def test_opentelemetry_tracer():
+    pytest.importorskip('opentelemetry.sdk')
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+
+    analyzer = Wappalyzer(categories={}, technologies={"PHP": {"headers": {"X-Powered-By": "PHP"}}, "Laravel": {"implies": "PHP"}}, 
+                          tracer=OpenTelemetryTracer(provider.get_tracer('python-Wappalyzer')))
+    with provider.get_tracer('test').start_as_current_span('request') as request_span:
+        analyzer.analyze(WebPage('http://example.com/', html='', headers={'X-Powered-By': 'PHP'}))
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert set(spans) == {'request', 'wappalyzer.analyze', 'wappalyzer.family', 'wappalyzer.implies'}
+    assert dict(spans['wappalyzer.analyze'].attributes) == {'url': 'http://example.com/', 'detected': ('PHP',)}
+    # The nested stages are children of the analyze span, itself a child of the current span
+    assert spans['wappalyzer.analyze'].parent.span_id == request_span.get_span_context().span_id
+    assert spans['wappalyzer.family'].parent.span_id == spans['wappalyzer.analyze'].context.span_id
+    assert spans['wappalyzer.implies'].parent.span_id == spans['wappalyzer.analyze'].context.span_id
+    assert len({span.context.trace_id for span in spans.values()}) == 1
+
+def test_shared_patterns():
+    technologies = {
+        "Foo": {"html": "<foo ([\\d.]+)\\;version:\\1", "headers": {"Server": "nginx"}, "dom": "div.shared"},
+        "Bar": {"html": "<foo ([\\d.]+)", "headers": {"X-Powered-By": "nginx"}, "dom": "div.shared"},
+        "Baz": {"html": ["<baz", "<foo ([\\d.]+)"], "dom": ["div.baz", "div.shared"]},
+    }
+    analyzer = Wappalyzer(categories={}, technologies=technologies)
+    assert analyzer.technologies['Foo'].html[0].regex is analyzer.technologies['Bar'].html[0].regex
+    assert analyzer.technologies['Foo'].headers['server'][0].regex is analyzer.technologies['Bar'].headers['x-powered-by'][0].regex
+    assert analyzer.get_pattern_stats() == {'patterns': 10, 'regexes': 3, 'evaluations': 6, 'shared': 2}
+
+    selected = []
+    class CountingWebPage(WebPage):
+        def select(self, selector):
+            selected.append(selector)
+            return super().select(selector)
+
+    webpage = CountingWebPage('http://example.com', html='<foo 1.2><div class="shared"></div>', headers={'Server': 'nginx'})
+    assert analyzer.analyze_with_versions(webpage) == {
+        'Foo': {'versions': ['1.2']}, 'Bar': {'versions': []}, 'Baz': {'versions': []}}
+    assert sorted(selected) == ['div.baz', 'div.shared']
+
+def test_requires_and_excludes():
+    technologies = {
+        "Drupal": {"html": "drupal"},
+        "Backdrop": {"meta": {"generator": "Backdrop CMS"}, "excludes": "Drupal"},
+        "WordPress": {"cats": [1], "meta": {"generator": "WordPress"}, "implies": "PHP"},
+        "PHP": {},
+        "WooCommerce": {"requires": "WordPress", "html": "woocommerce"},
+        "Yoast SEO": {"requiresCategory": 1, "html": "yoast"},
+        "PHP plugin": {"requires": ["Ruby", "PHP"], "html": "woocommerce"},
+        "Shopify app": {"requires": "Shopify", "html": "woocommerce"},
+        "Shopify": {"html": "cdn.shopify.com"},
+        "Angular": {"html": "ng-version", "excludes": ["AngularJS"]},
+        "AngularJS": {"html": "ng-(?:app|version)", "excludes": "Angular"},
+        "jQuery": {"html": "jquery", "excludes": "Zepto"},
+        "Zepto": {"requires": "WordPress", "html": "zepto"},
+    }
+    html = ('<meta name="generator" content="WordPress"><meta name="generator" content="Backdrop CMS">'
+            '<div class="woocommerce yoast drupal zepto jquery" ng-version="12"></div>')
+    tracer = RecordingTracer()
+    wappalyzer = Wappalyzer(categories={"1": {"name": "CMS"}}, technologies=technologies, tracer=tracer)
+    webpage = WebPage('http://example.com', html=html, headers={})
+    webpage.meta = {'generator': 'WordPress Backdrop CMS'}
+    assert wappalyzer.analyze(webpage) == {'Backdrop', 'WordPress', 'PHP', 'WooCommerce', 'Yoast SEO', 'PHP plugin', 'Angular', 'jQuery'}
+    evaluated = [span.attributes['technology'] for span in tracer.spans if span.stage == 'family']
+    # Excluders first, the excluded and the dependents without requirements are not evaluated
+    assert evaluated.index('Backdrop') < evaluated.index('WordPress')
+    assert 'Drupal' not in evaluated and 'AngularJS' not in evaluated and 'Shopify app' not in evaluated
+    assert evaluated[-3:] == ['WooCommerce', 'Yoast SEO', 'PHP plugin']
+
+    assert wappalyzer.detect(WebPage('http://example.com', html=html, headers={}), ['Drupal', 'WooCommerce', 'Shopify app']) == {}
+    detected = Wappalyzer(categories={"1": {"name": "CMS"}}, technologies=technologies).detect(webpage, ['WooCommerce', 'Zepto'])
+    assert detected == {'WooCommerce': {'versions': []}}
+
+def test_fast_mode():
+    technologies = {
+        "WordPress": {"meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"},
+                      "html": "<link [^>]+/wp-content/", "dom": "link[href*='wp-content']"},
+        "Nginx": {"headers": {"Server": "nginx"}, "html": "nginx/([\\d.]+)\\;version:\\1"},
+        "Varnish": {"headers": {"Via": "varnish\\;confidence:50"}, "html": "varnish\\;confidence:50"},
+    }
+    webpage = lambda: WebPage('http://example.com', 
+        html='<meta name="generator" content="WordPress 5.4.2"><link rel="stylesheet" href="/wp-content/a.css">'
+             '<!-- nginx/1.18.0 varnish -->',
+        headers={'Server': 'nginx', 'Via': '1.1 varnish'})
+    tracers = {fast: RecordingTracer() for fast in (False, True)}
+    results = {fast: Wappalyzer(categories={}, technologies=technologies, tracer=tracers[fast], fast=fast).analyze_result(webpage()) 
+               for fast in (False, True)}
+    assert results[True].with_versions_and_categories() == results[False].with_versions_and_categories() == {
+        'WordPress': {'versions': ['5.4.2'], 'categories': []}, 'Nginx': {'versions': ['1.18.0'], 'categories': []}, 
+        'Varnish': {'versions': [], 'categories': []}}
+    assert results[False].get_confidence('WordPress') == 300
+    assert results[True].get_confidence('WordPress') == 100
+    assert results[True].get_confidence('Varnish') == 100
+    # WordPress is settled by its meta pattern: no more patterns can add a version
+    assert [(span.attributes['technology'], span.attributes['family']) for span in tracers[True].spans if span.stage == 'family'] == [
+        ('WordPress', 'meta'), ('Nginx', 'headers'), ('Nginx', 'html'), ('Varnish', 'headers'), ('Varnish', 'html')]
+
+    # Same output with the bundled ruleset
+    html = ('<html><head><meta name="generator" content="WordPress 5.4.2">'
+            '<script src="/wp-includes/js/jquery/jquery.min.js?ver=3.5.1"></script>'
+            '<link rel="stylesheet" href="/wp-content/themes/twentytwenty/style.css"></head></html>')
+    headers = {'Server': 'nginx/1.18.0', 'X-Powered-By': 'PHP/7.4.3'}
+    exhaustive, fast = Wappalyzer.latest(), Wappalyzer.latest(fast=True)
+    assert (fast.analyze_with_versions_and_categories(WebPage('http://example.com', html, headers)) == 
+            exhaustive.analyze_with_versions_and_categories(WebPage('http://example.com', html, headers)))
+
+def test_analyze_result():
+    technologies = {
+        "WordPress": {"cats": [1], "meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}, "implies": "PHP"},
+        "PHP": {"cats": [2]},
+    }
+    tracer = RecordingTracer()
+    analyzer = Wappalyzer(categories={"1": {"name": "CMS"}, "2": {"name": "Programming languages"}}, 
+                          technologies=technologies, tracer=tracer)
+    webpage = WebPage('http://example.com', html='<meta name="generator" content="WordPress 5.4.2">', headers={})
+
+    result = analyzer.analyze_result(webpage)
+    assert isinstance(result, AnalysisResult)
+    assert result.technologies == {'WordPress', 'PHP'}
+    assert result.get_versions('WordPress') == ['5.4.2']
+    assert result.get_confidence('WordPress') == 100
+    assert result.get_confidence('PHP') is None
+    assert result.get_categories('PHP') == ['Programming languages']
+
+    # All the projections reuse the same analysis
+    assert analyzer.analyze(webpage) == {'WordPress', 'PHP'}
+    assert analyzer.analyze_with_categories(webpage) == {
+        'WordPress': {'categories': ['CMS']}, 'PHP': {'categories': ['Programming languages']}}
+    versions = analyzer.analyze_with_versions_and_categories(webpage)
+    assert versions == {
+        'WordPress': {'versions': ['5.4.2'], 'categories': ['CMS']}, 
+        'PHP': {'versions': [], 'categories': ['Programming languages']}}
+    assert analyzer.detect(webpage, ['PHP']) == {'PHP': {'versions': []}}
+    assert analyzer.analyze_result(webpage) is result
+    assert [span.stage for span in tracer.spans].count('analyze') == 1
+    
+    # Projections are copies
+    versions['WordPress']['versions'].append('6.0')
+    assert analyzer.analyze_with_versions(webpage)['WordPress'] == {'versions': ['5.4.2']}
+
+    # Another instance or another page runs the engine again
+    Wappalyzer(categories={}, technologies=technologies, tracer=tracer).analyze(webpage)
+    analyzer.analyze(WebPage('http://example.com', html='', headers={}))
+    assert [span.stage for span in tracer.spans].count('analyze') == 3
+
+    # The results do not change with the later analyses of the URL
+    result = analyzer.analyze_result(WebPage('http://example.org', html='<meta name="generator" content="WordPress 4.0">', headers={}))
+    analyzer.detected_technologies['http://example.org']['WordPress'].versions.append('5.1')
+    analyzer.detect(WebPage('http://example.org', html='<meta name="generator" content="WordPress 5.1">', headers={}), ['WordPress'])
+    assert result.get_versions('WordPress') == ['4.0']
+
+def test_detected_urls():
+    technologies = {"WordPress": {"meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}}}
+    html = '<meta name="generator" content="WordPress 5.4.2">'
+    # Only the detections of the last analyzed URLs are kept
+    analyzer = Wappalyzer(categories={}, technologies=technologies, detected_urls=2)
+    for url in ('http://a.example.com', 'http://b.example.com', 'http://c.example.com'):
+        analyzer.analyze(WebPage(url, html=html, headers={}))
+    assert list(analyzer.detected_technologies) == ['http://b.example.com', 'http://c.example.com']
+    assert analyzer.get_versions('http://c.example.com', 'WordPress') == ['5.4.2']
+    assert analyzer.get_versions('http://a.example.com', 'WordPress') == []
+    copy = pickle.loads(pickle.dumps(analyzer))
+    assert copy.detected_technologies.size == 2
+    assert list(copy.detected_technologies) == ['http://b.example.com', 'http://c.example.com']
+
+    # From several threads
+    urls = ['http://{}.example.com'.format(index) for index in range(200)]
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda url: analyzer.analyze(WebPage(url, html=html, headers={})), urls))
+    assert len(analyzer.detected_technologies) == 2
+
+    # No limit
+    analyzer = Wappalyzer(categories={}, technologies=technologies, detected_urls=None)
+    for url in urls:
+        analyzer.analyze(WebPage(url, html=html, headers={}))
+    assert len(analyzer.detected_technologies) == 200
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('processes', [0, 1])
+async def test_server(processes):
+    async def page(request):
+        return web.Response(text='<html><meta name="generator" content="WordPress 5.4.2"></html>', 
+                            content_type='text/html', headers={'Server': 'nginx'})
+    async def big_page(request):
+        return web.Response(text=' ' * 4096 + '<html><meta name="generator" content="WordPress 5.4.2"></html>', 
+                            content_type='text/html', headers={'Server': 'nginx'})
+    site = web.Application()
+    site.router.add_get('/', page)
+    site.router.add_get('/big', big_page)
+    technologies = {
+        "WordPress": {"cats": [1], "meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}},
+        "Nginx": {"headers": {"Server": "nginx"}},
+    }
+    service = AnalysisService(Wappalyzer(categories={"1": {"name": "CMS"}}, technologies=technologies), 
+                              processes=processes, queue_size=2)
+    async with TestServer(site) as site_server, TestClient(TestServer(service.make_app())) as client:
+        site_url = str(site_server.make_url('/'))
+        expected = {'WordPress': {'versions': ['5.4.2'], 'categories': ['CMS']}, 
+                    'Nginx': {'versions': [], 'categories': []}}
+
+        response = await client.post('/analyze/url', json={'url': site_url})
+        assert response.status == 200
+        assert await response.json() == {'url': site_url, 'technologies': expected}
+
+        response = await client.post('/analyze/page', json={'url': 'http://example.com/', 'headers': {'Server': 'nginx'}, 
+            'html': '<meta name="generator" content="WordPress 5.4.2">'})
+        assert await response.json() == {'url': 'http://example.com/', 'technologies': expected}
+
+        response = await client.post('/analyze/batch', json={'pages': [{'url': site_url}, {'html': ''}]})
+        assert await response.json() == {'results': [
+            {'url': site_url, 'technologies': expected}, {'url': None, 'error': "'url' is required"}]}
+
+        response = await client.post('/analyze/batch', json={'pages': [{'url': site_url}] * 3})
+        assert response.status == 503
+        assert response.headers['Retry-After'] == '1'
+
+        response = await client.post('/analyze/page', data='not json')
+        assert response.status == 400
+
+        # Pages larger than the default limit of aiohttp, 1 MiB
+        response = await client.post('/analyze/page', json={'url': 'http://example.com/', 
+            'html': '<meta name="generator" content="WordPress 5.4.2">' + ' ' * 2 * 1024 * 1024})
+        assert response.status == 200
+        response = await client.post('/analyze/page', json={'url': 'http://example.com/', 'html': ' ' * service.max_request_size})
+        assert response.status == 413
+
+        # The fetched pages are truncated
+        service.max_request_size = 4096
+        response = await client.post('/analyze/url', json={'url': str(site_server.make_url('/big'))})
+        assert (await response.json())['technologies'] == {'Nginx': {'versions': [], 'categories': []}}
+
+        response = await client.get('/health')
+        assert await response.json() == {'status': 'ok', 'pending': 0, 'queue_size': 2, 
+                                          'processes': processes, 'technologies': 2}
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('processes', [0, 1])
+async def test_analyze_async(processes):
+    html = '<html><meta name="generator" content="WordPress 5.4.2"><script src="/jquery-3.5.1.js"></script></html>'
+    async def page(request):
+        return web.Response(text=html, content_type='text/html', headers={'Server': 'nginx'})
+    site = web.Application()
+    site.router.add_get('/', page)
+    technologies = {
+        "WordPress": {"cats": [1], "meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}, "implies": "PHP"},
+        "Nginx": {"headers": {"Server": "nginx"}},
+        "jQuery": {"scripts": "jquery-([\\d.]+)\\.js\\;version:\\1"},
+        "PHP": {},
+    }
+    wappalyzer = Wappalyzer(categories={"1": {"name": "CMS"}}, technologies=technologies)
+    expected = {'WordPress': {'versions': ['5.4.2'], 'categories': ['CMS']}, 'Nginx': {'versions': [], 'categories': []},
+                'jQuery': {'versions': ['3.5.1'], 'categories': []}, 'PHP': {'versions': [], 'categories': []}}
+    async with TestServer(site) as server, aiohttp.ClientSession() as session, \
+               AnalysisExecutor(wappalyzer, threads=2, processes=processes, max_pending=1) as executor:
+        url = str(server.make_url('/'))
+        webpages = await asyncio.gather(*(WebPage.new_from_url_async(url, aiohttp_client_session=session, executor=executor) 
+                                          for _ in range(3)))
+        assert all(webpage.scripts == ['/jquery-3.5.1.js'] for webpage in webpages)
+        results = await asyncio.gather(*(wappalyzer.analyze_async(webpage, executor=executor) for webpage in webpages))
+        assert all(result.with_versions_and_categories() == expected for result in results)
+        # Memoized on the web page
+        assert wappalyzer.analyze_result(webpages[0]) is results[0]
+        assert wappalyzer.detected_technologies == {}
+
+        result = await executor.analyze_bytes(url, html.encode('utf-8'), {'Server': 'nginx'})
+        assert result.with_versions_and_categories() == expected
+
+        async with session.get(url) as response:
+            webpage = await WebPage.new_from_response_async(response, executor=executor)
+        # The default executor of the event loop
+        assert (await wappalyzer.analyze_async(webpage)).with_versions_and_categories() == expected
+
+        if processes:
+            with pytest.raises(ValueError):
+                await Wappalyzer(categories={}, technologies={}).analyze_async(webpage, executor=executor)
+
+@pytest.mark.asyncio
+async def test_analyze_async_same_url():
+    wappalyzer = Wappalyzer.latest()
+    webpages = [WebPage('http://example.com', 
+                        html=f'<html><head><meta name="generator" content="WordPress 5.{index}">'
+                             f'<script src="/wp-includes/js/jquery/jquery.min.js?ver=3.{index}.1"></script></head>'
+                             f'<body>{"<div><p>text</p></div>" * 2000}</body></html>', 
+                        headers={'Server': f'nginx/1.{index}.0'}) for index in range(16)]
+    async with AnalysisExecutor(wappalyzer, threads=8) as executor:
+        results = await asyncio.gather(*(wappalyzer.analyze_async(webpage, executor=executor) for webpage in webpages))
+    for index, result in enumerate(results):
+        assert result.get_versions('WordPress') == [f'5.{index}']
+        assert result.get_versions('Nginx') == [f'1.{index}.0']
+    # The detections of the concurrent analyses are not kept
+    assert wappalyzer.detected_technologies == {}
+
+def test_sharded_analyzer():
+    technologies = {
+        "WordPress": {"meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}, "implies": "PHP", 
+                      "html": "<link rel=[\"']stylesheet[\"'] [^>]+/wp-(?:content|includes)/"},
+        "PHP": {"headers": {"X-Powered-By": "^php/?([\\d.]+)?\\;version:\\1"}},
+        "Nginx": {"headers": {"Server": "nginx(?:/([\\d.]+))?\\;version:\\1"}},
+        "Foo": {"dom": {"div.foo": {"attributes": {"data-version": "([\\d.]+)\\;version:\\1"}}}, 
+                "html": "<div class=.foo. data-version=.(\\d)\\;version:\\1"},
+        "Bar": {"dom": ["span.bar"]},
+    }
+    analyzer = Wappalyzer(categories={}, technologies=technologies)
+    assert sorted(map(sorted, split_ruleset(analyzer, 2))) == [['Foo', 'WordPress'], ['Nginx', 'PHP']]
+
+    def webpage():
+        return WebPage('http://example.com', 
+                       html=('<meta name="generator" content="WordPress 5.4.2">'
+                             '<link rel="stylesheet" href="/wp-content/style.css">' 
+                             '<div class="foo" data-version="1.2"></div>' + '<p>lorem ipsum</p>' * 1000), 
+                       headers={'Server': 'nginx/1.18.0'})
+    expected = analyzer.analyze_with_versions_and_categories(webpage())
+    assert expected['Foo'] == {'versions': ['1', '1.2'], 'categories': []}
+    with ShardedAnalyzer(Wappalyzer(categories={}, technologies=technologies), shards=2, threshold=1000) as sharded:
+        result = sharded.analyze_result(webpage())
+        assert result.with_versions_and_categories() == expected
+        assert result.get_confidence('WordPress') == 200
+        assert sharded.analyze(WebPage('http://example.com', html='<span class="bar">', headers={})) == {'Bar'}
+
+    # The detections of the excluded technologies and of the missing requirements are not kept
+    technologies = {
+        "Nginx": {"headers": {"Server": "nginx"}, "excludes": "Apache"},
+        "Apache": {"headers": {"Server": "nginx|apache"}},
+        "Drupal Module": {"html": "lorem\\;version:1.0", "requires": "Drupal"},
+        "Drupal": {"meta": {"generator": "Drupal"}},
+    }
+    with ShardedAnalyzer(Wappalyzer(categories={}, technologies=technologies), shards=2, threshold=1000) as sharded:
+        result = sharded.analyze_result(webpage())
+        assert result.technologies == {'Nginx'}
+        assert list(sharded.wappalyzer.detected_technologies['http://example.com']) == ['Nginx']
+        assert sharded.wappalyzer.get_confidence('http://example.com', 'Apache') is None
+        assert sharded.wappalyzer.get_versions('http://example.com', 'Drupal Module') == []
+
+@pytest.fixture
+def snapshots(tmp_path):
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'a' / 'index.html').write_bytes('<html><meta name="generator" content="WordPress 5.4.2">caf\xe9</html>'.encode('latin-1'))
+    (tmp_path / 'a' / 'index.html.headers').write_bytes(b'HTTP/1.1 200 OK\r\nServer: nginx\r\nContent-Type: text/html; charset=latin-1\r\n')
+    (tmp_path / 'b' / 'empty.html').write_bytes(b'')
+    (tmp_path / 'b' / 'page.HTM').write_bytes(b'<html>ccc</html>')
+    (tmp_path / 'b' / 'notes.txt').write_bytes(b'<html>ccc</html>')
+    (tmp_path / 'root.html').write_bytes(b'<html>ccc</html>')
+    return tmp_path
+
+def test_iter_directory(snapshots):
+    records = list(iter_directory(str(snapshots)))
+    assert [record.url for record in records] == [(snapshots / name).as_uri() for name in 
+        ('root.html', 'a/index.html', 'b/empty.html', 'b/page.HTM')]
+    assert records[1].headers_path == str(snapshots / 'a' / 'index.html.headers')
+    assert records[0].headers_path is None
+
+    webpage = records[1].to_webpage()
+    assert webpage.html.endswith('caf\xe9</html>')
+    assert webpage.headers['server'] == 'nginx'
+    assert webpage.meta['generator'] == 'WordPress 5.4.2'
+    assert records[2].to_webpage().html == ''
+
+    records = list(iter_directory(str(snapshots), extensions=['.txt'], url_for=lambda path: 'http://' + path.name))
+    assert records == [FileRecord('http://notes.txt', str(snapshots / 'b' / 'notes.txt'), None)]
+
+def test_analyze_to_ndjson(snapshots, tmp_path):
+    technologies = {
+        "WordPress": {"meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}},
+        "Nginx": {"headers": {"Server": "nginx"}},
+        "c": {"html": "ccc"},
+    }
+    analyzer = Wappalyzer(categories={}, technologies=technologies)
+    output = str(tmp_path / 'results.ndjson')
+    checkpoint = str(tmp_path / 'results.checkpoint')
+
+    def interrupted(records, after):
+        for index, record in enumerate(records):
+            if index == after:
+                raise KeyboardInterrupt()
+            yield record
+
+    with pytest.raises(KeyboardInterrupt):
+        analyze_to_ndjson(interrupted(iter_directory(str(snapshots)), 3), output, checkpoint, 
+                          checkpoint_every=2, wappalyzer=analyzer)
+    # The third result has been written but is not part of the checkpoint
+    assert len(Path(output).read_text().splitlines()) == 3
+    assert json.loads(Path(checkpoint).read_text())['records'] == 2
+
+    assert analyze_to_ndjson(iter_directory(str(snapshots)), output, checkpoint, 
+                             checkpoint_every=2, wappalyzer=analyzer) == 4
+    results = [json.loads(line) for line in Path(output).read_text().splitlines()]
+    assert [(Path(r['url']).name, sorted(r['technologies'])) for r in results] == [
+        ('root.html', ['c']), ('index.html', ['Nginx', 'WordPress']), ('empty.html', []), ('page.HTM', ['c'])]
+
+@pytest.fixture
+def batch():
+    technologies = {
+        "WordPress": {"cats": [1], "meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}, "implies": "PHP"},
+        "PHP": {"cats": [2]},
+        "Nginx": {"headers": {"Server": "nginx\\;confidence:50"}, "implies": "Linux"},
+    }
+    analyzer = Wappalyzer(categories={"1": {"name": "CMS"}, "2": {"name": "Programming languages"}}, technologies=technologies)
+    batch = BatchResults(analyzer)
+    batch.add(analyzer.analyze_result(WebPage('http://a.example.com', html='<meta name="generator" content="WordPress 5.4.2">', 
+                                              headers={'Server': 'nginx'})))
+    batch.add(analyzer.analyze_result(WebPage('http://b.example.com', html='', headers={'Server': 'nginx'})))
+    batch.add_technologies('http://c.example.com', {'WordPress': {'versions': ['6.0'], 'categories': ['CMS']}})
+    return batch
+
+def test_batch_results(batch):
+    assert len(batch) == 3
+    assert batch.technologies == ['WordPress', 'PHP', 'Nginx', 'Linux']
+    assert batch.bitsets == [0b1111, 0b1100, 0b0001]
+    assert batch.get_technologies(0) == {'WordPress', 'PHP', 'Nginx', 'Linux'}
+    assert batch.get_versions(0, 'WordPress') == ['5.4.2']
+    assert batch.get_versions(2, 'WordPress') == ['6.0']
+    assert batch.get_confidence(0, 'WordPress') == 100
+    assert batch.get_confidence(0, 'Nginx') == 50
+    assert batch.get_confidence(0, 'PHP') is None
+    assert batch.get_confidence(1, 'PHP') is None
+    # Not known
+    assert batch.get_confidence(2, 'WordPress') is None
+    assert batch.count('WordPress') == 2
+    assert batch.count('WordPress', 'Nginx') == 1
+    assert list(batch.pages('Nginx')) == [0, 1]
+    assert batch.counts() == {'WordPress': 2, 'PHP': 1, 'Nginx': 2, 'Linux': 2}
+    with pytest.raises(KeyError):
+        batch.count('Drupal')
+
+    columns = batch.to_columns()
+    assert columns['technology'] == ['WordPress', 'PHP', 'Nginx', 'Linux', 'Nginx', 'Linux', 'WordPress']
+    assert columns['page'] == [0, 0, 0, 0, 1, 1, 2]
+    assert columns['implied'] == [False, True, False, True, False, True, False]
+    assert columns['confidence'] == [100, None, 50, None, 50, None, None]
+
+    output = StringIO()
+    assert batch.to_ndjson(output) == 3
+    assert json.loads(output.getvalue().splitlines()[2]) == {
+        'url': 'http://c.example.com', 'technologies': {'WordPress': {'versions': ['6.0'], 'categories': ['CMS']}}}
+    output = StringIO()
+    assert batch.to_csv(output) == 7
+    assert output.getvalue().splitlines()[:3] == ['url,technology,versions,confidence,categories', 
+        'http://a.example.com,WordPress,5.4.2,100,CMS', 'http://a.example.com,PHP,,,Programming languages']
+    assert output.getvalue().splitlines()[-1] == 'http://c.example.com,WordPress,6.0,,CMS'
+
+def test_batch_results_array(batch):
+    numpy = pytest.importorskip('numpy')
+    matrix = batch.to_array()
+    assert matrix.shape == (3, 4)
+    assert (matrix[:, batch.ids['WordPress']] & matrix[:, batch.ids['Nginx']]).sum() == 1
+    assert matrix.sum(axis=0).tolist() == [2, 1, 2, 2]
+
+def test_incremental_analyzer():
+    technologies = {
+        "WordPress": {"meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}, "implies": "PHP", 
+                      "html": "<link [^>]+/wp-content/", "dom": "link[href*='wp-content']"},
+        "PHP": {"headers": {"X-Powered-By": "^php/?([\\d.]+)?\\;version:\\1"}},
+        "Nginx": {"headers": {"Server": "nginx(?:/([\\d.]+))?\\;version:\\1"}},
+        "jQuery": {"scripts": "jquery-([\\d.]+)\\.js\\;version:\\1"},
+    }
+    tracer = RecordingTracer()
+    wappalyzer = Wappalyzer(categories={}, technologies=technologies, tracer=tracer)
+    analyzer = IncrementalAnalyzer(wappalyzer)
+    def webpage(server='nginx/1.18.0', script='jquery-3.5.1.js'):
+        return WebPage('http://example.com', 
+                       html=f'<meta name="generator" content="WordPress 5.4.2"><link rel="stylesheet" href="/wp-content/a.css">'
+                            f'<script src="/{script}"></script>',
+                       headers={'Server': server, 'X-Powered-By': 'PHP/7.4'})
+    
+    result, state = analyzer.analyze(webpage())
+    assert result.with_versions() == Wappalyzer(categories={}, technologies=technologies).analyze_with_versions(webpage())
+    assert state.reused == set()
+    state = PageState.from_dict(json.loads(json.dumps(state.to_dict())))
+
+    # Only the Server header changed
+    tracer.spans.clear()
+    result, state = analyzer.analyze(webpage(server='nginx/1.20.0'), state)
+    assert state.reused == {'url', 'meta', 'scripts', 'html', 'dom'}
+    assert [(span.attributes['technology'], span.attributes['family']) for span in tracer.spans if span.stage == 'family'] == [
+        ('Nginx', 'headers')]
+    assert result.with_versions() == {'WordPress': {'versions': ['5.4.2']}, 'PHP': {'versions': ['7.4']}, 
+                                      'Nginx': {'versions': ['1.20.0']}, 'jQuery': {'versions': ['3.5.1']}}
+    assert result.get_confidence('WordPress') == 300
+
+    # The scripts and the HTML changed
+    result, state = analyzer.analyze(webpage(server='nginx/1.20.0', script='jquery-3.6.0.js'), state)
+    assert state.reused == {'url', 'headers', 'meta'}
+    assert result.get_versions('jQuery') == ['3.6.0']
+
+    # Another ruleset: everything is evaluated again
+    _, state = IncrementalAnalyzer(Wappalyzer(categories={}, technologies={"PHP": {}})).analyze(webpage(), state)
+    assert state.reused == set()
+
+    # The detections of the excluded technologies are not kept
+    wappalyzer = Wappalyzer(categories={}, technologies={"Nginx": {"headers": {"Server": "nginx"}, "excludes": "Apache"}, 
+                                                         "Apache": {"headers": {"Server": "nginx|apache"}}})
+    result, _ = IncrementalAnalyzer(wappalyzer).analyze(webpage())
+    assert result.technologies == {'Nginx'}
+    assert wappalyzer.get_confidence(result.url, 'Apache') is None
+
+    # The existence of a DOM element is a pattern too
+    digests = [IncrementalAnalyzer(Wappalyzer(categories={}, technologies={"X": {"dom": {"#x": clause}}})).ruleset
+               for clause in ({"text": "x"}, {"text": "x", "exists": ""})]
+    assert digests[0] != digests[1]
+
+def test_near_duplicate_analyzer():
+    technologies = {
+        "WordPress": {"meta": {"generator": "^WordPress ?([\\d.]+)?\\;version:\\1"}, "html": "<link [^>]+/wp-content/"},
+        "jQuery": {"scripts": "jquery-([\\d.]+)\\.js\\;version:\\1"},
+        "Disqus": {"html": "disqus_thread"},
+        "Nginx": {"headers": {"Server": "nginx"}},
+    }
+    tracer = RecordingTracer()
+    analyzer = NearDuplicateAnalyzer(Wappalyzer(categories={}, technologies=technologies, tracer=tracer), threshold=0.9)
+    def webpage(post, script='jquery-3.5.1.js', comments='<div id="disqus_thread"></div>'):
+        return WebPage('http://example.com/{}'.format(post), 
+                       html=f'<html><head><title>Post {post}</title><meta name="generator" content="WordPress 5.4.2">'
+                            f'<link rel="stylesheet" href="/wp-content/a.css"><script src="/{script}"></script></head>'
+                            f'<body><div class="post" id="post-{post}"><h1>Post {post}</h1><p>Text</p></div>{comments}</body></html>',
+                       headers={'Server': 'nginx', 'Date': 'Mon, 19 Oct 2026 10:0{}:00 GMT'.format(post)})
+    assert get_distance(get_sketch(webpage(1)), get_sketch(webpage(2))) == 0
+
+    expected = {'WordPress': {'versions': ['5.4.2']}, 'jQuery': {'versions': ['3.5.1']}, 'Disqus': {'versions': []}, 'Nginx': {'versions': []}}
+    assert analyzer.analyze(webpage(1)).with_versions() == expected
+    tracer.spans.clear()
+    assert analyzer.analyze(webpage(2)).with_versions() == expected
+    assert analyzer.hits == 1 and analyzer.hit_rate == 0.5
+    # Reused: the html pattern of WordPress and Disqus. Evaluated again: the cheap families and the versioned patterns.
+    assert [(span.attributes['technology'], span.attributes['family']) for span in tracer.spans if span.stage == 'family'] == [
+        ('Nginx', 'headers'), ('WordPress', 'meta'), ('jQuery', 'scripts')]
+    assert [span.attributes['near_duplicate'] for span in tracer.spans if span.stage == 'analyze'] == ['http://example.com/1']
+
+    # The versions are extracted from the page itself
+    assert analyzer.analyze(webpage(3, script='jquery-3.6.0.js')).get_versions('jQuery') == ['3.6.0']
+    assert analyzer.hits == 2
+
+    # Another structure: full analysis
+    result = analyzer.analyze(WebPage('http://example.org', html='<html><body><table><tr><td>Home</td></tr></table></body></html>', 
+                                      headers={'Server': 'Apache'}))
+    assert result.technologies == set()
+    assert analyzer.hits == 2 and analyzer.lookups == 4
+
+    with pytest.raises(ValueError):
+        NearDuplicateAnalyzer(Wappalyzer(categories={}, technologies=technologies), threshold=2)
+
+@pytest.mark.asyncio
+async def test_host_scheduler():
+    running, peak, hits = {}, {}, {}
+    async def page(request):
+        host = request.url.host
+        running[host] = running.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), running[host])
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            running[host] -= 1
+        return web.Response(text='<script src="/jquery.js"></script>', content_type='text/html')
+    async def flaky(request):
+        hits[request.path] = hits.get(request.path, 0) + 1
+        if request.path == '/down' or hits[request.path] < 3:
+            return web.Response(status=503 if request.path == '/busy' else 429, headers={'Retry-After': '0'})
+        return web.Response(text='ok')
+    async def hang(request):
+        await asyncio.sleep(1)
+        return web.Response(text='late')
+    site = web.Application()
+    site.router.add_get('/page/{n}', page)
+    site.router.add_get('/busy', flaky)
+    site.router.add_get('/down', flaky)
+    site.router.add_get('/hang', hang)
+    metrics = InMemoryMetrics()
+    set_metrics(metrics)
+    try:
+        async with TestServer(site, host='127.0.0.1') as server:
+            port = server.port
+            big = [f'http://127.0.0.1:{port}/page/{n}' for n in range(6)]
+            small = [f'http://localhost:{port}/page/{n}' for n in range(2)]
+            async with HostScheduler(per_host=2, concurrency=3, min_timeout=0.5) as scheduler:
+                completed = [(url, webpage) async for url, webpage in scheduler.fetch_all(big + small)]
+                assert sorted(url for url, _ in completed) == sorted(big + small)
+                assert all(webpage.scripts == ['/jquery.js'] for _, webpage in completed)
+                assert peak['127.0.0.1'] == 2 and peak['localhost'] <= 2
+                # Round-robin: the small host is not stuck behind the big one
+                assert max(index for index, (url, _) in enumerate(completed) if url in small) < 6
+                # Fast host: the timeout converges to the lower bound
+                assert scheduler.hosts['127.0.0.1'].timeout == 0.5
+                assert scheduler.active == 0
+
+            async with HostScheduler(retries=2, backoff=0.01) as scheduler:
+                webpage = await scheduler.fetch(f'http://127.0.0.1:{port}/busy')
+                assert webpage.html == 'ok'
+                assert scheduler.hosts['127.0.0.1'].failures == 0
+
+                with pytest.raises(aiohttp.ClientResponseError) as err:
+                    await scheduler.fetch(f'http://127.0.0.1:{port}/down')
+                assert err.value.status == 429
+                assert hits['/down'] == 3
+
+            async with HostScheduler(retries=0, timeout=0.2) as scheduler:
+                with pytest.raises(asyncio.TimeoutError):
+                    await scheduler.fetch(f'http://127.0.0.1:{port}/hang')
+                # Doubled after a timeout
+                assert scheduler.hosts['127.0.0.1'].timeout == 0.4
+                assert scheduler.hosts['127.0.0.1'].failures == 1
+
+            # Parsed in the executor, only the last idle host is kept
+            with concurrent.futures.ThreadPoolExecutor(1) as executor:
+                async with HostScheduler(max_idle_hosts=1, executor=executor) as scheduler:
+                    for url in (big[0], small[0]):
+                        assert (await scheduler.fetch(url)).scripts == ['/jquery.js']
+                    # The request task ends after the future is resolved
+                    await asyncio.sleep(0.01)
+                    assert list(scheduler.hosts) == ['localhost']
+
+            # Closing cancels the requests in flight
+            scheduler = HostScheduler()
+            future = scheduler.submit(f'http://127.0.0.1:{port}/hang')
+            await asyncio.sleep(0.1)
+            assert scheduler.active == 1
+            await scheduler.close()
+            assert future.cancelled()
+
+            # Closing while requests are queued: their URLs are still reported
+            scheduler = HostScheduler(per_host=1)
+            hang = [f'http://127.0.0.1:{port}/hang?{n}' for n in range(3)]
+            async def fetch_all():
+                return [(url, webpage) async for url, webpage in scheduler.fetch_all(hang)]
+            task = asyncio.ensure_future(fetch_all())
+            await asyncio.sleep(0.1)
+            await scheduler.close()
+            completed = await task
+            assert sorted(url for url, _ in completed) == hang
+            assert all(isinstance(error, asyncio.CancelledError) for _, error in completed)
+
+        assert metrics.get_counter('wappalyzer_fetch_retries_total', reason='503') == 2
+        assert metrics.get_counter('wappalyzer_fetch_retries_total', reason='429') == 2
+        assert metrics.get_counter('wappalyzer_errors_total', stage='fetch', type='ClientResponseError') == 1
+    finally:
+        set_metrics(None)
+
+def test_profile_rules(tmp_path: Path):
+    pages = [{'url': 'http://a.com/', 'html': '<meta name="generator" content="WordPress 5.4.2"><script src="/jquery-3.5.1.js"></script>', 
+              'headers': {'Server': 'nginx'}},
+             {'url': 'http://b.com/', 'html': '<p>Hello</p>', 'headers': {'Server': 'Apache'}}]
+    corpus = tmp_path / 'pages.ndjson'
+    corpus.write_text(''.join(json.dumps(page) + '\n' for page in pages))
+    assert [(record.url, record.headers['Server']) for record in iter_ndjson(str(corpus))] == [
+        ('http://a.com/', 'nginx'), ('http://b.com/', 'Apache')]
+
+    technologies = {
+        "WordPress": {"meta": {"generator": "^WordPress"}, "html": "<link [^>]+/wp-content/"},
+        "Nginx": {"headers": {"Server": "nginx"}},
+        "jQuery": {"scripts": "jquery-([\\d.]+)\\.js\\;version:\\1", "dom": "script[src*='jquery']"},
+    }
+    before = tmp_path / 'before.json'
+    before.write_text(json.dumps({'categories': {}, 'technologies': technologies}))
+    after = tmp_path / 'after.json'
+    after.write_text(json.dumps({'categories': {}, 'technologies': dict(technologies, Slow={"html": "(?:a|b)*c"})}))
+
+    profile, = profile_ruleset(iter_corpus(str(corpus)), Wappalyzer.latest(technologies_file=str(before)))
+    report = profile.to_dict()
+    assert report['pages'] == 2
+    assert {(cost['technology'], cost['family'], cost['key'], cost['pattern']) for cost in report['unmatched']} == {
+        ('WordPress', 'html', '', '<link [^>]+/wp-content/')}
+    assert {cost['pattern']: cost['match_rate'] for cost in report['patterns']} == {
+        '^WordPress': 50.0, '<link [^>]+/wp-content/': 0.0, 'nginx': 50.0, 'jquery-([\\d.]+)\\.js': 50.0, "script[src*='jquery']": 50.0}
+    assert {tech['technology']: tech['match_rate'] for tech in report['technologies']} == {'WordPress': 50.0, 'Nginx': 50.0, 'jQuery': 50.0}
+    assert round(sum(family['percent'] for family in report['families'].values())) == 100
+    assert 'Never matched: 1 of 5 patterns' in profile.format()
+
+    with pytest.raises(ValueError):
+        iter_corpus(str(tmp_path / 'pages.txt'))
+    with pytest.raises(ValueError, match='ARC'):
+        iter_corpus(str(tmp_path / 'crawl.arc.gz'))
+
+    output = StringIO()
+    with redirect_stdout(output):
+        profile_main(get_profile_parser().parse_args([str(corpus), '--technologies-file', str(before), 
+                                                      '--compare', str(after), '--json']))
+    report = json.loads(output.getvalue())
+    assert report['profile']['pages'] == 2
+    assert {tech['technology']: tech['status'] for tech in report['comparison']['technologies']} == {
+        'WordPress': 'changed', 'Nginx': 'changed', 'jQuery': 'changed', 'Slow': 'added'}
+
+def test_regex_backends():
+    technologies = {
+        "Nginx": {"headers": {"Server": "nginx/([\\d.]+)\\;version:\\1"}},
+        # Lookbehind of variable length: not supported by re nor re2
+        "Symfony": {"html": "(?<=sf-toolbar[a-z]*)-value"},
+    }
+    webpage = lambda: WebPage('http://example.com', html='<span class="sf-toolbar-value">', headers={'Server': 'nginx/1.18.0'})
+
+    analyzer = Wappalyzer(categories={}, technologies=technologies, regex_backends=('re',))
+    assert analyzer.technologies['Nginx'].headers['server'][0].backend == 're'
+    assert analyzer.technologies['Symfony'].html[0].backend == 'none'
+    assert analyzer.get_regex_backends() == {'re': 1, 'none': 1}
+    assert analyzer.analyze_with_versions(webpage()) == {'Nginx': {'versions': ['1.18.0']}}
+
+    with pytest.raises(ValueError):
+        Wappalyzer(categories={}, technologies=technologies, regex_backends=('pcre',))
+
+    pytest.importorskip('regex')
+    analyzer = Wappalyzer(categories={}, technologies=technologies, regex_backends=('re', 'regex'), regex_timeout=1)
+    assert analyzer.get_regex_backends() == {'re': 1, 'regex': 1}
+    assert analyzer.analyze_with_versions(webpage()) == {'Nginx': {'versions': ['1.18.0']}, 'Symfony': {'versions': []}}
+
 def test_analyze_scriptSrc():
     ...
     #TODO
@@ -377,6 +1457,40 @@ def cli(*args):
         result = json.loads(stream.getvalue())
     return result
 
+@httprettified
+def test_new_from_url_headers():
+    HTTPretty.register_uri(HTTPretty.HEAD, 'http://example.com/', forcing_headers={'Server': 'nginx/1.2.3'})
+    HTTPretty.register_uri(HTTPretty.HEAD, 'http://example.com/no-head', status=405)
+    HTTPretty.register_uri(HTTPretty.GET, 'http://example.com/no-head', body='<html>aaa</html>', forcing_headers={'Server': 'nginx'})
+    
+    webpage = WebPage.new_from_url_headers('http://example.com/')
+    assert webpage.partial
+    assert webpage.headers['server'] == 'nginx/1.2.3'
+    assert webpage.html == ''
+    
+    webpage = WebPage.new_from_url_headers('http://example.com/no-head')
+    assert HTTPretty.last_request.method == 'GET'
+    assert webpage.partial
+    assert webpage.headers['server'] == 'nginx'
+    assert webpage.html == ''
+
+    r = cli('http://example.com/', '--headers-only')
+    assert r['partial']
+    assert r['technologies']['Nginx'] == {'versions': ['1.2.3'], 'categories': ['Web servers', 'Reverse proxies']}
+
+def test_analyze_partial_webpage():
+    class HeadersOnlyWebPage(WebPage):
+        def select(self, selector):
+            raise AssertionError("DOM selection should have been skipped")
+    
+    webpage = HeadersOnlyWebPage.new_from_headers('http://example.com', {'Server': 'nginx'})
+    technologies = {
+        'a': {'headers': {'Server': 'nginx'}, 'implies': 'b'},
+        'b': {'dom': '.b'},
+    }
+    analyzer = Wappalyzer(categories={}, technologies=technologies)
+    assert analyzer.analyze(webpage) == {'a', 'b'}
+
 @pytest.mark.skipif(os.getenv('GITHUB_ACTIONS') is not None, reason="This test fails on the github CI, python3.9 for some reason.")
 def test_cli():
     r = cli('http://exemple.com', '--update', '--user-agent', 'Mozilla/5.0', '--timeout', '30')